@@ -0,0 +1,228 @@
+"""OpenRouter 调用封装
+
+所有 /api/ai/* 接口共用一个客户端：
+- 复用连接池（requests.Session），避免每次请求重新建立 TLS 连接
+- 连接/读取超时可配置，429 和 5xx 按指数退避自动重试
+- 相同模型、提示词和参数的结果按内容哈希缓存（LRU + TTL）
+- 限制同时进行的上游请求数，上游变慢时快速返回“繁忙”而不是占满所有工作线程
+
+配置通过环境变量完成，OPENROUTER_BASE_URL 可以指向本地的模拟服务（见 bench/openrouter_stub.py）。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+from cache import TTLCache
+
+AI_REQUEST_DURATION = metrics.Histogram(
+    'ai_request_duration_seconds', '上游 AI 请求耗时（流式请求只计到响应头返回）', ['mode', 'outcome']
+)
+AI_QUEUE_WAIT = metrics.Histogram('ai_queue_wait_seconds', '等待并发槽位的时间')
+AI_FIRST_TOKEN = metrics.Histogram('ai_stream_first_token_seconds', '流式请求从发出到收到第一段文本的时间')
+AI_STREAM_DURATION = metrics.Histogram('ai_stream_duration_seconds', '流式请求的总时长', ['outcome'])
+
+
+class AIError(Exception):
+    """AI 服务调用失败，status 为返回给前端的 HTTP 状态码
+
+    upstream_status 为上游返回的 HTTP 状态码（没有收到上游响应时为 None），用于判断是否值得重试。
+    """
+
+    def __init__(self, message, status=502, upstream_status=None):
+        super().__init__(message)
+        self.status = status
+        self.upstream_status = upstream_status
+
+
+class AIClient:
+    def __init__(self):
+        self.base_url = os.getenv('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1').rstrip('/')
+        self.model = os.getenv('AI_MODEL', 'gpt-3.5-turbo')
+        self.timeout = (float(os.getenv('AI_CONNECT_TIMEOUT', '5')), float(os.getenv('AI_TIMEOUT', '60')))
+        self.max_concurrency = int(os.getenv('AI_MAX_CONCURRENCY', '4'))
+        # 等待空闲并发槽位的最长时间
+        self.queue_timeout = float(os.getenv('AI_QUEUE_TIMEOUT', '10'))
+
+        retry = Retry(
+            total=int(os.getenv('AI_RETRIES', '2')),
+            backoff_factor=float(os.getenv('AI_RETRY_BACKOFF', '0.5')),
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({'POST'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._stats_lock = threading.Lock()
+        self._stream_stats = {'started': 0, 'completed': 0, 'cancelled': 0, 'ttfbMsTotal': 0.0, 'ttfbMsMax': 0.0}
+        self.cache = TTLCache(
+            'ai_responses',
+            ttl=float(os.getenv('AI_CACHE_TTL', '3600')),
+            maxsize=int(os.getenv('AI_CACHE_SIZE', '256')),
+        )
+
+    def _acquire_slot(self):
+        started = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        AI_QUEUE_WAIT.observe(time.perf_counter() - started)
+        if not acquired:
+            raise AIError('AI服务繁忙，请稍后再试', 503)
+
+    def _send(self, payload, api_key, stream=False):
+        mode = 'stream' if stream else 'chat'
+        started = time.perf_counter()
+        try:
+            response = self.session.post(
+                f'{self.base_url}/chat/completions',
+                headers={
+                    'Authorization': f'Bearer {api_key}',
+                    'Content-Type': 'application/json'
+                },
+                json=payload,
+                timeout=self.timeout,
+                stream=stream
+            )
+        except requests.Timeout:
+            AI_REQUEST_DURATION.observe(time.perf_counter() - started, mode=mode, outcome='timeout')
+            raise AIError('AI服务响应超时', 504)
+        except requests.RequestException as e:
+            AI_REQUEST_DURATION.observe(time.perf_counter() - started, mode=mode, outcome='error')
+            raise AIError(f'AI服务连接失败: {e}')
+        AI_REQUEST_DURATION.observe(time.perf_counter() - started, mode=mode, outcome=str(response.status_code))
+        return response
+
+    def _post(self, payload, api_key):
+        self._acquire_slot()
+        try:
+            return self._send(payload, api_key)
+        finally:
+            self._slots.release()
+
+    def _api_key(self):
+        api_key = os.getenv('OPENROUTER_API_KEY')
+        if not api_key:
+            raise AIError('未配置API密钥', 500)
+        return api_key
+
+    def chat(self, messages, max_tokens, use_cache=True):
+        """调用 chat completions，返回回复文本"""
+        api_key = self._api_key()
+
+        payload = {'model': self.model, 'messages': messages, 'max_tokens': max_tokens}
+        cache_key = hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        content, _ = self._complete(payload, api_key)
+        if use_cache:
+            self.cache.set(cache_key, content)
+        return content
+
+    def chat_with_usage(self, messages, max_tokens):
+        """不经过缓存调用 chat completions，返回 (回复文本, 消耗的 token 数)，用于批量任务统计吞吐"""
+        payload = {'model': self.model, 'messages': messages, 'max_tokens': max_tokens}
+        content, usage = self._complete(payload, self._api_key())
+        return content, usage.get('total_tokens') or (usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0))
+
+    def _complete(self, payload, api_key):
+        response = self._post(payload, api_key)
+        if response.status_code != 200:
+            raise AIError(f'AI服务返回错误: HTTP {response.status_code}', upstream_status=response.status_code)
+        try:
+            result = response.json()
+            return result['choices'][0]['message']['content'], result.get('usage') or {}
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise AIError('AI服务返回格式错误', upstream_status=response.status_code)
+
+    def stream_chat(self, messages, max_tokens):
+        """流式调用 chat completions
+
+        上游连接建立且返回 200 后，返回逐段产出回复文本的生成器；建立连接失败时直接抛出 AIError。
+        生成器在读完之前被关闭（例如浏览器断开连接）时会立即关闭上游连接，不再继续消耗额度。
+        流式结果不进入缓存。
+        """
+        api_key = self._api_key()
+        payload = {'model': self.model, 'messages': messages, 'max_tokens': max_tokens, 'stream': True}
+
+        self._acquire_slot()
+        started = time.perf_counter()
+        try:
+            response = self._send(payload, api_key, stream=True)
+        except AIError:
+            self._slots.release()
+            raise
+        if response.status_code != 200:
+            response.close()
+            self._slots.release()
+            raise AIError(f'AI服务返回错误: HTTP {response.status_code}', upstream_status=response.status_code)
+        return self._relay(response, started)
+
+    def _relay(self, response, started):
+        with self._stats_lock:
+            self._stream_stats['started'] += 1
+        first_token = True
+        completed = False
+        try:
+            # chunk_size=None：上游每到达一个 chunk 就处理，不等待凑满缓冲区
+            for line in response.iter_lines(chunk_size=None):
+                # SSE 数据行格式为 "data: {...}"，以 "data: [DONE]" 结束，其余为注释或空行
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip()
+                if data == b'[DONE]':
+                    break
+                try:
+                    delta = json.loads(data)['choices'][0]['delta'].get('content')
+                except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                    continue
+                if not delta:
+                    continue
+                if first_token:
+                    first_token = False
+                    self._record_ttfb((time.perf_counter() - started) * 1000)
+                yield delta
+            completed = True
+        except requests.RequestException as e:
+            raise AIError(f'AI服务连接中断: {e}')
+        finally:
+            response.close()
+            self._slots.release()
+            with self._stats_lock:
+                self._stream_stats['completed' if completed else 'cancelled'] += 1
+            AI_STREAM_DURATION.observe(time.perf_counter() - started, outcome='completed' if completed else 'cancelled')
+
+    def _record_ttfb(self, ttfb_ms):
+        AI_FIRST_TOKEN.observe(ttfb_ms / 1000)
+        with self._stats_lock:
+            self._stream_stats['ttfbMsTotal'] += ttfb_ms
+            self._stream_stats['ttfbMsMax'] = max(self._stream_stats['ttfbMsMax'], ttfb_ms)
+
+    def stats(self):
+        """流式调用统计：首个 token 的平均/最大等待时间，以及被客户端中途取消的次数"""
+        with self._stats_lock:
+            stats = dict(self._stream_stats)
+        measured = stats.pop('ttfbMsTotal')
+        stats['ttfbMsAvg'] = round(measured / stats['started'], 2) if stats['started'] else 0.0
+        stats['ttfbMsMax'] = round(stats['ttfbMsMax'], 2)
+        return {'streams': stats, 'cache': self.cache.stats()}
+
+    def validate_key(self, api_key):
+        """用最小请求验证 API 密钥是否有效"""
+        response = self._post({
+            'model': self.model,
+            'messages': [{'role': 'user', 'content': 'test'}],
+            'max_tokens': 1
+        }, api_key)
+        return response.status_code == 200
@@ -1,21 +1,74 @@
-from flask import Flask, render_template, request, jsonify
+from flask import (Flask, Response, g, has_request_context, render_template, request, jsonify, abort, make_response,
+                   stream_with_context)
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, selectinload
+from datetime import date, datetime, timedelta, timezone
+import base64
+import functools
+import html
+import io
+import json
 import os
-import requests
+import time
+import zlib
+import click
 from dotenv import load_dotenv
+from ai_client import AIClient, AIError
+from batch_tagging import BatchTagger
+import bulk
+import change_feed
+from events import ChangeLogBroker, LocalBroker, TooManySubscribers
+from cache import SQLiteBackend, TTLCache, registry as cache_registry
+from http_cache import STATIC_MAX_AGE, ConditionalGet, StaticHasher
+from jobs import JobError, JobQueue
+import metrics
+import pomodoro_stats
+import revisions
+import storage
+from serializers import JSONProvider, ModelSerializer, dumps, stream_array
+from migrations import TODO_PRIORITY_RANK_SQL, run_migrations
 
 # 加载环境变量
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
 load_dotenv()
 
+def env_mtime():
+    try:
+        return os.stat(ENV_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+env_loaded_mtime = env_mtime()
+
+def reload_env():
+    """.env 被其他进程更新后（单独的 worker 进程保存了新密钥、多个 web 进程）重新加载，使各进程使用同一个密钥"""
+    global env_loaded_mtime
+    mtime = env_mtime()
+    if mtime is not None and mtime != env_loaded_mtime:
+        env_loaded_mtime = mtime
+        load_dotenv(ENV_PATH, override=True)
+
 app = Flask(__name__)
+app.json = JSONProvider(app)
 
 # 配置数据库
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(basedir, "instance", "notes.db")}'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
+    'DATABASE_URL', f'sqlite:///{os.path.join(basedir, "instance", "notes.db")}'
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 连接池和 SQLite PRAGMA 配置见 storage.py
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = storage.engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
 db = SQLAlchemy(app)
+# 超过该耗时（毫秒）的 SQL 写入慢查询日志，0 表示不记录
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+with app.app_context():
+    storage.configure_engine(db.engine)
+    metrics.instrument_engine(db.engine, SLOW_QUERY_MS)
+ai_client = AIClient()
 
 # 定义数据模型
 class Folder(db.Model):
@@ -25,6 +78,12 @@ class Folder(db.Model):
     notes = db.relationship('Note', backref='folder', lazy=True)
 
 class Note(db.Model):
+    __table_args__ = (
+        db.Index('ix_note_updated', 'updatedAt', 'id'),
+        db.Index('ix_note_folder_updated', 'folderId', 'updatedAt', 'id'),
+        db.Index('ix_note_tag', 'tag'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200))
     content = db.Column(db.Text)
@@ -32,8 +91,41 @@ class Note(db.Model):
     createdAt = db.Column(db.DateTime, default=datetime.utcnow)
     updatedAt = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     folderId = db.Column(db.Integer, db.ForeignKey('folder.id'), nullable=True)
+    taggedAt = db.Column(db.DateTime, nullable=True)  # 最近一次由批量任务自动打标签的时间
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # 每次修改加一，用于乐观并发控制
+
+# 笔记历史版本：合并后的快照，以关键帧 + 压缩差异的链存储，格式见 revisions.py
+class NoteRevision(db.Model):
+    __table_args__ = (
+        db.Index('ix_note_revision_note_seq', 'noteId', 'seq', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    noteId = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)  # 笔记内的版本序号，整理后可能不连续
+    keyframeSeq = db.Column(db.Integer, nullable=False)  # 还原时从这个关键帧开始
+    kind = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    checksum = db.Column(db.Integer, nullable=False)  # 正文的 CRC32，确认差异的基准与上一个版本一致
+    title = db.Column(db.String(200))
+    size = db.Column(db.Integer, nullable=False)  # 正文字符数
+    version = db.Column(db.Integer, nullable=False)  # 对应的笔记版本号
+    createdAt = db.Column(db.DateTime, nullable=False)
+    updatedAt = db.Column(db.DateTime, nullable=False)  # 合并的最后一次保存时间
 
 class Todo(db.Model):
+    __table_args__ = (
+        db.Index('ix_todo_created', 'createdAt', 'id'),
+        db.Index('ix_todo_type_created', 'type', 'createdAt', 'id'),
+        db.Index('ix_todo_type_completed_created', 'type', 'completed', 'createdAt', 'id'),
+        db.Index('ix_todo_priority_created', 'priority', 'createdAt', 'id'),
+        db.Index('ix_todo_completed_created', 'completed', 'createdAt', 'id'),
+        db.Index('ix_todo_updated', 'updatedAt', 'id'),
+        db.Index('ix_todo_type_updated', 'type', 'updatedAt', 'id'),
+        db.Index('ix_todo_priority_rank', db.text(TODO_PRIORITY_RANK_SQL), 'id'),
+        db.Index('ix_todo_type_priority_rank', 'type', db.text(TODO_PRIORITY_RANK_SQL), 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
@@ -45,6 +137,12 @@ class Todo(db.Model):
 
 # 项目模型
 class Project(db.Model):
+    __table_args__ = (
+        db.Index('ix_project_updated', 'updatedAt', 'id'),
+        db.Index('ix_project_status_updated', 'status', 'updatedAt', 'id'),
+        db.Index('ix_project_priority_updated', 'priority', 'updatedAt', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
@@ -53,11 +151,19 @@ class Project(db.Model):
     start_date = db.Column(db.Date)
     end_date = db.Column(db.Date)
     progress = db.Column(db.Integer, default=0)  # 0-100
+    # 任务计数随任务写入增量维护，见 apply_task_delta
+    taskCount = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completedTasks = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     createdAt = db.Column(db.DateTime, default=datetime.utcnow)
     updatedAt = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 # 项目任务模型
 class ProjectTask(db.Model):
+    __table_args__ = (
+        db.Index('ix_project_task_project_created', 'projectId', 'createdAt', 'id'),
+        db.Index('ix_project_task_project_status_created', 'projectId', 'status', 'createdAt', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
@@ -74,6 +180,11 @@ class ProjectTask(db.Model):
 
 # 项目笔记关联模型
 class ProjectNote(db.Model):
+    __table_args__ = (
+        db.Index('ix_project_note_project_note', 'projectId', 'noteId'),
+        db.Index('ix_project_note_note', 'noteId'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     projectId = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
     noteId = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False)
@@ -82,33 +193,615 @@ class ProjectNote(db.Model):
     project = db.relationship('Project', backref=db.backref('project_notes', lazy=True, cascade='all, delete-orphan'))
     note = db.relationship('Note', backref=db.backref('project_links', lazy=True))
 
+# 番茄钟记录：只追加，统计接口读取 PomodoroDaily 汇总表（见 pomodoro_stats）
+class PomodoroSession(db.Model):
+    __table_args__ = (
+        db.Index('ix_pomodoro_session_started', 'startedAt', 'id'),
+        db.Index('ix_pomodoro_session_todo_started', 'todoId', 'startedAt', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # 不设外键：删除待办后保留它的专注历史，统计中标题显示为空
+    todoId = db.Column(db.Integer, nullable=True)
+    startedAt = db.Column(db.DateTime, nullable=False)
+    endedAt = db.Column(db.DateTime, nullable=False)
+    duration = db.Column(db.Integer, nullable=False)  # 专注秒数（不含暂停）
+    day = db.Column(db.Date, nullable=False)  # 开始时间对应的用户本地日期
+
+# 番茄钟按日汇总，随记录写入增量维护，见 apply_pomodoro_delta
+class PomodoroDaily(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    todoId = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 表示没有关联待办
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    seconds = db.Column(db.Integer, nullable=False, default=0)
+
+# 后台任务：接口写入后立即返回，由 worker 领取执行，见 jobs.py
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued/running/succeeded/failed/cancelled
+    priority = db.Column(db.Integer, nullable=False, default=0)  # 越大越先执行
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    result = db.Column(db.Text)  # JSON，成功后写入
+    error = db.Column(db.Text)  # 最近一次失败的原因
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    maxAttempts = db.Column(db.Integer, nullable=False, default=3)
+    runAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # 最早执行时间（重试时向后推迟）
+    lockedUntil = db.Column(db.DateTime)  # 租约到期时间，到期仍未结束的任务重新排队
+    workerId = db.Column(db.String(100))
+    createdAt = db.Column(db.DateTime, default=datetime.utcnow)
+    startedAt = db.Column(db.DateTime)
+    finishedAt = db.Column(db.DateTime)
+
+# 领取顺序为 priority 倒序、runAt 正序，索引的列方向与之一致，领取时不需要排序
+db.Index('ix_job_queue', Job.status, Job.priority.desc(), Job.runAt, Job.id)
+
+batch_tagger = BatchTagger(app, db, Note, ai_client)
+
+# 后台任务队列（见 jobs.py）。JOB_WORKERS 为 web 进程内的 worker 线程数，首次写入或查询任务时启动；
+# 设为 0 并单独运行 flask run-worker，可以把耗时任务完全移出 web 进程
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+# 已结束的任务保留天数，由 flask prune-jobs 清理
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+job_queue = JobQueue(
+    app, db, Job,
+    poll_interval=float(os.getenv('JOB_POLL_INTERVAL', '0.5')),
+    lease=float(os.getenv('JOB_LEASE', '300')),
+    backoff=float(os.getenv('JOB_RETRY_BACKOFF', '2')),
+    max_backoff=float(os.getenv('JOB_MAX_BACKOFF', '300'))
+)
+
+# 缓存及写入失效
+# 会话提交后，根据本次事务修改过的模型失效依赖它们的缓存。
+# CACHE_BACKEND=sqlite 时缓存存放在本机的一个 SQLite 文件中（CACHE_PATH），多个 worker 进程共享，
+# 任何进程的失效对所有进程立即生效；默认 memory 为进程内缓存。
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+if CACHE_BACKEND == 'sqlite':
+    cache_backend = SQLiteBackend(os.getenv('CACHE_PATH', os.path.join(app.instance_path, 'cache.db')))
+else:
+    cache_backend = None
+
+# 项目统计同样以 project 表的版本号作为 key 的一部分（任务计数保存在项目上，任务的增删改也会递增该版本号）
+stats_cache = TTLCache('project_stats', ttl=float(os.getenv('STATS_CACHE_TTL', '5')), maxsize=1,
+                       backend=cache_backend)
+# 文件夹和标签由写入精确失效，并以版本号作为 key 的一部分（见 table_version），其他进程的写入也不会让 ETag
+# 比缓存的数据新；标签使用只随笔记增删和标签修改递增的 note_tag 版本号（见迁移 12），编辑正文不会让它失效。
+# TTL 只用于兜底（例如直接修改数据库文件）
+LIST_CACHE_TTL = float(os.getenv('LIST_CACHE_TTL', '300'))
+folders_cache = TTLCache('folders', ttl=LIST_CACHE_TTL, maxsize=1, backend=cache_backend)
+tags_cache = TTLCache('tags', ttl=LIST_CACHE_TTL, maxsize=1, backend=cache_backend)
+
+# {模型: [缓存 或 (缓存, 字段)]}：指定字段时，只有新增、删除记录或这些字段变化才失效，
+# 例如编辑笔记正文（最频繁的写入）不会失效标签缓存。启用条件请求时缓存 key 还包含版本号，
+# 其他进程的相关写入之后也会重新加载一次，见 table_version
+CACHE_DEPENDENCIES = {
+    Folder: [folders_cache],
+    Note: [(tags_cache, ('tag',))],
+    Project: [stats_cache],
+    ProjectTask: [stats_cache],
+}
+
+def invalidate_caches(*models):
+    """手动失效依赖指定模型的缓存（批量 SQL 写入不会经过会话事件时使用）"""
+    for cache in {dependency[0] if isinstance(dependency, tuple) else dependency
+                  for model in models for dependency in CACHE_DEPENDENCIES.get(model, [])}:
+        cache.invalidate()
+
+def stale_caches(obj, created_or_deleted):
+    """obj 的修改需要失效的缓存"""
+    for dependency in CACHE_DEPENDENCIES.get(type(obj), []):
+        if not isinstance(dependency, tuple):
+            yield dependency
+            continue
+        cache, fields = dependency
+        state = inspect(obj)
+        if created_or_deleted or any(state.attrs[field].history.has_changes() for field in fields):
+            yield cache
+
+@event.listens_for(Session, 'after_flush')
+def collect_stale_caches(session, flush_context):
+    stale = session.info.setdefault('stale_caches', set())
+    for obj in list(session.new) + list(session.deleted):
+        stale.update(stale_caches(obj, True))
+    for obj in session.dirty:
+        stale.update(stale_caches(obj, False))
+
+# 表名 -> 模型，用于识别直接执行的批量 SQL 修改了哪个模型
+TABLE_MODELS = {model.__tablename__: model for model in CACHE_DEPENDENCIES}
+
+@event.listens_for(Session, 'do_orm_execute')
+def collect_bulk_writes(state):
+    """通过 session.execute 直接执行的 INSERT/UPDATE/DELETE（例如批量打标签）不经过 flush，按整个模型失效"""
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    table = getattr(state.statement, 'table', None)
+    model = TABLE_MODELS.get(getattr(table, 'name', None))
+    if model is not None:
+        state.session.info.setdefault('stale_models', set()).add(model)
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_stale_caches(session):
+    for cache in session.info.pop('stale_caches', ()):
+        cache.invalidate()
+    invalidate_caches(*session.info.pop('stale_models', ()))
+
+@event.listens_for(Session, 'after_rollback')
+def discard_stale_caches(session):
+    session.info.pop('stale_caches', None)
+    session.info.pop('stale_models', None)
+
+# 实时推送（见 events.py）；off 时不提供 /api/events，页面也不会连接
+EVENT_BACKEND = os.getenv('EVENT_BACKEND', 'local')
+LIVE_UPDATES_ENABLED = EVENT_BACKEND != 'off'
+EVENT_KEEPALIVE = float(os.getenv('EVENT_KEEPALIVE', '15'))
+EVENT_OPTIONS = {
+    'queue_size': int(os.getenv('EVENT_QUEUE_SIZE', '100')),
+    'max_subscribers': int(os.getenv('EVENT_MAX_SUBSCRIBERS', '1000')),
+}
+if EVENT_BACKEND == 'changelog':
+    with app.app_context():
+        event_broker = ChangeLogBroker(db.engine, float(os.getenv('EVENT_POLL_INTERVAL', '0.5')), **EVENT_OPTIONS)
+else:
+    event_broker = LocalBroker(**EVENT_OPTIONS)
+
+EVENT_MODELS = (Note, Todo, Project, ProjectTask)
+
+@event.listens_for(Session, 'after_flush')
+def collect_change_events(session, flush_context):
+    events = session.info.setdefault('change_events', [])
+    # 记录发起写入的客户端（X-Client-Id），推送时不发回给它自己的连接
+    client = request.headers.get('X-Client-Id') if has_request_context() else None
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, EVENT_MODELS):
+            events.append({'table': obj.__tablename__, 'id': obj.id, 'op': 'upsert', 'client': client})
+    for obj in session.deleted:
+        if isinstance(obj, EVENT_MODELS):
+            events.append({'table': obj.__tablename__, 'id': obj.id, 'op': 'delete', 'client': client})
+
+@event.listens_for(Session, 'after_commit')
+def publish_change_events(session):
+    event_broker.notify(session.info.pop('change_events', ()))
+
+@event.listens_for(Session, 'after_rollback')
+def discard_change_events(session):
+    session.info.pop('change_events', None)
+
+# HTTP 条件请求（见 http_cache.py）
+# 表版本号由 SQLite 触发器维护，非 SQLite 数据库不启用
+def load_table_versions():
+    if not app.config.get('HTTP_CACHE_ENABLED'):
+        return None
+    rows = db.session.execute(text('SELECT name, version, "changedAt" FROM table_version'))
+    return {name: (version, changed_at) for name, version, changed_at in rows}
+
+def table_version(table):
+    """表的当前版本号，未启用条件请求时为 None
+    
+    作为列表缓存 key 的一部分：在生成 ETag 之后读取，缓存的数据又在读取版本号之后加载，
+    因此响应的数据不会早于 ETag；其他进程写入后版本号变化，本进程里没有被失效的旧数据也不会再命中。
+    """
+    if not app.config.get('HTTP_CACHE_ENABLED'):
+        return None
+    return db.session.execute(
+        text('SELECT version FROM table_version WHERE name = :name'), {'name': table}
+    ).scalar() or 0
+
+# 代码更新后 ETag 随之变化
+conditional = ConditionalGet(load_table_versions, salt=str(os.path.getmtime(__file__)))
+static_hash = StaticHasher(app.static_folder)
+
+@app.url_defaults
+def add_static_hash(endpoint, values):
+    """url_for('static', ...) 自动附加内容哈希 ?v=..."""
+    if endpoint == 'static' and 'v' not in values:
+        digest = static_hash(values.get('filename', ''))
+        if digest:
+            values['v'] = digest
+
+@app.after_request
+def cache_hashed_static(response):
+    if request.endpoint == 'static' and request.args.get('v') and response.status_code in (200, 304):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+# 请求性能指标（见 metrics.py），/metrics 按 Prometheus 文本格式输出
+http_request_duration = metrics.Histogram(
+    'http_request_duration_seconds', '请求处理耗时（流式响应只计到开始输出）', ['endpoint', 'method', 'status']
+)
+http_response_size = metrics.Histogram(
+    'http_response_size_bytes', '响应体大小（流式响应不统计）', ['endpoint'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+)
+http_request_queries = metrics.Histogram(
+    'http_request_db_queries', '每个请求执行的 SQL 语句数', ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+)
+http_request_db_time = metrics.Histogram('http_request_db_seconds', '每个请求的 SQL 总耗时', ['endpoint'])
+http_exceptions = metrics.Counter('http_exceptions_total', '接口内捕获并返回 500 的异常数', ['endpoint'])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_time = 0.0
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or 'unmatched'
+    http_request_duration.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    http_request_queries.observe(g.db_queries, endpoint=endpoint)
+    http_request_db_time.observe(g.db_time, endpoint=endpoint)
+    if response.content_length is not None:
+        http_response_size.observe(response.content_length, endpoint=endpoint)
+    response.headers['Server-Timing'] = (
+        f'db;dur={g.db_time * 1000:.2f};desc="{g.db_queries} queries", '
+        f'app;dur={(elapsed - g.db_time) * 1000:.2f}'
+    )
+    return response
+
+def internal_error(error):
+    """记录异常堆栈并返回 500（响应格式与原来一致）"""
+    app.logger.exception('%s %s 处理失败', request.method, request.path)
+    http_exceptions.inc(endpoint=request.endpoint)
+    return jsonify({'error': str(error)}), 500
+
+def collect_component_stats():
+    """把各模块已有的统计转换为指标"""
+    caches = [(name, cache.stats()) for name, cache in cache_registry.items()]
+    http = conditional.stats()['endpoints']
+    events_stats = event_broker.stats()
+    return [
+        ('cache_hits_total', 'counter', '缓存命中次数', [({'cache': name}, s['hits']) for name, s in caches]),
+        ('cache_misses_total', 'counter', '缓存未命中次数', [({'cache': name}, s['misses']) for name, s in caches]),
+        ('cache_invalidations_total', 'counter', '缓存失效次数',
+         [({'cache': name}, s['invalidations']) for name, s in caches]),
+        ('cache_discarded_loads_total', 'counter', '加载期间被失效而没有写入缓存的次数',
+         [({'cache': name}, s['discarded']) for name, s in caches]),
+        ('cache_entries', 'gauge', '缓存条目数', [({'cache': name}, s['size']) for name, s in caches]),
+        ('http_conditional_requests_total', 'counter', '带 ETag 的接口请求数',
+         [({'endpoint': endpoint}, s['requests']) for endpoint, s in http.items()]),
+        ('http_not_modified_total', 'counter', '返回 304 的请求数',
+         [({'endpoint': endpoint}, s['notModified']) for endpoint, s in http.items()]),
+        ('sse_subscribers', 'gauge', '当前实时推送连接数', [({}, events_stats['subscribers'])]),
+        ('sse_events_published_total', 'counter', '发布的变更事件数', [({}, events_stats['published'])]),
+        ('sse_overflows_total', 'counter', '因客户端读取太慢而丢弃事件的次数', [({}, events_stats['overflows'])]),
+        ('jobs_pending', 'gauge', '排队中和执行中的后台任务数',
+         [({'kind': kind, 'status': status}, count)
+          for status, kinds in job_queue.counts().items() for kind, count in kinds.items()]),
+    ]
+
+metrics.collectors.append(collect_component_stats)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# 采样性能分析（PROFILER_ENABLED=1 时可用）：POST {"action": "start" | "stop"}，
+# GET /api/debug/profiler/stacks 返回折叠栈，可用 flamegraph.pl 生成火焰图
+profiler = metrics.SamplingProfiler(interval=float(os.getenv('PROFILER_INTERVAL_MS', '5')) / 1000)
+
+def require_profiler():
+    if os.getenv('PROFILER_ENABLED') != '1':
+        api_error('未启用性能分析（设置 PROFILER_ENABLED=1）', 404)
+
+@app.route('/api/debug/profiler', methods=['GET'])
+def get_profiler_status():
+    require_profiler()
+    return jsonify(profiler.status())
+
+@app.route('/api/debug/profiler', methods=['POST'])
+def toggle_profiler():
+    require_profiler()
+    action = (request.get_json(silent=True) or {}).get('action')
+    if action == 'start':
+        profiler.start()
+    elif action == 'stop':
+        profiler.stop()
+    else:
+        api_error('action 必须是 start 或 stop')
+    return jsonify(profiler.status())
+
+@app.route('/api/debug/profiler/stacks', methods=['GET'])
+def get_profiler_stacks():
+    require_profiler()
+    return Response(profiler.collapsed(request.args.get('limit', type=int)), mimetype='text/plain')
+
+# 笔记全文索引（SQLite FTS5）
+# 使用 trigram 分词器：中文没有空格分词，trigram 可以对任意子串建立索引，
+# 与原来 LIKE '%q%' 的匹配语义保持一致。trigram 不能检索少于3个字符的词，而中文检索词大多只有两个字，
+# 这些短词改查 note_fts_short：索引每个字和相邻的两个字（见 note_grams）。
+NOTE_FTS_MIN_TERM_LENGTH = 3
+
+NOTE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS note_fts USING fts5(
+        title, content, tag,
+        content='note', content_rowid='id',
+        tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_ai AFTER INSERT ON note BEGIN
+        INSERT INTO note_fts(rowid, title, content, tag)
+        VALUES (new.id, new.title, new.content, new.tag);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_ad AFTER DELETE ON note BEGIN
+        INSERT INTO note_fts(note_fts, rowid, title, content, tag)
+        VALUES ('delete', old.id, old.title, old.content, old.tag);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_au AFTER UPDATE OF title, content, tag ON note BEGIN
+        INSERT INTO note_fts(note_fts, rowid, title, content, tag)
+        VALUES ('delete', old.id, old.title, old.content, old.tag);
+        INSERT INTO note_fts(rowid, title, content, tag)
+        VALUES (new.id, new.title, new.content, new.tag);
+    END""",
+]
+
+# 短词索引：不保存原文（content=''）和词的位置（detail=none），只用于判断笔记是否包含某个词元。
+# 触发器调用 note_grams 函数，由每个数据库连接建立时注册（见 register_search_functions），
+# 因此只能通过本应用修改笔记；用其他工具直接修改 note 表会因为缺少这个函数而失败。
+NOTE_FTS_SHORT_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS note_fts_short USING fts5(
+        grams, content='', detail=none, tokenize='ascii'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_short_ai AFTER INSERT ON note BEGIN
+        INSERT INTO note_fts_short(rowid, grams) VALUES (new.id, note_grams(new.title, new.content, new.tag));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_short_ad AFTER DELETE ON note BEGIN
+        INSERT INTO note_fts_short(note_fts_short, rowid, grams)
+        VALUES ('delete', old.id, note_grams(old.title, old.content, old.tag));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_short_au AFTER UPDATE OF title, content, tag ON note BEGIN
+        INSERT INTO note_fts_short(note_fts_short, rowid, grams)
+        VALUES ('delete', old.id, note_grams(old.title, old.content, old.tag));
+        INSERT INTO note_fts_short(rowid, grams) VALUES (new.id, note_grams(new.title, new.content, new.tag));
+    END""",
+]
+
+def gram_token(term):
+    """一个或两个字的词元：每个字编码为 6 位十六进制，只包含 ascii 分词器的词字符"""
+    return ''.join(f'{ord(char):06x}' for char in term.lower())
+
+# 触发器在更新时先用旧内容删除索引再写入新内容，旧内容的结果通常就是上一次保存时算出的结果
+@functools.lru_cache(maxsize=16)
+def note_grams(*values):
+    """笔记中出现过的所有单字和相邻两字的词元（去重、排序，删除索引时能得到相同的结果）"""
+    words = set()
+    for value in values:
+        words.update((value or '').lower().split())
+    chars, pairs = set(), set()
+    for word in words:
+        chars.update(word)
+        pairs.update(map(''.join, zip(word, word[1:])))
+    codes = {char: f'{ord(char):06x}' for char in chars}
+    grams = list(codes.values()) + [codes[first] + codes[second] for first, second in pairs]
+    return ' '.join(sorted(grams))
+
+def register_search_functions(dbapi_connection, connection_record):
+    dbapi_connection.create_function('note_grams', -1, note_grams, deterministic=True)
+
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', register_search_functions)
+
+def init_search_index():
+    """创建笔记全文索引及同步触发器，返回索引是否可用"""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    try:
+        with db.engine.begin() as conn:
+            existing = set(conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('note_fts', 'note_fts_short')"
+            )).scalars())
+            for ddl in NOTE_FTS_DDL + NOTE_FTS_SHORT_DDL:
+                conn.execute(text(ddl))
+            # 已有数据库第一次建立索引时，需要把现有笔记导入索引
+            if 'note_fts' not in existing:
+                conn.execute(text("INSERT INTO note_fts(note_fts) VALUES ('rebuild')"))
+            if 'note_fts_short' not in existing:
+                rebuild_short_index(conn)
+    except OperationalError as e:
+        # SQLite 未编译 FTS5 或版本过旧（trigram 需要 3.34+），继续使用 LIKE 检索
+        app.logger.warning('全文索引不可用，笔记搜索回退到 LIKE: %s', e)
+        return False
+    return True
+
+def rebuild_short_index(conn):
+    # 不保存原文的索引不支持 rebuild 命令，清空后重新写入
+    conn.execute(text("INSERT INTO note_fts_short(note_fts_short) VALUES ('delete-all')"))
+    conn.execute(text(
+        'INSERT INTO note_fts_short(rowid, grams) SELECT id, note_grams(title, content, tag) FROM note'
+    ))
+
+def build_fts_query(search_query):
+    """把用户输入转换为 (trigram 索引的 MATCH 表达式, 短词索引的 MATCH 表达式)，没有对应的词时为 None"""
+    terms = search_query.split()
+    # 每个词作为短语加引号，避免用户输入被解析成 FTS5 语法
+    long_terms = ['"{}"'.format(term.replace('"', '""')) for term in terms if len(term) >= NOTE_FTS_MIN_TERM_LENGTH]
+    short_terms = [gram_token(term) for term in terms if len(term) < NOTE_FTS_MIN_TERM_LENGTH]
+    return ' AND '.join(long_terms) or None, ' AND '.join(short_terms) or None
+
+# 列表接口的分页与字段投影
+# 游标分页（keyset）：按 (时间列, id) 倒序，游标记录上一页最后一行的位置，
+# 翻页不需要 OFFSET 扫描前面的行。limit 缺省时返回全部数据，兼容旧客户端。
+MAX_PAGE_LIMIT = 500
+# 未分页的列表每次从数据库读取的行数
+STREAM_QUERY_BATCH = 1000
+
+def api_error(message, status=400, **extra):
+    """中断请求并返回 JSON 错误，extra 中的字段一并返回"""
+    abort(make_response(jsonify({'error': message, **extra}), status))
+
+def serialize_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def requested_fields(available):
+    """解析 ?fields=id,title,... 参数，未指定时返回全部字段"""
+    fields = request.args.get('fields')
+    if not fields:
+        return list(available)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        api_error(f'未知字段: {", ".join(unknown)}')
+    return fields
+
+def encode_cursor(sort_value, row_id):
+    raw = json.dumps([serialize_value(sort_value), row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        # 排序列为时间时游标中是 ISO 字符串，为排序权重等整数时原样保存
+        if not isinstance(sort_value, int):
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        api_error('无效的分页游标')
+
+def stream_query(query):
+    """逐批读取查询结果，读完后关闭查询所用的会话
+    
+    流式响应在视图返回之后才开始读取，此时 Flask-SQLAlchemy 已经在 teardown 中移除了视图的会话，
+    查询会在这个已脱离作用域的会话上重新取得连接，不主动关闭就要等到垃圾回收才会归还连接池。
+    """
+    try:
+        yield from query.yield_per(STREAM_QUERY_BATCH)
+    finally:
+        query.session.close()
+
+def paginate(query, sort_column, id_column, descending=True):
+    """按 (sort_column, id) 做游标分页（默认倒序），返回 (rows, next_cursor)"""
+    cursor = request.args.get('cursor')
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        # 行值比较 (sort, id) < (?, ?) 可以直接使用 (sort, id) 组合索引定位
+        position = db.tuple_(sort_column, id_column)
+        query = query.filter(position < (sort_value, row_id) if descending else position > (sort_value, row_id))
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    
+    limit = request.args.get('limit', type=int)
+    if not limit or limit < 0:
+        # 不分页时逐批读取，配合 list_response 流式输出
+        return stream_query(query), None
+    limit = min(limit, MAX_PAGE_LIMIT)
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(getattr(last, sort_column.key), last.id)
+
+def list_response(items, next_cursor):
+    """列表响应保持 JSON 数组格式，下一页游标放在 X-Next-Cursor 响应头中
+    
+    items 为列表时一次编码；为生成器（未分页的完整列表）时流式输出。
+    """
+    response = jsonify(items) if isinstance(items, list) else stream_array(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+NOTE_FIELDS = ['id', 'title', 'content', 'tag', 'createdAt', 'updatedAt', 'folderId', 'version']
+TODO_FIELDS = ['id', 'title', 'description', 'priority', 'completed', 'type', 'createdAt', 'updatedAt']
+PROJECT_FIELDS = [
+    'id', 'name', 'description', 'status', 'priority', 'start_date', 'end_date',
+    'progress', 'createdAt', 'updatedAt', 'taskCount', 'completedTasks'
+]
+TASK_FIELDS = [
+    'id', 'title', 'description', 'status', 'priority', 'assignee',
+    'start_date', 'due_date', 'projectId', 'createdAt', 'updatedAt'
+]
+
+folder_serializer = ModelSerializer(Folder, ['id', 'name'])
+note_serializer = ModelSerializer(Note, NOTE_FIELDS)
+todo_serializer = ModelSerializer(Todo, TODO_FIELDS)
+project_serializer = ModelSerializer(Project, PROJECT_FIELDS)
+task_serializer = ModelSerializer(ProjectTask, TASK_FIELDS)
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', live_updates=LIVE_UPDATES_ENABLED)
 
 # API接口
+def load_folders():
+    # 使用新的连接读取最新提交的数据，而不是请求事务开始时的快照（见 cache.TTLCache.get_or_load）
+    with db.engine.connect() as conn:
+        return folder_serializer.rows(conn.execute(folder_serializer.query().statement).all())
+
 @app.route('/api/folders', methods=['GET'])
+@conditional('folder')
 def get_folders():
-    folders = Folder.query.all()
-    return jsonify([{
-        'id': folder.id,
-        'name': folder.name
-    } for folder in folders])
+    return jsonify(folders_cache.get_or_load(('all', table_version('folder')), load_folders))
+
+# snippet() 先用控制字符标记命中位置，对笔记正文做 HTML 转义之后再替换为 <mark>，
+# 避免笔记内容中的标签原样出现在摘要里（笔记列表用 innerHTML 显示摘要）
+SNIPPET_MARK_START = '\x02'
+SNIPPET_MARK_END = '\x03'
+
+def highlight_snippet(snippet):
+    if snippet is None:
+        return None
+    # 正文里本来就有的控制字符最多产生多余的 <mark> 标签，不会引入其他 HTML
+    escaped = html.escape(snippet)
+    return escaped.replace(SNIPPET_MARK_START, '<mark>').replace(SNIPPET_MARK_END, '</mark>')
 
 @app.route('/api/notes', methods=['GET'])
+@conditional('note')
 def get_notes():
     folder_id = request.args.get('folderId')
     search_query = request.args.get('search')
+    fields = requested_fields(NOTE_FIELDS)
     
     # 构建基础查询
-    query = Note.query
+    query = note_serializer.query(fields, Note.id, Note.updatedAt)
     
     # 如果有文件夹筛选
     if folder_id:
         query = query.filter_by(folderId=folder_id)
     
-    # 如果有搜索关键词
-    if search_query:
+    fts_query, short_query = (build_fts_query(search_query) if search_query and app.config['NOTE_FTS_ENABLED']
+                              else (None, None))
+    if short_query:
+        short_matches = text(
+            'SELECT rowid AS note_id FROM note_fts_short WHERE note_fts_short MATCH :short_query'
+        ).bindparams(short_query=short_query).columns(note_id=db.Integer).subquery()
+        query = query.join(short_matches, short_matches.c.note_id == Note.id)
+    
+    # 有全文索引时按相关度排序，并返回高亮摘要（相关度排序不支持游标，只支持 limit）
+    if fts_query:
+        matches = text("""
+            SELECT rowid AS note_id,
+                   bm25(note_fts, 10.0, 1.0, 5.0) AS rank,
+                   snippet(note_fts, -1, :mark_start, :mark_end, '…', 16) AS snippet
+            FROM note_fts WHERE note_fts MATCH :query
+        """).bindparams(query=fts_query, mark_start=SNIPPET_MARK_START, mark_end=SNIPPET_MARK_END).columns(
+            note_id=db.Integer, rank=db.Float, snippet=db.Text
+        ).subquery()
+        query = query.join(matches, matches.c.note_id == Note.id).add_columns(
+            matches.c.snippet
+        ).order_by(matches.c.rank, Note.updatedAt.desc())
+        
+        limit = request.args.get('limit', type=int)
+        if limit and limit > 0:
+            query = query.limit(min(limit, MAX_PAGE_LIMIT))
+        
+        return jsonify([
+            dict(zip(fields, row), snippet=highlight_snippet(row.snippet))
+            for row in query.all()
+        ])
+    
+    # 如果有搜索关键词（没有全文索引）
+    if search_query and not short_query:
         search_pattern = f'%{search_query}%'
         query = query.filter(
             db.or_(
@@ -118,17 +811,14 @@ def get_notes():
             )
         )
     
-    notes = query.order_by(Note.updatedAt.desc()).all()
-    
-    return jsonify([{
-        'id': note.id,
-        'title': note.title,
-        'content': note.content,
-        'tag': note.tag,
-        'createdAt': note.createdAt.isoformat() if note.createdAt else None,
-        'updatedAt': note.updatedAt.isoformat() if note.updatedAt else None,
-        'folderId': note.folderId
-    } for note in notes])
+    notes, next_cursor = paginate(query, Note.updatedAt, Note.id)
+    return list_response(note_serializer.rows(notes, fields), next_cursor)
+
+@app.route('/api/notes/<int:note_id>', methods=['GET'])
+@conditional('note')
+def get_note(note_id):
+    note = Note.query.get_or_404(note_id)
+    return jsonify(note_serializer.dump(note))
 
 @app.route('/api/notes', methods=['POST'])
 def create_note():
@@ -141,104 +831,380 @@ def create_note():
     )
     db.session.add(note)
     db.session.commit()
-    return jsonify({
-        'id': note.id,
-        'title': note.title,
-        'content': note.content,
-        'tag': note.tag,
-        'createdAt': note.createdAt.isoformat(),
-        'updatedAt': note.updatedAt.isoformat(),
-        'folderId': note.folderId
-    }), 201
+    return jsonify(note_serializer.dump(note)), 201
+
+NOTE_EDITABLE_FIELDS = ('title', 'content', 'tag', 'folderId')
+
+def apply_note_changes(note, changes, new_revision=False):
+    """写入有变化的字段并递增版本号，没有任何变化时返回 False（不产生数据库写入）
+    
+    new_revision 为 True 时历史版本不与之前的保存合并（例如恢复历史版本时保留恢复前的内容）。
+    """
+    changes = {field: value for field, value in changes.items() if getattr(note, field) != value}
+    if not changes:
+        return False
+    old_title, old_content = note.title, note.content
+    for field, value in changes.items():
+        setattr(note, field, value)
+    note.version += 1
+    note.updatedAt = datetime.utcnow()
+    if 'title' in changes or 'content' in changes:
+        record_note_revision(note, old_title, old_content, note.updatedAt, coalesce=not new_revision)
+    db.session.commit()
+    return True
+
+# 笔记历史版本（存储格式见 revisions.py）
+# 同一窗口内、正文长度变化小于 REVISION_SIZE_WINDOW 个字符的连续保存合并为一个版本
+REVISION_WINDOW = float(os.getenv('REVISION_WINDOW', '300'))
+REVISION_SIZE_WINDOW = int(os.getenv('REVISION_SIZE_WINDOW', '2000'))
+# 整理时的保留策略，见 revisions.retained_seqs
+REVISION_KEEP_ALL_DAYS = int(os.getenv('REVISION_KEEP_ALL_DAYS', '7'))
+REVISION_DAILY_DAYS = int(os.getenv('REVISION_DAILY_DAYS', '90'))
+REVISION_FIELDS = ['seq', 'version', 'title', 'size', 'kind', 'createdAt', 'updatedAt']
+
+revision_serializer = ModelSerializer(NoteRevision, REVISION_FIELDS)
+# 合并保存时差异的基准（最新版本的上一个版本）在窗口内不变，缓存在进程内避免每次自动保存都还原差异链。
+# 整理不会删除正在合并的版本的上一个版本（它总是所在时间段中最新的版本），所以缓存不会失效
+revision_bases = TTLCache('revision_bases', ttl=REVISION_WINDOW, maxsize=32)
+
+def content_checksum(content):
+    return zlib.crc32((content or '').encode())
+
+def load_revision_content(note_id, seq, keyframe_seq):
+    """从关键帧开始应用差异，还原版本 seq 的正文"""
+    chain = db.session.query(NoteRevision.kind, NoteRevision.data).filter(
+        NoteRevision.noteId == note_id, NoteRevision.seq.between(keyframe_seq, seq)
+    ).order_by(NoteRevision.seq).all()
+    return revisions.reconstruct(chain)
+
+def record_note_revision(note, old_title, old_content, now, coalesce=True):
+    """笔记保存后记录历史版本：合并到最新版本，或在窗口结束后追加新版本。不提交事务"""
+    content = note.content or ''
+    latest = NoteRevision.query.filter_by(noteId=note.id).order_by(NoteRevision.seq.desc()).first()
+    if latest is None:
+        # 第一次修改（包括导入的笔记），先把修改前的内容存为基准版本
+        latest = NoteRevision(
+            noteId=note.id, seq=1, keyframeSeq=1, kind=revisions.KEYFRAME,
+            data=revisions.encode_keyframe(old_content), checksum=content_checksum(old_content),
+            title=old_title, size=len(old_content or ''), version=note.version - 1,
+            createdAt=min(note.createdAt or now, now), updatedAt=now
+        )
+        db.session.add(latest)
+    elif coalesce and (now - latest.createdAt).total_seconds() < REVISION_WINDOW \
+            and abs(len(content) - latest.size) < REVISION_SIZE_WINDOW:
+        # 窗口内：重新编码最新版本（差异的基准是它的上一个版本）
+        if latest.seq == latest.keyframeSeq:
+            kind, data = revisions.KEYFRAME, revisions.encode_keyframe(content)
+        else:
+            # 键中包含创建时间：回滚后同一个 seq 可能被另一个版本使用
+            key = (note.id, latest.seq, latest.createdAt)
+            base = revision_bases.get(key)
+            if base is None:
+                base = load_revision_content(note.id, latest.seq - 1, latest.keyframeSeq)
+                revision_bases.set(key, base)
+            kind, data = revisions.encode(base, content, latest.seq, latest.keyframeSeq)
+        latest.kind, latest.data = kind, data
+        if kind == revisions.KEYFRAME:
+            latest.keyframeSeq = latest.seq
+        latest.checksum = content_checksum(content)
+        latest.title, latest.size, latest.version, latest.updatedAt = note.title, len(content), note.version, now
+        return latest
+    
+    seq = latest.seq + 1
+    # 最新版本与修改前的正文一致时才能以它为差异的基准（数据库被直接修改过时改存关键帧）
+    base = (old_content or '') if latest.checksum == content_checksum(old_content) else None
+    kind, data = revisions.encode(base, content, seq, latest.keyframeSeq)
+    revision = NoteRevision(
+        noteId=note.id, seq=seq, keyframeSeq=seq if kind == revisions.KEYFRAME else latest.keyframeSeq,
+        kind=kind, data=data, checksum=content_checksum(content), title=note.title, size=len(content),
+        version=note.version, createdAt=now, updatedAt=now
+    )
+    db.session.add(revision)
+    if base is not None:
+        revision_bases.set((note.id, seq, now), base)
+    return revision
+
+def compact_note_revisions(note_id, now, keep_all_days, daily_days):
+    """按保留策略删除较早的版本并重新编码整条链，返回 (删除的版本数, 整理前字节数, 整理后字节数)。不提交事务"""
+    rows = NoteRevision.query.filter_by(noteId=note_id).order_by(NoteRevision.seq).all()
+    before = sum(len(row.data) for row in rows)
+    kept = revisions.retained_seqs([(row.seq, row.createdAt) for row in rows], now, keep_all_days, daily_days)
+    if len(kept) == len(rows):
+        return 0, before, before
+    
+    contents = revisions.reconstruct_all([(row.kind, row.data) for row in rows])
+    kept_rows, kept_contents = [], []
+    for row, content in zip(rows, contents):
+        if row.seq in kept:
+            kept_rows.append(row)
+            kept_contents.append(content)
+        else:
+            db.session.delete(row)
+    for row, (kind, data, keyframe_seq) in zip(kept_rows, revisions.reencode(kept_contents, [row.seq for row in kept_rows])):
+        row.kind, row.data, row.keyframeSeq = kind, data, keyframe_seq
+    return len(rows) - len(kept_rows), before, sum(len(row.data) for row in kept_rows)
+
+def check_base_version(note, data):
+    """请求带 baseVersion 且与当前版本不一致时返回 409"""
+    base_version = data.get('baseVersion')
+    if base_version is not None and base_version != note.version:
+        api_error('笔记已被其他客户端修改', 409, version=note.version)
 
 @app.route('/api/notes/<int:note_id>', methods=['PUT'])
 def update_note(note_id):
     note = Note.query.get_or_404(note_id)
     data = request.json
+    check_base_version(note, data)
     
-    note.title = data.get('title', note.title)
-    note.content = data.get('content', note.content)
-    note.tag = data.get('tag', note.tag)
-    note.folderId = data.get('folderId', note.folderId)
-    note.updatedAt = datetime.utcnow()
+    apply_note_changes(note, {field: data[field] for field in NOTE_EDITABLE_FIELDS if field in data})
+    return jsonify(note_serializer.dump(note))
+
+def apply_text_patch(content, ops):
+    """把文本补丁应用到 content 上
     
-    db.session.commit()
-    return jsonify({
-        'id': note.id,
-        'title': note.title,
-        'content': note.content,
-        'tag': note.tag,
-        'updatedAt': note.updatedAt.isoformat(),
-        'folderId': note.folderId
-    })
+    ops 为 [{"start": s, "end": e, "text": t}, ...]，表示把基准内容中 [s, e) 替换为 t。
+    偏移量按 UTF-16 编码单元计算，与浏览器中 JavaScript 字符串下标一致；
+    各操作必须按 start 升序且互不重叠，均相对于同一个基准内容。格式错误时抛出 ValueError（中文说明）。
+    """
+    if not isinstance(ops, list):
+        raise ValueError('ops 必须是数组')
+    data = (content or '').encode('utf-16-le')
+    length = len(data) // 2
+    parts = []
+    position = 0
+    for index, op in enumerate(ops):
+        if not isinstance(op, dict):
+            raise ValueError(f'第 {index + 1} 个补丁操作必须是对象')
+        start, end, replacement = op.get('start'), op.get('end'), op.get('text', '')
+        # bool 是 int 的子类，需要单独排除
+        if any(not isinstance(value, int) or isinstance(value, bool) for value in (start, end)):
+            raise ValueError(f'第 {index + 1} 个补丁操作的 start 和 end 必须是整数')
+        if not isinstance(replacement, str):
+            raise ValueError(f'第 {index + 1} 个补丁操作的 text 必须是字符串')
+        if not position <= start <= end <= length:
+            raise ValueError(f'第 {index + 1} 个补丁操作的位置超出范围或与前一个操作重叠')
+        parts.append(data[position * 2:start * 2])
+        parts.append(replacement.encode('utf-16-le'))
+        position = end
+    parts.append(data[position * 2:])
+    try:
+        return b''.join(parts).decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise ValueError('补丁位置落在字符中间（代理对被拆开）')
+
+@app.route('/api/notes/<int:note_id>', methods=['PATCH'])
+def patch_note(note_id):
+    """增量保存：只上传正文的差异部分
+    
+    请求体：{"baseVersion": n, "ops": [...], "title"/"tag"/"folderId": 可选}
+    baseVersion 与当前版本不一致时返回 409 和当前版本号，客户端需要重新加载或改用全量保存。
+    响应只包含 id、version 和 updatedAt，不回传正文。
+    """
+    note = Note.query.get_or_404(note_id)
+    data = request.get_json()
+    if not isinstance(data, dict):
+        api_error('请求体必须是对象')
+    base_version = data.get('baseVersion')
+    if base_version is None:
+        api_error('缺少 baseVersion')
+    if not isinstance(base_version, int) or isinstance(base_version, bool):
+        api_error('baseVersion 必须是整数')
+    check_base_version(note, data)
+    
+    changes = {field: data[field] for field in NOTE_EDITABLE_FIELDS if field in data and field != 'content'}
+    if data.get('ops') is not None:
+        try:
+            changes['content'] = apply_text_patch(note.content, data['ops'])
+        except ValueError as e:
+            api_error(str(e))
+    
+    changed = apply_note_changes(note, changes)
+    return jsonify(dict(note_serializer.dump(note, ['id', 'version', 'updatedAt']), changed=changed))
 
 @app.route('/api/notes/<int:note_id>', methods=['DELETE'])
 def delete_note(note_id):
     note = Note.query.get_or_404(note_id)
+    NoteRevision.query.filter_by(noteId=note_id).delete()
     db.session.delete(note)
     db.session.commit()
     return '', 204
 
+@app.route('/api/notes/<int:note_id>/revisions', methods=['GET'])
+@conditional('note', 'note_revision')
+def get_note_revisions(note_id):
+    """笔记的历史版本列表（不含正文），按 seq 倒序，支持 limit 和游标分页"""
+    Note.query.get_or_404(note_id)
+    fields = requested_fields(REVISION_FIELDS)
+    query = revision_serializer.query(fields, NoteRevision.id, NoteRevision.seq).filter(NoteRevision.noteId == note_id)
+    items, next_cursor = paginate(query, NoteRevision.seq, NoteRevision.id)
+    return list_response(revision_serializer.rows(items, fields), next_cursor)
+
+@app.route('/api/notes/<int:note_id>/revisions/<int:seq>', methods=['GET'])
+@conditional('note_revision')
+def get_note_revision(note_id, seq):
+    revision = NoteRevision.query.filter_by(noteId=note_id, seq=seq).first_or_404()
+    content = load_revision_content(note_id, seq, revision.keyframeSeq)
+    return jsonify(dict(revision_serializer.dump(revision), content=content))
+
+@app.route('/api/notes/<int:note_id>/revisions/<int:seq>/restore', methods=['POST'])
+def restore_note_revision(note_id, seq):
+    """把笔记的标题和正文恢复为某个历史版本（恢复本身也会记录为一个新版本），可以带 baseVersion"""
+    note = Note.query.get_or_404(note_id)
+    check_base_version(note, request.get_json(silent=True) or {})
+    revision = NoteRevision.query.filter_by(noteId=note_id, seq=seq).first_or_404()
+    content = load_revision_content(note_id, seq, revision.keyframeSeq)
+    apply_note_changes(note, {'title': revision.title, 'content': content}, new_revision=True)
+    return jsonify(note_serializer.dump(note))
+
 # TODO API接口
+TODO_PRIORITIES = ('low', 'medium', 'high')
+TODO_TYPES = ('todo', 'pomodoro')
+
+# 优先级按 high > medium > low 排序，未知值排在最后（使用 ix_todo_priority_rank 表达式索引）
+TODO_PRIORITY_RANK = db.literal_column(TODO_PRIORITY_RANK_SQL, db.Integer).label('priorityRank')
+
+# ?sort= 的取值：字段名表示正序，前缀 - 表示倒序，每种排序都有对应的索引
+TODO_SORTS = {
+    'createdAt': Todo.createdAt,
+    'updatedAt': Todo.updatedAt,
+    'priority': TODO_PRIORITY_RANK,
+}
+
+def parse_bool_arg(name):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    api_error(f'{name} 只能是 true 或 false')
+
+def parse_choices_arg(name, choices):
+    """解析逗号分隔的枚举参数，例如 ?priority=high,medium"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    values = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = [item for item in values if item not in choices]
+    if unknown:
+        api_error(f'{name} 的取值无效: {", ".join(unknown)}')
+    return values
+
+def parse_date_arg(name, end_of_day=False):
+    """解析 ISO 日期或时间；只有日期且 end_of_day 为 True 时返回第二天零点（作为开区间上界）"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            day = datetime.combine(date.fromisoformat(value), datetime.min.time())
+            return day + timedelta(days=1) if end_of_day else day
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        api_error(f'{name} 不是有效的日期')
+    # 数据库中保存的是不带时区的 UTC 时间
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def choices_filter(column, values):
+    """单个取值用等值条件，可以使用以该列开头的索引；多个取值时 IN 会分别查找每个值，
+    合并后的结果不再有序，需要临时 B 树排序，因此改为 `列 || ''` 让 SQLite 不使用该列的索引，
+    按排序列的索引顺序扫描并过滤（取值只有几种，多选时命中的行占大部分，分页时很快就能取满一页）"""
+    if len(values) == 1:
+        return column == values[0]
+    return column.concat('').in_(values)
+
+def todo_filters(query):
+    """按 completed、priority、type、createdFrom、createdTo 参数筛选待办"""
+    completed = parse_bool_arg('completed')
+    if completed is not None:
+        query = query.filter(Todo.completed == completed)
+    priorities = parse_choices_arg('priority', TODO_PRIORITIES)
+    if priorities:
+        query = query.filter(choices_filter(Todo.priority, priorities))
+    types = parse_choices_arg('type', TODO_TYPES)
+    if types:
+        query = query.filter(choices_filter(Todo.type, types))
+    created_from = parse_date_arg('createdFrom')
+    if created_from:
+        query = query.filter(Todo.createdAt >= created_from)
+    created_to = parse_date_arg('createdTo', end_of_day=True)
+    if created_to:
+        query = query.filter(Todo.createdAt < created_to)
+    return query
+
 @app.route('/api/todos', methods=['GET'])
+@conditional('todo')
 def get_todos():
-    todos = Todo.query.order_by(Todo.createdAt.desc()).all()
-    return jsonify([{
-        'id': todo.id,
-        'title': todo.title,
-        'description': todo.description,
-        'priority': todo.priority,
-        'completed': todo.completed,
-        'type': todo.type,
-        'createdAt': todo.createdAt.isoformat(),
-        'updatedAt': todo.updatedAt.isoformat()
-    } for todo in todos])
+    """待办列表
+    
+    筛选参数：completed=true|false，priority=high,medium（可多选），type=todo|pomodoro，
+    createdFrom / createdTo（ISO 日期或时间，只写日期时包含当天）。
+    排序参数 sort：createdAt、updatedAt、priority，前缀 - 表示倒序，默认 -createdAt。
+    """
+    fields = requested_fields(TODO_FIELDS)
+    sort = request.args.get('sort') or '-createdAt'
+    sort_column = TODO_SORTS.get(sort.lstrip('-'))
+    if sort_column is None:
+        api_error(f'sort 只能是 {", ".join(TODO_SORTS)}（前缀 - 表示倒序）')
+    
+    query = todo_filters(todo_serializer.query(fields, Todo.id, sort_column))
+    todos, next_cursor = paginate(query, sort_column, Todo.id, descending=sort.startswith('-'))
+    return list_response(todo_serializer.rows(todos, fields), next_cursor)
 
-@app.route('/api/todos', methods=['POST'])
-def create_todo():
-    data = request.get_json()
-    todo = Todo(
+@app.route('/api/todos/counts', methods=['GET'])
+@conditional('todo')
+def get_todo_counts():
+    """按完成状态、优先级和类型统计待办数量，支持与列表相同的筛选参数"""
+    rows = todo_filters(db.session.query(
+        Todo.completed, Todo.priority, Todo.type, db.func.count(Todo.id)
+    )).group_by(Todo.completed, Todo.priority, Todo.type).all()
+    
+    counts = {
+        'total': 0,
+        'completed': 0,
+        'pending': 0,
+        'byPriority': dict.fromkeys(TODO_PRIORITIES, 0),
+        'byType': dict.fromkeys(TODO_TYPES, 0),
+    }
+    for completed, priority, todo_type, count in rows:
+        counts['total'] += count
+        counts['completed' if completed else 'pending'] += count
+        counts['byPriority'][priority] = counts['byPriority'].get(priority, 0) + count
+        counts['byType'][todo_type] = counts['byType'].get(todo_type, 0) + count
+    return jsonify(counts)
+
+def new_todo(data):
+    return Todo(
         title=data.get('title', ''),
         description=data.get('description', ''),
         priority=data.get('priority', 'medium'),
         type=data.get('type', 'todo')
     )
-    db.session.add(todo)
-    db.session.commit()
-    return jsonify({
-        'id': todo.id,
-        'title': todo.title,
-        'description': todo.description,
-        'priority': todo.priority,
-        'completed': todo.completed,
-        'type': todo.type,
-        'createdAt': todo.createdAt.isoformat(),
-        'updatedAt': todo.updatedAt.isoformat()
-    }), 201
 
-@app.route('/api/todos/<int:todo_id>', methods=['PUT'])
-def update_todo(todo_id):
-    todo = Todo.query.get_or_404(todo_id)
-    data = request.get_json()
-    
+def update_todo_fields(todo, data):
     todo.title = data.get('title', todo.title)
     todo.description = data.get('description', todo.description)
     todo.priority = data.get('priority', todo.priority)
     todo.completed = data.get('completed', todo.completed)
     todo.type = data.get('type', todo.type)
     todo.updatedAt = datetime.utcnow()
-    
+
+@app.route('/api/todos', methods=['POST'])
+def create_todo():
+    todo = new_todo(request.get_json())
+    db.session.add(todo)
     db.session.commit()
-    return jsonify({
-        'id': todo.id,
-        'title': todo.title,
-        'description': todo.description,
-        'priority': todo.priority,
-        'completed': todo.completed,
-        'type': todo.type,
-        'createdAt': todo.createdAt.isoformat(),
-        'updatedAt': todo.updatedAt.isoformat()
-    })
+    return jsonify(todo_serializer.dump(todo)), 201
+
+@app.route('/api/todos/<int:todo_id>', methods=['PUT'])
+def update_todo(todo_id):
+    todo = Todo.query.get_or_404(todo_id)
+    update_todo_fields(todo, request.get_json())
+    db.session.commit()
+    return jsonify(todo_serializer.dump(todo))
 
 @app.route('/api/todos/<int:todo_id>', methods=['DELETE'])
 def delete_todo(todo_id):
@@ -247,35 +1213,225 @@ def delete_todo(todo_id):
     db.session.commit()
     return '', 204
 
+# 番茄钟记录和统计
+POMODORO_FIELDS = ['id', 'todoId', 'startedAt', 'endedAt', 'duration', 'day']
+POMODORO_MAX_DURATION = 24 * 3600
+# 统计接口默认返回最近一年
+POMODORO_DEFAULT_DAYS = 365
+
+pomodoro_serializer = ModelSerializer(PomodoroSession, POMODORO_FIELDS)
+
+def apply_pomodoro_delta(day, todo_id, sessions, seconds):
+    """增量更新某天某个待办的番茄钟汇总，不提交事务，由调用方与记录写入一起提交"""
+    daily = PomodoroDaily.__table__
+    key = (daily.c.day == day) & (daily.c.todoId == (todo_id or 0))
+    updated = db.session.execute(daily.update().where(key).values(
+        sessions=daily.c.sessions + sessions,
+        seconds=daily.c.seconds + seconds
+    )).rowcount
+    if not updated:
+        # 写事务以 BEGIN IMMEDIATE 开始，UPDATE 和 INSERT 之间不会有其他写入插进来
+        db.session.execute(daily.insert().values(day=day, todoId=todo_id or 0, sessions=sessions, seconds=seconds))
+    elif sessions < 0:
+        db.session.execute(daily.delete().where(key & (daily.c.sessions <= 0)))
+
+def rebuild_pomodoro_daily():
+    """按记录表重新生成全部汇总，返回汇总行数"""
+    daily = PomodoroDaily.__table__
+    db.session.execute(daily.delete())
+    db.session.execute(daily.insert().from_select(
+        ['day', 'todoId', 'sessions', 'seconds'],
+        db.select(
+            PomodoroSession.day,
+            db.func.coalesce(PomodoroSession.todoId, 0),
+            db.func.count(PomodoroSession.id),
+            db.func.sum(PomodoroSession.duration)
+        ).group_by(PomodoroSession.day, db.func.coalesce(PomodoroSession.todoId, 0))
+    ))
+    db.session.commit()
+    return db.session.query(PomodoroDaily).count()
+
+def parse_datetime_value(value, name):
+    """解析请求体中的 ISO 时间，返回不带时区的 UTC 时间"""
+    try:
+        moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        api_error(f'{name} 不是有效的时间')
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def parse_day_arg(name, default=None):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        api_error(f'{name} 不是有效的日期（YYYY-MM-DD）')
+
+def pomodoro_today():
+    """?today= 为客户端的本地日期，默认按 UTC"""
+    return parse_day_arg('today', datetime.utcnow().date())
+
+def pomodoro_range():
+    """统计接口的日期范围 ?from=&to=（包含两端），默认截至 today 的最近一年
+    
+    默认范围随日期变化，同时用于统计接口的 ETag
+    """
+    today = pomodoro_today()
+    end = parse_day_arg('to', today)
+    start = parse_day_arg('from', end - timedelta(days=POMODORO_DEFAULT_DAYS - 1))
+    if start > end:
+        api_error('from 不能晚于 to')
+    return start, end
+
+@app.route('/api/pomodoro/sessions', methods=['POST'])
+def create_pomodoro_session():
+    """记录一个完成的番茄钟
+    
+    请求体：{"startedAt": ISO 时间, "endedAt": ISO 时间（默认当前时间）, "duration": 专注秒数（默认为两者之差）,
+    "todoId": 可选, "timezoneOffset": 客户端 Date.getTimezoneOffset()，用于确定记录属于本地的哪一天}
+    """
+    data = request.get_json() or {}
+    if not data.get('startedAt'):
+        return jsonify({'error': 'startedAt is required'}), 400
+    started_at = parse_datetime_value(data['startedAt'], 'startedAt')
+    ended_at = parse_datetime_value(data['endedAt'], 'endedAt') if data.get('endedAt') else datetime.utcnow()
+    if ended_at <= started_at:
+        return jsonify({'error': 'endedAt 必须晚于 startedAt'}), 400
+    
+    try:
+        duration = int(data.get('duration') or (ended_at - started_at).total_seconds())
+        offset = int(data.get('timezoneOffset') or 0)
+        todo_id = int(data['todoId']) if data.get('todoId') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'duration、timezoneOffset 和 todoId 必须是整数'}), 400
+    if not 0 < duration <= POMODORO_MAX_DURATION or abs(offset) > 24 * 60:
+        return jsonify({'error': 'duration 或 timezoneOffset 超出范围'}), 400
+    
+    if todo_id is not None and not db.session.get(Todo, todo_id):
+        return jsonify({'error': '待办不存在'}), 400
+    
+    session = PomodoroSession(
+        todoId=todo_id,
+        startedAt=started_at,
+        endedAt=ended_at,
+        duration=duration,
+        day=pomodoro_stats.local_day(started_at, offset)
+    )
+    db.session.add(session)
+    apply_pomodoro_delta(session.day, todo_id, 1, duration)
+    db.session.commit()
+    return jsonify(pomodoro_serializer.dump(session)), 201
+
+@app.route('/api/pomodoro/sessions', methods=['GET'])
+@conditional('pomodoro_session')
+def get_pomodoro_sessions():
+    """番茄钟记录，按开始时间倒序，支持 ?todoId=、?from=&to=（本地日期）和游标分页"""
+    fields = requested_fields(POMODORO_FIELDS)
+    query = pomodoro_serializer.query(fields, PomodoroSession.id, PomodoroSession.startedAt)
+    todo_id = request.args.get('todoId', type=int)
+    if todo_id:
+        query = query.filter(PomodoroSession.todoId == todo_id)
+    start, end = parse_day_arg('from'), parse_day_arg('to')
+    if start:
+        query = query.filter(PomodoroSession.day >= start)
+    if end:
+        query = query.filter(PomodoroSession.day <= end)
+    sessions, next_cursor = paginate(query, PomodoroSession.startedAt, PomodoroSession.id)
+    return list_response(pomodoro_serializer.rows(sessions, fields), next_cursor)
+
+@app.route('/api/pomodoro/sessions/<int:session_id>', methods=['DELETE'])
+def delete_pomodoro_session(session_id):
+    session = PomodoroSession.query.get_or_404(session_id)
+    apply_pomodoro_delta(session.day, session.todoId, -1, -session.duration)
+    db.session.delete(session)
+    db.session.commit()
+    return '', 204
+
+@app.route('/api/pomodoro/stats', methods=['GET'])
+@conditional('pomodoro_daily', 'todo', vary=pomodoro_range)
+def get_pomodoro_stats():
+    """番茄钟统计，只读取按日汇总表
+    
+    ?groupBy=day（默认）| week | todo，?from=&to= 为本地日期（包含两端，默认最近一年），?todoId= 只统计一个待办。
+    day / week 只返回有记录的日期，周以周一的日期表示。
+    """
+    group_by = request.args.get('groupBy', 'day')
+    if group_by not in ('day', 'week', 'todo'):
+        api_error('groupBy 只能是 day、week 或 todo')
+    start, end = pomodoro_range()
+    
+    query = db.session.query(
+        db.func.sum(PomodoroDaily.sessions), db.func.sum(PomodoroDaily.seconds)
+    ).filter(PomodoroDaily.day >= start, PomodoroDaily.day <= end)
+    todo_id = request.args.get('todoId', type=int)
+    if todo_id is not None:
+        query = query.filter(PomodoroDaily.todoId == todo_id)
+    
+    if group_by == 'todo':
+        rows = query.add_columns(PomodoroDaily.todoId).group_by(PomodoroDaily.todoId).all()
+        titles = dict(db.session.query(Todo.id, Todo.title).filter(
+            Todo.id.in_([todo_id for _, _, todo_id in rows if todo_id])
+        ).all())
+        items = sorted((
+            {'todoId': todo_id or None, 'title': titles.get(todo_id), 'sessions': sessions, 'seconds': seconds}
+            for sessions, seconds, todo_id in rows
+        ), key=lambda item: item['seconds'], reverse=True)
+    else:
+        daily = query.add_columns(PomodoroDaily.day).group_by(PomodoroDaily.day).order_by(PomodoroDaily.day).all()
+        daily = [(day, sessions, seconds) for sessions, seconds, day in daily]
+        if group_by == 'week':
+            items = [{'week': week, 'sessions': sessions, 'seconds': seconds}
+                     for week, sessions, seconds in pomodoro_stats.group_by_week(daily)]
+        else:
+            items = [{'day': day, 'sessions': sessions, 'seconds': seconds} for day, sessions, seconds in daily]
+    
+    return jsonify({
+        'groupBy': group_by,
+        'from': start,
+        'to': end,
+        'sessions': sum(item['sessions'] for item in items),
+        'seconds': sum(item['seconds'] for item in items),
+        'items': items,
+    })
+
+@app.route('/api/pomodoro/streak', methods=['GET'])
+@conditional('pomodoro_daily', vary=pomodoro_today)
+def get_pomodoro_streak():
+    """连续专注天数；?today= 为客户端的本地日期（默认按 UTC）"""
+    today = pomodoro_today()
+    rows = db.session.query(
+        PomodoroDaily.day, db.func.sum(PomodoroDaily.sessions), db.func.sum(PomodoroDaily.seconds)
+    ).group_by(PomodoroDaily.day).having(db.func.sum(PomodoroDaily.sessions) > 0).order_by(PomodoroDaily.day).all()
+    current, longest = pomodoro_stats.streaks([row[0] for row in rows], today)
+    today_row = next((row for row in reversed(rows) if row[0] == today), None)
+    return jsonify({
+        'current': current,
+        'longest': longest,
+        'activeDays': len(rows),
+        'today': {'sessions': today_row[1] if today_row else 0, 'seconds': today_row[2] if today_row else 0},
+    })
+
 # 项目管理API接口
 @app.route('/api/projects', methods=['GET'])
+@conditional('project')
 def get_projects():
     status_filter = request.args.get('status')
     priority_filter = request.args.get('priority')
     
-    query = Project.query
+    fields = requested_fields(PROJECT_FIELDS)
+    
+    query = project_serializer.query(fields, Project.id, Project.updatedAt)
     
     if status_filter:
         query = query.filter_by(status=status_filter)
     if priority_filter:
         query = query.filter_by(priority=priority_filter)
     
-    projects = query.order_by(Project.updatedAt.desc()).all()
-    
-    return jsonify([{
-        'id': project.id,
-        'name': project.name,
-        'description': project.description,
-        'status': project.status,
-        'priority': project.priority,
-        'start_date': project.start_date.isoformat() if project.start_date else None,
-        'end_date': project.end_date.isoformat() if project.end_date else None,
-        'progress': project.progress,
-        'createdAt': project.createdAt.isoformat(),
-        'updatedAt': project.updatedAt.isoformat(),
-        'taskCount': len(project.tasks),
-        'completedTasks': len([task for task in project.tasks if task.status == 'done'])
-    } for project in projects])
+    projects, next_cursor = paginate(query, Project.updatedAt, Project.id)
+    return list_response(project_serializer.rows(projects, fields), next_cursor)
 
 @app.route('/api/projects', methods=['POST'])
 def create_project():
@@ -294,20 +1450,43 @@ def create_project():
     db.session.add(project)
     db.session.commit()
     
-    return jsonify({
-        'id': project.id,
-        'name': project.name,
-        'description': project.description,
-        'status': project.status,
-        'priority': project.priority,
-        'start_date': project.start_date.isoformat() if project.start_date else None,
-        'end_date': project.end_date.isoformat() if project.end_date else None,
-        'progress': project.progress,
-        'createdAt': project.createdAt.isoformat(),
-        'updatedAt': project.updatedAt.isoformat(),
-        'taskCount': 0,
-        'completedTasks': 0
-    }), 201
+    return jsonify(project_serializer.dump(project)), 201
+
+# 项目详情中笔记只返回摘要字段，不加载正文
+NOTE_SUMMARY_FIELDS = ['id', 'title', 'tag', 'folderId', 'createdAt', 'updatedAt']
+TASK_STATUSES = ('todo', 'inprogress', 'done')
+
+@app.route('/api/projects/<int:project_id>', methods=['GET'])
+@conditional('project', 'project_task', 'project_note', 'note')
+def get_project(project_id):
+    """项目详情，同时返回任务和关联笔记摘要，打开项目只需要一次请求
+    
+    ?taskStatus=todo,inprogress 只返回这些状态的任务；?include=tasks,notes 选择嵌入的内容（默认两者都返回）。
+    任务和笔记通过 selectin 预加载，无论数量多少固定为三条查询（项目、任务、关联及笔记）。
+    """
+    include = parse_choices_arg('include', ('tasks', 'notes'))
+    include = ('tasks', 'notes') if include is None else include
+    statuses = parse_choices_arg('taskStatus', TASK_STATUSES)
+    
+    options = []
+    if 'tasks' in include:
+        tasks = Project.tasks.and_(ProjectTask.status.in_(statuses)) if statuses else Project.tasks
+        options.append(selectinload(tasks))
+    if 'notes' in include:
+        options.append(selectinload(Project.project_notes).joinedload(ProjectNote.note).load_only(
+            *[getattr(Note, field) for field in NOTE_SUMMARY_FIELDS], raiseload=True
+        ))
+    project = Project.query.options(*options).filter_by(id=project_id).first_or_404()
+    
+    result = project_serializer.dump(project)
+    if 'tasks' in include:
+        tasks = sorted(project.tasks, key=lambda task: (task.createdAt, task.id), reverse=True)
+        result['tasks'] = [task_serializer.dump(task) for task in tasks]
+    if 'notes' in include:
+        notes = sorted((link.note for link in project.project_notes if link.note),
+                       key=lambda note: (note.updatedAt, note.id), reverse=True)
+        result['notes'] = [note_serializer.dump(note, NOTE_SUMMARY_FIELDS) for note in notes]
+    return jsonify(result)
 
 @app.route('/api/projects/<int:project_id>', methods=['PUT'])
 def update_project(project_id):
@@ -325,19 +1504,7 @@ def update_project(project_id):
     
     db.session.commit()
     
-    return jsonify({
-        'id': project.id,
-        'name': project.name,
-        'description': project.description,
-        'status': project.status,
-        'priority': project.priority,
-        'start_date': project.start_date.isoformat() if project.start_date else None,
-        'end_date': project.end_date.isoformat() if project.end_date else None,
-        'progress': project.progress,
-        'updatedAt': project.updatedAt.isoformat(),
-        'taskCount': len(project.tasks),
-        'completedTasks': len([task for task in project.tasks if task.status == 'done'])
-    })
+    return jsonify(project_serializer.dump(project))
 
 @app.route('/api/projects/<int:project_id>', methods=['DELETE'])
 def delete_project(project_id):
@@ -348,37 +1515,23 @@ def delete_project(project_id):
 
 # 项目任务管理接口
 @app.route('/api/projects/<int:project_id>/tasks', methods=['GET'])
+@conditional('project', 'project_task')
 def get_project_tasks(project_id):
     project = Project.query.get_or_404(project_id)
     status_filter = request.args.get('status')
     
-    query = ProjectTask.query.filter_by(projectId=project_id)
+    fields = requested_fields(TASK_FIELDS)
+    
+    query = task_serializer.query(fields, ProjectTask.id, ProjectTask.createdAt).filter_by(projectId=project_id)
     
     if status_filter:
         query = query.filter_by(status=status_filter)
     
-    tasks = query.order_by(ProjectTask.createdAt.desc()).all()
-    
-    return jsonify([{
-        'id': task.id,
-        'title': task.title,
-        'description': task.description,
-        'status': task.status,
-        'priority': task.priority,
-        'assignee': task.assignee,
-        'start_date': task.start_date.isoformat() if task.start_date else None,
-        'due_date': task.due_date.isoformat() if task.due_date else None,
-        'projectId': task.projectId,
-        'createdAt': task.createdAt.isoformat(),
-        'updatedAt': task.updatedAt.isoformat()
-    } for task in tasks])
+    tasks, next_cursor = paginate(query, ProjectTask.createdAt, ProjectTask.id)
+    return list_response(task_serializer.rows(tasks, fields), next_cursor)
 
-@app.route('/api/projects/<int:project_id>/tasks', methods=['POST'])
-def create_project_task(project_id):
-    project = Project.query.get_or_404(project_id)
-    data = request.get_json()
-    
-    task = ProjectTask(
+def new_project_task(project_id, data):
+    return ProjectTask(
         title=data.get('title', ''),
         description=data.get('description', ''),
         status=data.get('status', 'todo'),
@@ -388,31 +1541,10 @@ def create_project_task(project_id):
         due_date=datetime.fromisoformat(data['due_date']) if data.get('due_date') else None,
         projectId=project_id
     )
-    
-    db.session.add(task)
-    db.session.commit()
-    
-    # 更新项目进度
-    update_project_progress(project_id)
-    
-    return jsonify({
-        'id': task.id,
-        'title': task.title,
-        'description': task.description,
-        'status': task.status,
-        'priority': task.priority,
-        'assignee': task.assignee,
-        'start_date': task.start_date.isoformat() if task.start_date else None,
-        'due_date': task.due_date.isoformat() if task.due_date else None,
-        'projectId': task.projectId,
-        'createdAt': task.createdAt.isoformat(),
-        'updatedAt': task.updatedAt.isoformat()
-    }), 201
 
-@app.route('/api/project-tasks/<int:task_id>', methods=['PUT'])
-def update_project_task(task_id):
-    task = ProjectTask.query.get_or_404(task_id)
-    data = request.get_json()
+def update_task_fields(task, data):
+    """修改任务字段，返回完成数的变化（-1、0 或 1），用于更新项目进度"""
+    was_done = task.status == 'done'
     
     task.title = data.get('title', task.title)
     task.description = data.get('description', task.description)
@@ -423,23 +1555,31 @@ def update_project_task(task_id):
     task.due_date = datetime.fromisoformat(data['due_date']) if data.get('due_date') else task.due_date
     task.updatedAt = datetime.utcnow()
     
+    return (task.status == 'done') - was_done
+
+@app.route('/api/projects/<int:project_id>/tasks', methods=['POST'])
+def create_project_task(project_id):
+    project = Project.query.get_or_404(project_id)
+    task = new_project_task(project_id, request.get_json())
+    
+    db.session.add(task)
+    # 更新项目进度（与任务写入在同一事务中提交）
+    apply_task_delta(project_id, 1, 1 if task.status == 'done' else 0)
     db.session.commit()
     
-    # 更新项目进度
-    update_project_progress(task.projectId)
+    return jsonify(task_serializer.dump(task)), 201
+
+@app.route('/api/project-tasks/<int:task_id>', methods=['PUT'])
+def update_project_task(task_id):
+    task = ProjectTask.query.get_or_404(task_id)
+    
+    # 只有完成状态变化时才需要更新项目进度
+    completed_delta = update_task_fields(task, request.get_json())
+    apply_task_delta(task.projectId, 0, completed_delta)
     
-    return jsonify({
-        'id': task.id,
-        'title': task.title,
-        'description': task.description,
-        'status': task.status,
-        'priority': task.priority,
-        'assignee': task.assignee,
-        'start_date': task.start_date.isoformat() if task.start_date else None,
-        'due_date': task.due_date.isoformat() if task.due_date else None,
-        'projectId': task.projectId,
-        'updatedAt': task.updatedAt.isoformat()
-    })
+    db.session.commit()
+    
+    return jsonify(task_serializer.dump(task))
 
 @app.route('/api/project-tasks/<int:task_id>', methods=['DELETE'])
 def delete_project_task(task_id):
@@ -447,40 +1587,179 @@ def delete_project_task(task_id):
     project_id = task.projectId
     
     db.session.delete(task)
+    apply_task_delta(project_id, -1, -1 if task.status == 'done' else 0)
     db.session.commit()
     
-    # 更新项目进度
-    update_project_progress(project_id)
-    
     return '', 204
 
-def update_project_progress(project_id):
-    """更新项目进度"""
-    project = Project.query.get(project_id)
-    if project and project.tasks:
-        total_tasks = len(project.tasks)
-        completed_tasks = len([task for task in project.tasks if task.status == 'done'])
-        project.progress = int((completed_tasks / total_tasks) * 100) if total_tasks > 0 else 0
-        db.session.commit()
+# 批量修改：一个请求中的所有操作在同一个事务中执行
+BATCH_MAX_OPERATIONS = 1000
+BATCH_MODELS = {'todo': Todo, 'task': ProjectTask}
+
+@app.route('/api/batch', methods=['POST'])
+def batch_mutate():
+    """批量创建、修改、删除待办和项目任务
+    
+    请求体：{"operations": [{"op": "create" | "update" | "delete", "type": "todo" | "task", "id": ..., "data": {...}}, ...]}
+    data 必须是对象，创建任务时 data 中需要整数 projectId。操作按顺序执行并一次提交，任何一个失败时全部回滚，
+    错误响应中的 index 为失败操作的序号。涉及的记录和项目各用一条查询预先加载，
+    项目进度在最后按项目汇总后每个项目更新一次。
+    返回 {"results": [...]}，与 operations 一一对应：创建和修改返回记录，删除返回 {"id": ..., "deleted": true}。
+    """
+    operations = (request.get_json(silent=True) or {}).get('operations')
+    if not isinstance(operations, list) or not operations:
+        api_error('operations 必须是非空数组')
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        api_error(f'一次最多 {BATCH_MAX_OPERATIONS} 个操作')
+    
+    wanted = {kind: set() for kind in BATCH_MODELS}
+    project_ids = set()
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('type') not in BATCH_MODELS:
+            api_error('type 只能是 todo 或 task', index=index)
+        if operation.get('op') not in ('create', 'update', 'delete'):
+            api_error('op 只能是 create、update 或 delete', index=index)
+        if not isinstance(operation.get('data', {}), dict):
+            api_error('data 必须是对象', index=index)
+        if operation['op'] == 'create':
+            if operation['type'] == 'task':
+                project_id = operation.get('data', {}).get('projectId')
+                if isinstance(project_id, bool) or not isinstance(project_id, int):
+                    api_error('创建任务需要整数 projectId', index=index)
+                project_ids.add(project_id)
+        elif not isinstance(operation.get('id'), int):
+            api_error('update 和 delete 需要整数 id', index=index)
+        else:
+            wanted[operation['type']].add(operation['id'])
+    
+    loaded = {
+        kind: {row.id: row for row in model.query.filter(model.id.in_(wanted[kind]))} if wanted[kind] else {}
+        for kind, model in BATCH_MODELS.items()
+    }
+    existing_projects = {
+        project_id for (project_id,) in db.session.query(Project.id).filter(Project.id.in_(project_ids))
+    } if project_ids else set()
+    
+    def fail(message, status, index):
+        # 前面的操作可能已经自动 flush，回滚后再返回错误
+        db.session.rollback()
+        api_error(message, status, index=index)
+    
+    serializers = {'todo': todo_serializer, 'task': task_serializer}
+    task_deltas = {}  # {projectId: [任务数变化, 完成数变化]}
+    results = []
+    for index, operation in enumerate(operations):
+        kind, op, data = operation['type'], operation['op'], operation.get('data', {})
+        try:
+            if op == 'create':
+                if kind == 'todo':
+                    row = new_todo(data)
+                else:
+                    if data.get('projectId') not in existing_projects:
+                        fail('项目不存在', 404, index)
+                    row = new_project_task(data['projectId'], data)
+                    delta = task_deltas.setdefault(row.projectId, [0, 0])
+                    delta[0] += 1
+                    delta[1] += row.status == 'done'
+                db.session.add(row)
+                results.append(row)
+                continue
+            
+            row = loaded[kind].get(operation['id'])
+            if row is None:
+                fail('记录不存在', 404, index)
+            if op == 'update':
+                if kind == 'todo':
+                    update_todo_fields(row, data)
+                else:
+                    task_deltas.setdefault(row.projectId, [0, 0])[1] += update_task_fields(row, data)
+                results.append(row)
+            else:
+                if kind == 'task':
+                    delta = task_deltas.setdefault(row.projectId, [0, 0])
+                    delta[0] -= 1
+                    delta[1] -= row.status == 'done'
+                db.session.delete(row)
+                del loaded[kind][row.id]
+                results.append({'id': row.id, 'deleted': True})
+        except (TypeError, ValueError) as e:
+            # 日期等字段格式错误
+            fail(f'数据格式错误: {e}', 400, index)
+    
+    for project_id, (total_delta, completed_delta) in task_deltas.items():
+        apply_task_delta(project_id, total_delta, completed_delta)
+    # 提交前序列化（flush 后新记录已有 id），提交会让对象过期，之后读取字段要逐条重新查询
+    db.session.flush()
+    results = [
+        result if isinstance(result, dict) else serializers['todo' if isinstance(result, Todo) else 'task'].dump(result)
+        for result in results
+    ]
+    db.session.commit()
+    return jsonify({'results': results})
+
+def get_task_counts(project_ids=None):
+    """一次分组查询统计项目的任务总数和已完成数，返回 {projectId: (total, completed)}"""
+    query = db.session.query(
+        ProjectTask.projectId,
+        db.func.count(ProjectTask.id),
+        db.func.sum(db.case((ProjectTask.status == 'done', 1), else_=0))
+    )
+    if project_ids is not None:
+        if not project_ids:
+            return {}
+        query = query.filter(ProjectTask.projectId.in_(project_ids))
+    rows = query.group_by(ProjectTask.projectId).all()
+    return {project_id: (total, completed or 0) for project_id, total, completed in rows}
+
+def apply_task_delta(project_id, total_delta, completed_delta):
+    """增量更新项目的任务计数和进度，不提交事务，由调用方与任务写入一起提交
+    
+    使用单条 UPDATE 在数据库中计算，不需要加载项目的任务列表，并发写入时也不会丢失计数。
+    项目没有任务时保留原有进度（进度可以在项目上手动设置）。
+    """
+    if not total_delta and not completed_delta:
+        return
+    project = Project.__table__
+    new_total = project.c.taskCount + total_delta
+    new_completed = project.c.completedTasks + completed_delta
+    db.session.execute(project.update().where(project.c.id == project_id).values(
+        taskCount=new_total,
+        completedTasks=new_completed,
+        progress=db.case((new_total > 0, new_completed * 100 // new_total), else_=project.c.progress)
+    ))
+
+def reconcile_project_progress(project_ids=None):
+    """按任务表重新统计项目的任务数、完成数和进度，修正增量计数可能出现的偏差
+    
+    返回被修正的项目数量。
+    """
+    query = Project.query
+    if project_ids is not None:
+        query = query.filter(Project.id.in_(project_ids))
+    projects = query.all()
+    counts = get_task_counts(None if project_ids is None else [p.id for p in projects])
+    
+    fixed = 0
+    for project in projects:
+        total, completed = counts.get(project.id, (0, 0))
+        progress = completed * 100 // total if total else project.progress
+        if (project.taskCount, project.completedTasks, project.progress) != (total, completed, progress):
+            project.taskCount = total
+            project.completedTasks = completed
+            project.progress = progress
+            fixed += 1
+    db.session.commit()
+    return fixed
 
 # 项目笔记关联接口
 @app.route('/api/projects/<int:project_id>/notes', methods=['GET'])
+@conditional('project', 'project_note', 'note')
 def get_project_notes(project_id):
     project = Project.query.get_or_404(project_id)
-    project_notes = ProjectNote.query.filter_by(projectId=project_id).all()
-    
-    note_ids = [pn.noteId for pn in project_notes]
-    notes = Note.query.filter(Note.id.in_(note_ids)).order_by(Note.updatedAt.desc()).all()
-    
-    return jsonify([{
-        'id': note.id,
-        'title': note.title,
-        'content': note.content,
-        'tag': note.tag,
-        'createdAt': note.createdAt.isoformat() if note.createdAt else None,
-        'updatedAt': note.updatedAt.isoformat() if note.updatedAt else None,
-        'folderId': note.folderId
-    } for note in notes])
+    notes = note_serializer.query().join(ProjectNote, ProjectNote.noteId == Note.id).filter(
+        ProjectNote.projectId == project_id
+    ).order_by(Note.updatedAt.desc()).all()
+    return jsonify(note_serializer.rows(notes))
 
 @app.route('/api/projects/<int:project_id>/notes', methods=['POST'])
 def link_note_to_project(project_id):
@@ -510,7 +1789,7 @@ def link_note_to_project(project_id):
         'id': project_note.id,
         'projectId': project_note.projectId,
         'noteId': project_note.noteId,
-        'createdAt': project_note.createdAt.isoformat()
+        'createdAt': project_note.createdAt
     }), 201
 
 @app.route('/api/projects/<int:project_id>/notes/<int:note_id>', methods=['DELETE'])
@@ -524,53 +1803,272 @@ def unlink_note_from_project(project_id, note_id):
 
 # 项目统计接口
 @app.route('/api/projects/stats', methods=['GET'])
+@conditional('project')
 def get_project_stats():
     try:
-        total_projects = Project.query.count()
-        active_projects = Project.query.filter_by(status='active').count()
-        completed_projects = Project.query.filter_by(status='completed').count()
-        
-        total_tasks = ProjectTask.query.count()
-        completed_tasks = ProjectTask.query.filter_by(status='done').count()
+        return jsonify(stats_cache.get_or_load(('stats', table_version('project')), load_project_stats))
+    except Exception as e:
+        return internal_error(e)
+
+def load_project_stats():
+    """一次聚合查询统计项目和任务数量（任务数来自项目上的计数列）"""
+    # 与 load_folders 相同，使用新的连接读取最新提交的数据
+    with db.engine.connect() as conn:
+        totals = conn.execute(db.select(
+            db.func.count(Project.id),
+            db.func.sum(db.case((Project.status == 'active', 1), else_=0)),
+            db.func.sum(db.case((Project.status == 'completed', 1), else_=0)),
+            db.func.sum(Project.taskCount),
+            db.func.sum(Project.completedTasks)
+        )).one()
         
         # 获取最近更新的项目
-        recent_projects = Project.query.order_by(Project.updatedAt.desc()).limit(5).all()
-        
-        return jsonify({
-            'totalProjects': total_projects,
-            'activeProjects': active_projects,
-            'completedProjects': completed_projects,
-            'totalTasks': total_tasks,
-            'completedTasks': completed_tasks,
-            'recentProjects': [{
-                'id': p.id,
-                'name': p.name,
-                'status': p.status,
-                'progress': p.progress,
-                'updatedAt': p.updatedAt.isoformat()
-            } for p in recent_projects]
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        recent_projects = conn.execute(db.select(
+            Project.id, Project.name, Project.status, Project.progress, Project.updatedAt
+        ).order_by(Project.updatedAt.desc()).limit(5)).all()
+    total_projects, active_projects, completed_projects, total_tasks, completed_tasks = totals
+    
+    return {
+        'totalProjects': total_projects,
+        'activeProjects': active_projects or 0,
+        'completedProjects': completed_projects or 0,
+        'totalTasks': total_tasks or 0,
+        'completedTasks': completed_tasks or 0,
+        'recentProjects': [{
+            'id': p.id,
+            'name': p.name,
+            'status': p.status,
+            'progress': p.progress,
+            'updatedAt': p.updatedAt.isoformat()
+        } for p in recent_projects]
+    }
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({name: cache.stats() for name, cache in cache_registry.items()})
+
+@app.route('/api/http-cache/stats', methods=['GET'])
+def get_http_cache_stats():
+    """条件请求统计：各接口的请求数和 304 比例"""
+    return jsonify(conditional.stats())
 
 # 获取所有标签
 @app.route('/api/tags', methods=['GET'])
+@conditional('note_tag')
 def get_tags():
+    """所有标签，"全部"始终在第一位；?counts=true 时返回 [{"tag": ..., "count": 笔记数}]"""
     try:
-        # 获取所有不重复的标签
-        tags = db.session.query(Note.tag).distinct().filter(Note.tag.isnot(None)).filter(Note.tag != '').all()
-        tag_list = [tag[0] for tag in tags if tag[0]]
-        # 确保"全部"始终在第一位
-        if '全部' not in tag_list:
-            tag_list.insert(0, '全部')
-        else:
-            tag_list.remove('全部')
-            tag_list.insert(0, '全部')
+        counts = tags_cache.get_or_load(('counts', table_version('note_tag')), load_tag_counts)
+        if parse_bool_arg('counts'):
+            return jsonify([{'tag': tag, 'count': count} for tag, count in counts.items()])
+        tag_list = [tag for tag in counts if tag != '全部']
+        tag_list.insert(0, '全部')
         return jsonify(tag_list)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return internal_error(e)
+
+def load_tag_counts():
+    """{标签: 笔记数}，按标签排序（ix_note_tag 覆盖索引上的一次分组查询）"""
+    query = db.session.query(Note.tag, db.func.count()).filter(Note.tag.isnot(None), Note.tag != '').group_by(Note.tag)
+    with db.engine.connect() as conn:
+        return dict(conn.execute(query.statement).all())
+
+# 批量导入导出（NDJSON）
+# 类型按写入顺序排列：被引用的记录（文件夹、项目、笔记）在引用它们的记录之前写入
+BULK_TYPES = {
+    'folder': Folder,
+    'note': Note,
+    'todo': Todo,
+    'project': Project,
+    'task': ProjectTask,
+    'project_note': ProjectNote,
+}
+# 项目的任务计数由导入的任务重新统计，不接受导入值
+BULK_SKIP_COLUMNS = {'project': ('taskCount', 'completedTasks')}
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', '1000'))
+
+@app.route('/api/import', methods=['POST'])
+def bulk_import():
+    chunk_size = request.args.get('chunkSize', BULK_CHUNK_SIZE, type=int)
+    if chunk_size < 1:
+        api_error('chunkSize 必须大于 0')
+    
+    started = time.perf_counter()
+    importer = bulk.Importer(db, BULK_TYPES, chunk_size, BULK_SKIP_COLUMNS)
+    # 逐行读取请求体，不把整个文件读入内存；请求流按行迭代时逐字节读取，需要加缓冲
+    stream = io.BufferedReader(request.stream, 1 << 16)
+    for line_no, line in enumerate(stream, 1):
+        try:
+            importer.feed(line_no, line.decode('utf-8'))
+        except UnicodeDecodeError:
+            importer.error(line_no, '不是有效的 UTF-8 文本')
+    result = importer.finish()
+    
+    # 批量 SQL 不经过 apply_task_delta 和会话事件，单独修正计数并失效缓存
+    project_ids = importer.references.get(('task', 'projectId'), set())
+    if project_ids:
+        reconcile_project_progress(list(project_ids))
+    invalidate_caches(*BULK_TYPES.values())
+    # 批量 SQL 不经过会话事件，按类型各发一条事件，客户端整体重新加载
+    event_broker.notify([
+        {'table': BULK_TYPES[type_name].__tablename__, 'id': None, 'op': 'bulk'}
+        for type_name, count in result['imported'].items() if count
+    ])
+    
+    elapsed = time.perf_counter() - started
+    total = sum(result['imported'].values())
+    result['elapsedMs'] = round(elapsed * 1000)
+    result['rowsPerSecond'] = round(total / elapsed) if elapsed else total
+    return jsonify(result), 200 if total or not result['errorCount'] else 400
+
+@app.route('/api/export', methods=['GET'])
+def bulk_export():
+    types = request.args.get('types')
+    type_names = [t.strip() for t in types.split(',') if t.strip()] if types else list(BULK_TYPES)
+    unknown = [t for t in type_names if t not in BULK_TYPES]
+    if unknown:
+        api_error(f'未知类型: {", ".join(unknown)}', allowed=list(BULK_TYPES))
+    
+    lines = bulk.export_lines(db, BULK_TYPES, type_names, dumps, BULK_CHUNK_SIZE)
+    response = Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename=export-{date.today().isoformat()}.ndjson'
+    return response
+
+# 增量同步
+# 变更日志由触发器写入（见 migrations.CHANGE_LOG_TABLES），表名 -> (响应中的键, 序列化器)
+SYNC_COLLECTIONS = {
+    'note': ('notes', note_serializer),
+    'todo': ('todos', todo_serializer),
+    'project': ('projects', project_serializer),
+    'project_task': ('tasks', task_serializer),
+}
+SYNC_PAGE_LIMIT = 1000
+CHANGE_LOG_RETENTION_DAYS = int(os.getenv('CHANGE_LOG_RETENTION_DAYS', '30'))
+
+@app.route('/api/sync', methods=['GET'])
+def sync_changes():
+    """返回令牌 since 之后新增、修改和删除的笔记、待办、项目和任务
+    
+    不带 since 时只返回当前令牌 {"next": "..."}：客户端先取令牌，再全量加载列表，之后用令牌增量同步。
+    响应 {"changes": {"notes": {"upserted": [...], "deleted": [id, ...]}, ...}, "next": "...", "hasMore": bool}，
+    hasMore 为 true 时用 next 继续请求。令牌过期时返回 410，客户端需要全量重新加载。
+    """
+    if not app.config.get('CHANGE_LOG_ENABLED'):
+        api_error('当前数据库不支持增量同步', 501)
+    since = request.args.get('since')
+    if since is None:
+        return jsonify({'next': str(change_feed.current_seq(db.session))})
+    try:
+        since = change_feed.parse_token(since)
+    except ValueError as e:
+        api_error(str(e))
+    limit = request.args.get('limit', SYNC_PAGE_LIMIT, type=int)
+    if limit < 1:
+        api_error('limit 必须大于 0')
+    
+    try:
+        changes, next_seq, has_more = change_feed.read_changes(db.session, since, min(limit, SYNC_PAGE_LIMIT))
+    except change_feed.TokenExpired:
+        api_error('同步令牌已过期，请重新加载全部数据', 410)
+    
+    result = {}
+    for table, (key, serializer) in SYNC_COLLECTIONS.items():
+        entry = changes.get(table, {'upsert': [], 'delete': []})
+        # 日志读取之后才被删除的行这里查不到，它的删除记录会在下一次同步中返回
+        rows = serializer.query().filter(serializer.model.id.in_(entry['upsert'])).all() if entry['upsert'] else []
+        result[key] = {'upserted': serializer.rows(rows), 'deleted': entry['delete']}
+    return jsonify({'changes': result, 'next': str(next_seq), 'hasMore': has_more})
+
+# 实时推送
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """SSE 推送变更事件
+    
+    change 事件：{"table": "note" | "todo" | "project" | "project_task", "id": ..., "op": "upsert" | "delete" | "bulk"}
+    resync 事件：客户端读取太慢导致事件被丢弃，需要重新加载全部数据
+    带 ?clientId= 时跳过写入请求的 X-Client-Id 与之相同的事件（客户端自己的修改）
+    """
+    if not LIVE_UPDATES_ENABLED:
+        api_error('实时推送未启用', 404)
+    client_id = request.args.get('clientId')
+    try:
+        subscription = event_broker.subscribe()
+    except TooManySubscribers:
+        return jsonify({'error': '实时推送连接数已达上限'}), 503
+    
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                if subscription.overflowed:
+                    subscription.reset()
+                    yield sse_event('resync', {})
+                    continue
+                change = subscription.get(EVENT_KEEPALIVE)
+                if change is None:
+                    # 定期发送注释行，客户端断开后下一次写入即可发现并释放订阅
+                    yield ': keepalive\n\n'
+                elif not client_id or change.get('client') != client_id:
+                    yield sse_event('change', {key: value for key, value in change.items() if key != 'client'})
+        finally:
+            event_broker.unsubscribe(subscription)
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/events/stats', methods=['GET'])
+def get_event_stats():
+    return jsonify(event_broker.stats())
 
 # AI接口
+def truncate_for_prompt(content, prefix):
+    return f'{prefix}\n\n{content[:500]}...' if len(content) > 500 else content
+
+# 耗时的 AI 调用和密钥校验登记为后台任务：带 ?async=1 时写入队列并立即返回 202，
+# 否则仍在请求线程中直接执行。标题和标签是用户在等待的短请求，优先于润色执行
+JOB_FIELDS = ['id', 'kind', 'status', 'priority', 'attempts', 'maxAttempts', 'error',
+              'runAt', 'createdAt', 'startedAt', 'finishedAt']
+job_serializer = ModelSerializer(Job, JOB_FIELDS)
+
+def dump_job(job):
+    return dict(job_serializer.dump(job), result=json.loads(job.result) if job.result else None)
+
+def run_job(kind, payload):
+    """?async=1 时写入任务队列，返回 202 和任务状态（Location 指向 /api/jobs/<id>，可带 ?priority= 调整优先级）；
+    否则在请求线程中直接执行并返回结果"""
+    if parse_bool_arg('async'):
+        job_queue.start(JOB_WORKERS)
+        job = job_queue.enqueue(kind, payload, request.args.get('priority', type=int))
+        response = jsonify(dump_job(job))
+        response.status_code = 202
+        response.headers['Location'] = f'/api/jobs/{job.id}'
+        return response
+    try:
+        return jsonify(job_queue.run_inline(kind, payload))
+    except JobError as e:
+        return jsonify({'error': str(e)}), 400
+    except AIError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return internal_error(e)
+
+@job_queue.register('ai.generate_title', priority=10, concurrency=ai_client.max_concurrency)
+def ai_generate_title(payload):
+    reload_env()
+    reply = ai_client.chat([
+        {
+            'role': 'system',
+            'content': '你是一个专业的标题生成器。请根据提供的文本内容生成一个简洁、有吸引力的标题，不超过20个字。'
+        },
+        {
+            'role': 'user',
+            'content': truncate_for_prompt(payload['content'], '请为这个笔记内容生成一个标题：')
+        }
+    ], max_tokens=50)
+    return {'title': reply.strip().replace('"', '')}
+
 @app.route('/api/ai/generate-title', methods=['POST'])
 def generate_title():
     data = request.json
@@ -579,38 +2077,25 @@ def generate_title():
     if not content:
         return jsonify({'error': '内容不能为空'}), 400
     
-    try:
-        api_key = os.getenv('OPENROUTER_API_KEY')
-        if not api_key:
-            return jsonify({'error': '未配置API密钥'}), 500
-        
-        response = requests.post(
-            'https://openrouter.ai/api/v1/chat/completions',
-            headers={
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            },
-            json={
-                'model': 'gpt-3.5-turbo',
-                'messages': [
-                    {
-                        'role': 'system',
-                        'content': '你是一个专业的标题生成器。请根据提供的文本内容生成一个简洁、有吸引力的标题，不超过20个字。'
-                    },
-                    {
-                        'role': 'user',
-                        'content': f'请为这个笔记内容生成一个标题：\n\n{content[:500]}...' if len(content) > 500 else content
-                    }
-                ],
-                'max_tokens': 50
-            }
-        )
-        
-        result = response.json()
-        title = result['choices'][0]['message']['content'].strip().replace('"', '')
-        return jsonify({'title': title})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return run_job('ai.generate_title', {'content': content})
+
+def polish_messages(content):
+    return [
+        {
+            'role': 'system',
+            'content': '你是一个专业的文本润色专家。请对提供的文本进行润色，使其更加通顺、专业，保持原意不变。'
+        },
+        {
+            'role': 'user',
+            'content': f'请润色这段文本：\n\n{content}'
+        }
+    ]
+
+# 润色耗时最长，限制同时运行的个数，给标题和标签留出上游并发
+@job_queue.register('ai.polish_content', concurrency=max(1, ai_client.max_concurrency // 2))
+def ai_polish_content(payload):
+    reload_env()
+    return {'polished': ai_client.chat(polish_messages(payload['content']), max_tokens=1000).strip()}
 
 @app.route('/api/ai/polish-content', methods=['POST'])
 def polish_content():
@@ -620,38 +2105,99 @@ def polish_content():
     if not content:
         return jsonify({'error': '内容不能为空'}), 400
     
+    return run_job('ai.polish_content', {'content': content})
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+@app.route('/api/ai/polish-content/stream', methods=['POST'])
+def polish_content_stream():
+    """流式润色：以 Server-Sent Events 逐段转发上游生成的内容
+    
+    事件依次为若干个 delta（{"content": "..."}），最后是 done（包含首字节耗时）或 error。
+    客户端断开后 WSGI 服务器会关闭响应生成器，上游连接随之关闭。
+    """
+    data = request.json
+    content = data.get('content', '')
+    
+    if not content:
+        return jsonify({'error': '内容不能为空'}), 400
+    
+    started = time.perf_counter()
+    reload_env()
     try:
-        api_key = os.getenv('OPENROUTER_API_KEY')
-        if not api_key:
-            return jsonify({'error': '未配置API密钥'}), 500
-        
-        response = requests.post(
-            'https://openrouter.ai/api/v1/chat/completions',
-            headers={
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            },
-            json={
-                'model': 'gpt-3.5-turbo',
-                'messages': [
-                    {
-                        'role': 'system',
-                        'content': '你是一个专业的文本润色专家。请对提供的文本进行润色，使其更加通顺、专业，保持原意不变。'
-                    },
-                    {
-                        'role': 'user',
-                        'content': f'请润色这段文本：\n\n{content}'
-                    }
-                ],
-                'max_tokens': 1000
-            }
-        )
-        
-        result = response.json()
-        polished = result['choices'][0]['message']['content'].strip()
-        return jsonify({'polished': polished})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        chunks = ai_client.stream_chat(polish_messages(content), max_tokens=1000)
+    except AIError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    def generate():
+        ttfb_ms = None
+        try:
+            for chunk in chunks:
+                if ttfb_ms is None:
+                    ttfb_ms = (time.perf_counter() - started) * 1000
+                yield sse_event('delta', {'content': chunk})
+            total_ms = (time.perf_counter() - started) * 1000
+            app.logger.info('polish stream finished: ttfb=%.1fms total=%.1fms', ttfb_ms or 0, total_ms)
+            yield sse_event('done', {'ttfbMs': round(ttfb_ms or 0, 1), 'totalMs': round(total_ms, 1)})
+        except AIError as e:
+            yield sse_event('error', {'error': str(e)})
+        finally:
+            chunks.close()
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # 关闭反向代理缓冲，保证逐段送达
+    })
+
+# 批量打标签任务
+@app.route('/api/ai/batch-tags', methods=['POST'])
+def start_batch_tagging():
+    reload_env()
+    if not os.getenv('OPENROUTER_API_KEY'):
+        return jsonify({'error': '未配置API密钥'}), 500
+    
+    data = request.get_json(silent=True) or {}
+    started = batch_tagger.start(
+        batch_size=int(data.get('batchSize', 10)),
+        workers=int(data.get('workers', 4)),
+        rate=float(data.get('rate', 2.0)),
+        include_stale=bool(data.get('includeStale', False)),
+        resume=bool(data.get('resume', True))
+    )
+    if not started:
+        return jsonify({'error': '批量打标签任务正在运行'}), 409
+    return jsonify(batch_tagger.status()), 202
+
+@app.route('/api/ai/batch-tags', methods=['GET'])
+def get_batch_tagging_status():
+    return jsonify(batch_tagger.status())
+
+@app.route('/api/ai/batch-tags', methods=['DELETE'])
+def stop_batch_tagging():
+    batch_tagger.stop()
+    return jsonify(batch_tagger.status()), 202
+
+@app.route('/api/ai/stats', methods=['GET'])
+def get_ai_stats():
+    return jsonify(ai_client.stats())
+
+@job_queue.register('ai.generate_tags', priority=10, concurrency=ai_client.max_concurrency)
+def ai_generate_tags(payload):
+    reload_env()
+    tags = ai_client.chat([
+        {
+            'role': 'system',
+            'content': '你是一个标签生成专家。请根据提供的文本内容生成3-5个相关的标签，用逗号分隔。标签应该简洁、准确，能够概括文本的主要内容和主题。'
+        },
+        {
+            'role': 'user',
+            'content': truncate_for_prompt(payload['content'], '请为这个笔记内容生成标签：')
+        }
+    ], max_tokens=100).strip()
+    
+    # 确保标签格式正确
+    return {'tags': [tag.strip() for tag in tags.split(',') if tag.strip()]}
 
 @app.route('/api/ai/generate-tags', methods=['POST'])
 def generate_tags():
@@ -661,48 +2207,32 @@ def generate_tags():
     if not content:
         return jsonify({'error': '内容不能为空'}), 400
     
-    try:
-        api_key = os.getenv('OPENROUTER_API_KEY')
-        if not api_key:
-            return jsonify({'error': '未配置API密钥'}), 500
-        
-        response = requests.post(
-            'https://openrouter.ai/api/v1/chat/completions',
-            headers={
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            },
-            json={
-                'model': 'gpt-3.5-turbo',
-                'messages': [
-                    {
-                        'role': 'system',
-                        'content': '你是一个标签生成专家。请根据提供的文本内容生成3-5个相关的标签，用逗号分隔。标签应该简洁、准确，能够概括文本的主要内容和主题。'
-                    },
-                    {
-                        'role': 'user',
-                        'content': f'请为这个笔记内容生成标签：\n\n{content[:500]}...' if len(content) > 500 else content
-                    }
-                ],
-                'max_tokens': 100
-            }
-        )
-        
-        result = response.json()
-        tags = result['choices'][0]['message']['content'].strip()
-        # 确保标签格式正确
-        tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
-        return jsonify({'tags': tag_list})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return run_job('ai.generate_tags', {'content': content})
 
 @app.route('/api/config', methods=['GET'])
 def get_api_config():
+    reload_env()
     api_key = os.getenv('OPENROUTER_API_KEY')
     return jsonify({
         'has_api_key': bool(api_key)
     })
 
+# 密钥只在任务执行期间保存在任务表中，任务结束后清空；同时只校验一个，避免并发写 .env
+@job_queue.register('config.set_api_key', priority=20, max_attempts=2, concurrency=1, sensitive=True)
+def validate_and_save_api_key(payload):
+    api_key = payload['apiKey']
+    # 验证API密钥
+    if not ai_client.validate_key(api_key):
+        raise JobError('API密钥无效')
+    
+    # 更新.env文件
+    with open(ENV_PATH, 'w') as f:
+        f.write(f'OPENROUTER_API_KEY="{api_key}"\n')
+    
+    # 更新环境变量
+    os.environ['OPENROUTER_API_KEY'] = api_key
+    return {'message': 'API密钥已更新'}
+
 @app.route('/api/config/api-key', methods=['POST'])
 def set_api_key():
     data = request.json
@@ -711,40 +2241,120 @@ def set_api_key():
     if not api_key:
         return jsonify({'error': 'API密钥不能为空'}), 400
     
-    try:
-        # 验证API密钥
-        test_response = requests.post(
-            'https://openrouter.ai/api/v1/chat/completions',
-            headers={
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            },
-            json={
-                'model': 'gpt-3.5-turbo',
-                'messages': [{'role': 'user', 'content': 'test'}],
-                'max_tokens': 1
-            }
-        )
-        
-        if test_response.status_code == 200:
-            # 更新.env文件
-            env_path = os.path.join(os.path.dirname(__file__), '.env')
-            with open(env_path, 'w') as f:
-                f.write(f'OPENROUTER_API_KEY="{api_key}"\n')
-            
-            # 更新环境变量
-            os.environ['OPENROUTER_API_KEY'] = api_key
-            
-            return jsonify({'message': 'API密钥已更新'})
-        else:
-            return jsonify({'error': 'API密钥无效'}), 400
-            
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return run_job('config.set_api_key', {'apiKey': api_key})
+
+# 后台任务状态
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+@conditional('job')
+def get_job(job_id):
+    """任务状态：queued / running / succeeded / failed / cancelled
+    
+    succeeded 时 result 与同步调用接口的返回相同，failed 时 error 为最后一次失败的原因；
+    等待重试的任务状态为 queued，runAt 为下一次执行的时间。
+    """
+    # web 进程重启后，之前写入的任务由这里启动的 worker 线程继续执行
+    job_queue.start(JOB_WORKERS)
+    return jsonify(dump_job(Job.query.get_or_404(job_id)))
+
+@app.route('/api/jobs/<int:job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """取消尚未开始执行的任务"""
+    job = Job.query.get_or_404(job_id)
+    if not job_queue.cancel(job):
+        api_error('任务已开始执行或已结束，无法取消', 409)
+    return jsonify(dump_job(job))
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def get_job_stats():
+    return jsonify(job_queue.stats())
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """重建笔记全文索引（升级已有数据库或索引损坏时使用）"""
+    if not init_search_index():
+        print('当前数据库不支持全文索引')
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text("INSERT INTO note_fts(note_fts) VALUES ('rebuild')"))
+        conn.execute(text("INSERT INTO note_fts(note_fts) VALUES ('optimize')"))
+        rebuild_short_index(conn)
+        conn.execute(text("INSERT INTO note_fts_short(note_fts_short) VALUES ('optimize')"))
+    print(f'全文索引已重建，共 {Note.query.count()} 条笔记')
+
+@app.cli.command('tag-notes')
+@click.option('--batch-size', default=10, help='每个提示词包含的笔记数')
+@click.option('--workers', default=4, help='并发调用 AI 的线程数')
+@click.option('--rate', default=2.0, help='每秒最多调用次数，0 表示不限速')
+@click.option('--include-stale', is_flag=True, help='同时处理自动打标签后内容被修改的笔记')
+@click.option('--restart', is_flag=True, help='忽略检查点，从头开始')
+def tag_notes(batch_size, workers, rate, include_stale, restart):
+    """为未打标签的笔记批量生成标签（中断后再次运行会从检查点继续）"""
+    batch_tagger.run(batch_size=batch_size, workers=workers, rate=rate,
+                     include_stale=include_stale, resume=not restart)
+    status = batch_tagger.status()
+    print(f"已处理 {status['processed']} 条，失败 {status['failed']} 条，"
+          f"{status['notesPerSecond']} 条/秒，{status['tokensPerSecond']} tokens/秒")
+
+@app.cli.command('prune-change-log')
+@click.option('--days', default=CHANGE_LOG_RETENTION_DAYS, help='保留最近多少天的变更日志')
+def prune_change_log(days):
+    """清理过期的变更日志（令牌早于清理位置的客户端会收到 410 并全量重新加载）"""
+    deleted = change_feed.prune(db.session, days)
+    print(f'已删除 {deleted} 条变更日志')
+
+@app.cli.command('run-worker')
+@click.option('--concurrency', default=4, help='同时执行的任务数（线程数）')
+@click.option('--burst', is_flag=True, help='没有可执行的任务时退出')
+def run_worker(concurrency, burst):
+    """执行后台任务队列中的任务（Ctrl-C 后等待正在执行的任务完成再退出）"""
+    print(f'worker 已启动，并发 {concurrency}，任务种类：{", ".join(job_queue.kinds)}')
+    job_queue.work(concurrency, burst=burst)
+
+@app.cli.command('prune-jobs')
+@click.option('--days', default=JOB_RETENTION_DAYS, help='已结束的任务保留多少天')
+def prune_jobs(days):
+    """清理已结束的后台任务"""
+    print(f'已删除 {job_queue.prune(days)} 个任务')
+
+@app.cli.command('compact-revisions')
+@click.option('--keep-all-days', default=REVISION_KEEP_ALL_DAYS, help='最近多少天的版本全部保留')
+@click.option('--daily-days', default=REVISION_DAILY_DAYS, help='多少天以内的版本每天保留一个，更早的每周保留一个')
+def compact_revisions(keep_all_days, daily_days):
+    """按保留策略抽稀较早的笔记历史版本，并重新编码差异链（可由定时任务周期执行）"""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=keep_all_days)
+    note_ids = [note_id for (note_id,) in db.session.query(NoteRevision.noteId).filter(
+        NoteRevision.createdAt < cutoff
+    ).distinct()]
+    deleted = before = after = 0
+    for note_id in note_ids:
+        # 每篇笔记一个事务，避免长时间持有写锁
+        removed, note_before, note_after = compact_note_revisions(note_id, now, keep_all_days, daily_days)
+        db.session.commit()
+        deleted += removed
+        before += note_before
+        after += note_after
+    print(f'整理了 {len(note_ids)} 篇笔记，删除 {deleted} 个版本，{before} 字节 -> {after} 字节')
+
+@app.cli.command('reconcile-projects')
+def reconcile_projects():
+    """重新统计所有项目的任务数和进度（可由定时任务周期执行）"""
+    fixed = reconcile_project_progress()
+    print(f'已修正 {fixed} 个项目的任务统计')
+
+@app.cli.command('rebuild-pomodoro-summary')
+def rebuild_pomodoro_summary():
+    """按番茄钟记录重新生成按日汇总（汇总表损坏或手动导入记录后执行）"""
+    rows = rebuild_pomodoro_daily()
+    print(f'已生成 {rows} 行番茄钟汇总')
 
-# 创建数据库表
+# 创建数据库表，并对已有数据库执行结构迁移（见 migrations.py）
 with app.app_context():
     db.create_all()
+    run_migrations(db.engine)
+    app.config['NOTE_FTS_ENABLED'] = init_search_index()
+    app.config['HTTP_CACHE_ENABLED'] = db.engine.dialect.name == 'sqlite'
+    app.config['CHANGE_LOG_ENABLED'] = db.engine.dialect.name == 'sqlite'
 
 if __name__ == '__main__':
     app.run(debug=True, port=5004)
\ No newline at end of file
@@ -0,0 +1,260 @@
+"""笔记批量打标签
+
+后台任务挑选未打标签的笔记（可选包括自动打标签后内容又被修改的笔记），每 batch_size 条合并成
+一个提示词，由线程池并发调用 AI 并统一限速，结果按批次在单个事务中批量写回。
+进度写入检查点文件，进程崩溃或重启后可以从检查点继续。
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from sqlalchemy import bindparam, func
+
+from ai_client import AIError
+
+# 视为“未打标签”的标签值
+DEFAULT_TAGS = ('', '默认')
+
+SYSTEM_PROMPT = (
+    '你是一个标签生成专家。下面有多条笔记，每条以 [编号] 开头。'
+    '请为每条笔记生成一个最能概括其主题的简洁标签（不超过10个字）。'
+    '只输出一个 JSON 对象，键为笔记编号，值为标签，例如 {"1": "学习", "2": "旅行"}。'
+)
+
+# 每条笔记放进提示词的最大字符数
+PROMPT_CHARS_PER_NOTE = 300
+
+
+class RateLimiter:
+    """均匀限速：所有工作线程合计每秒最多发起 rate 次调用，rate <= 0 表示不限速"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        time.sleep(max(0.0, slot - now))
+
+
+def build_messages(rows):
+    notes = '\n\n'.join(f'[{index}] {row.excerpt}' for index, row in enumerate(rows, 1))
+    return [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': notes},
+    ]
+
+
+def parse_tags(reply, count):
+    """解析模型返回的 JSON，返回 {序号(从0开始): 标签}，无法解析的条目直接跳过"""
+    start, end = reply.find('{'), reply.rfind('}')
+    if start < 0 or end < start:
+        return {}
+    try:
+        mapping = json.loads(reply[start:end + 1])
+    except ValueError:
+        return {}
+    tags = {}
+    for index in range(count):
+        tag = mapping.get(str(index + 1))
+        if isinstance(tag, list):
+            tag = tag[0] if tag else None
+        if isinstance(tag, str) and tag.strip():
+            tags[index] = tag.strip()[:50]
+    return tags
+
+
+class BatchTagger:
+    def __init__(self, app, db, note_model, ai_client):
+        self.app = app
+        self.db = db
+        self.Note = note_model
+        self.ai_client = ai_client
+        self.checkpoint_path = os.path.join(app.instance_path, 'batch_tagging.json')
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._progress = {'status': 'idle'}
+
+    # 运行控制
+
+    def start(self, **options):
+        """在后台线程中启动任务，已有任务在运行时返回 False"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return False
+            self._stop.clear()
+            self._progress = {'status': 'running'}
+            self._thread = threading.Thread(target=self.run, kwargs=options, name='batch-tagging', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """请求停止任务，正在进行的批次完成后退出，检查点保留以便继续"""
+        self._stop.set()
+        with self._lock:
+            if self._progress.get('status') == 'running':
+                self._progress['status'] = 'stopping'
+
+    def status(self):
+        with self._lock:
+            progress = dict(self._progress)
+        if progress.get('status') == 'idle':
+            checkpoint = self._load_checkpoint()
+            if checkpoint:
+                progress['checkpoint'] = checkpoint
+            return progress
+        elapsed = (progress.pop('finishedAt', None) or time.time()) - progress.pop('startedAtTs', time.time())
+        progress['elapsedSeconds'] = round(elapsed, 2)
+        progress['notesPerSecond'] = round(progress.get('runProcessed', 0) / elapsed, 2) if elapsed > 0 else 0.0
+        progress['tokensPerSecond'] = round(progress.get('runTokens', 0) / elapsed, 2) if elapsed > 0 else 0.0
+        return progress
+
+    def _update(self, **values):
+        with self._lock:
+            self._progress.update(values)
+
+    # 检查点
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_checkpoint(self, checkpoint):
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # 任务主体
+
+    def candidates(self, include_stale=False):
+        Note = self.Note
+        untagged = self.db.or_(Note.tag.is_(None), Note.tag.in_(DEFAULT_TAGS))
+        if include_stale:
+            # 自动打过标签、之后内容又被修改的笔记
+            untagged = self.db.or_(untagged, Note.updatedAt > Note.taggedAt)
+        return Note.query.filter(untagged, Note.content.isnot(None), Note.content != '')
+
+    def run(self, batch_size=10, workers=4, rate=2.0, include_stale=False, resume=True):
+        """执行批量打标签（阻塞直到完成或被停止），可在后台线程或命令行中调用"""
+        with self.app.app_context():
+            try:
+                self._run(batch_size, workers, rate, include_stale, resume)
+            except Exception as e:
+                self._update(status='failed', lastError=str(e), finishedAt=time.time())
+                raise
+            finally:
+                self.db.session.remove()
+
+    def _run(self, batch_size, workers, rate, include_stale, resume):
+        Note = self.Note
+        checkpoint = self._load_checkpoint() if resume else None
+        if not checkpoint or checkpoint.get('finished'):
+            checkpoint = {'lastId': 0, 'processed': 0, 'failed': 0, 'tokens': 0}
+        watermark = checkpoint['lastId']
+        self._update(
+            status='running', startedAtTs=time.time(), startedAt=datetime.utcnow().isoformat(),
+            remaining=self.candidates(include_stale).filter(Note.id > watermark).count(),
+            runProcessed=0, runTokens=0, **checkpoint
+        )
+
+        limiter = RateLimiter(rate)
+        pending = {}
+        submitted = []  # 已提交批次的最大 id（按提交顺序）
+        completed = set()
+        cursor = watermark
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while not self._stop.is_set():
+                # 最多保持 workers * 2 个批次在途，避免一次性把全部笔记读入内存
+                while not exhausted and len(pending) < workers * 2:
+                    rows = self.candidates(include_stale).filter(Note.id > cursor).order_by(Note.id).with_entities(
+                        Note.id, Note.updatedAt, func.substr(Note.content, 1, PROMPT_CHARS_PER_NOTE).label('excerpt')
+                    ).limit(batch_size).all()
+                    if not rows:
+                        exhausted = True
+                        break
+                    cursor = rows[-1].id
+                    pending[pool.submit(self._tag_batch, rows, limiter)] = rows
+                    submitted.append(cursor)
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    rows = pending.pop(future)
+                    try:
+                        tags, tokens = future.result()
+                    except AIError as e:
+                        tags, tokens = {}, 0
+                        self._update(lastError=str(e))
+                    written = self._write_tags(rows, tags)
+                    checkpoint['processed'] += written
+                    checkpoint['failed'] += len(rows) - written
+                    checkpoint['tokens'] += tokens
+                    completed.add(rows[-1].id)
+                    with self._lock:
+                        self._progress['runProcessed'] += written
+                        self._progress['runTokens'] += tokens
+                        self._progress['remaining'] = max(0, self._progress['remaining'] - len(rows))
+
+                # 批次可能乱序完成，检查点只推进到连续完成的位置
+                while submitted and submitted[0] in completed:
+                    completed.discard(submitted[0])
+                    checkpoint['lastId'] = submitted.pop(0)
+                self._save_checkpoint(checkpoint)
+                self._update(**checkpoint)
+
+            for future in pending:
+                future.cancel()
+
+        checkpoint['finished'] = exhausted and not pending
+        self._save_checkpoint(checkpoint)
+        self._update(
+            status='finished' if checkpoint['finished'] else 'stopped',
+            finishedAt=time.time(), **checkpoint
+        )
+
+    def _tag_batch(self, rows, limiter):
+        limiter.wait()
+        reply, tokens = self.ai_client.chat_with_usage(build_messages(rows), max_tokens=20 * len(rows) + 20)
+        return parse_tags(reply, len(rows)), tokens
+
+    def _write_tags(self, rows, tags):
+        """一个事务批量写回标签，返回成功写入的条数
+
+        updatedAt 条件保证读取之后被用户修改过的笔记不会被覆盖；写回时保持 updatedAt 不变，
+        避免批量任务打乱笔记列表的排序。version 照常递增，正在编辑这篇笔记的客户端下次保存时
+        会收到版本冲突，而不会用旧的基准版本覆盖标签。
+        """
+        params = [{
+            'b_id': row.id,
+            'b_updated': row.updatedAt,
+            'b_tag': tags[index],
+        } for index, row in enumerate(rows) if index in tags]
+        if not params:
+            return 0
+        note = self.Note.__table__
+        statement = note.update().where(
+            note.c.id == bindparam('b_id'),
+            note.c.updatedAt == bindparam('b_updated')
+        ).values(tag=bindparam('b_tag'), taggedAt=datetime.utcnow(), updatedAt=bindparam('b_updated'),
+                 version=note.c.version + 1)
+        result = self.db.session.execute(statement, params)
+        self.db.session.commit()
+        return result.rowcount
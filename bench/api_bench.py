@@ -0,0 +1,699 @@
+"""全接口基准测试：生成指定规模的数据后逐个压测所有 /api/* 路由，结果输出为 JSON
+
+数据规模由 --notes 等参数控制（文件夹、内容长度接近真实分布的笔记、待办、带大量任务的项目、项目与笔记的关联），
+每次运行使用独立的临时数据库；AI 接口指向本地模拟服务（bench/openrouter_stub.py）。
+
+两种模式（--modes）：
+  client  进程内 Flask 测试客户端顺序请求，测量应用本身的耗时，不含网络和 WSGI 服务器开销
+  server  启动真实服务（安装了 gunicorn 时以 --workers 个进程运行，否则使用 werkzeug 多线程服务器），
+          --concurrency 个线程并发请求，测量吞吐
+
+每个路由统计 p50/p95/p99/平均/最大延迟（毫秒）、吞吐（请求/秒）、状态码分布和错误数，
+另外记录进程（server 模式含所有 worker）的内存峰值。--compare 与之前保存的结果逐项对比。
+
+用法：
+    python bench/api_bench.py --notes 20000 --requests 200 --output before.json
+    python bench/api_bench.py --notes 20000 --requests 200 --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from openrouter_stub import serve as serve_stub  # noqa: E402
+from search_bench import TAGS, VOCABULARY  # noqa: E402
+
+
+# ---------------------------------------------------------------- 数据生成
+
+def paragraph(rng, words):
+    return '，'.join(''.join(rng.choices(VOCABULARY, k=rng.randint(4, 12))) for _ in range(words // 8 + 1))
+
+
+def content_length(rng):
+    """笔记正文长度：大多数几百字，少数上万字（对数正态分布，截断到 20 万字符）"""
+    return min(int(rng.lognormvariate(6.5, 1.2)), 200000)
+
+
+def seed_database(app, db, sizes, seed):
+    """按 sizes 生成数据，返回 {表名: 行数} 和耗时"""
+    from app import (Folder, Note, PomodoroSession, Project, ProjectNote, ProjectTask, Todo,
+                     rebuild_pomodoro_daily, reconcile_project_progress)
+
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def moment(days=365):
+        return now - timedelta(seconds=rng.randint(0, days * 86400))
+
+    start = time.perf_counter()
+    with app.app_context():
+        db.session.execute(Folder.__table__.insert(), [
+            {'id': i + 1, 'name': ''.join(rng.choices(VOCABULARY, k=2))} for i in range(sizes['folders'])
+        ])
+
+        batch = []
+        for i in range(sizes['notes']):
+            created = moment()
+            batch.append({
+                'id': i + 1,
+                'title': ''.join(rng.choices(VOCABULARY, k=rng.randint(2, 6))),
+                'content': paragraph(rng, content_length(rng) // 2),
+                'tag': rng.choice(TAGS),
+                'folderId': rng.randint(1, sizes['folders']) if sizes['folders'] and rng.random() < 0.8 else None,
+                'createdAt': created,
+                'updatedAt': created + timedelta(seconds=rng.randint(0, 86400 * 30)),
+            })
+            if len(batch) == 1000:
+                db.session.execute(Note.__table__.insert(), batch)
+                batch = []
+        if batch:
+            db.session.execute(Note.__table__.insert(), batch)
+
+        if sizes['todos']:
+            db.session.execute(Todo.__table__.insert(), [{
+                'id': i + 1,
+                'title': ''.join(rng.choices(VOCABULARY, k=3)),
+                'description': paragraph(rng, 40) if rng.random() < 0.3 else '',
+                'priority': rng.choice(['low', 'medium', 'high']),
+                'completed': rng.random() < 0.4,
+                'type': 'pomodoro' if rng.random() < 0.2 else 'todo',
+                'createdAt': moment(),
+            } for i in range(sizes['todos'])])
+            # 每个待办平均 4 个番茄钟，分布在最近一年
+            sessions = []
+            for _ in range(sizes['todos'] * 4):
+                started = moment()
+                sessions.append({
+                    'todoId': rng.randint(1, sizes['todos']) if rng.random() < 0.8 else None,
+                    'startedAt': started,
+                    'endedAt': started + timedelta(minutes=25),
+                    'duration': 1500,
+                    'day': started.date(),
+                })
+            db.session.execute(PomodoroSession.__table__.insert(), sessions)
+
+        if sizes['projects']:
+            db.session.execute(Project.__table__.insert(), [{
+                'id': i + 1,
+                'name': ''.join(rng.choices(VOCABULARY, k=3)),
+                'description': paragraph(rng, 60),
+                'status': rng.choice(['planning', 'active', 'completed', 'onhold']),
+                'priority': rng.choice(['low', 'medium', 'high']),
+                'createdAt': moment(),
+            } for i in range(sizes['projects'])])
+            db.session.execute(ProjectTask.__table__.insert(), [{
+                'title': ''.join(rng.choices(VOCABULARY, k=4)),
+                'status': rng.choice(['todo', 'inprogress', 'done']),
+                'priority': rng.choice(['low', 'medium', 'high']),
+                'projectId': project_id,
+                'createdAt': moment(),
+            } for project_id in range(1, sizes['projects'] + 1) for _ in range(sizes['tasks_per_project'])])
+            if sizes['notes']:
+                db.session.execute(ProjectNote.__table__.insert(), [
+                    {'projectId': project_id, 'noteId': note_id}
+                    for project_id in range(1, sizes['projects'] + 1)
+                    for note_id in rng.sample(range(1, sizes['notes'] + 1),
+                                              min(sizes['links_per_project'], sizes['notes']))
+                ])
+        db.session.commit()
+        reconcile_project_progress()
+        db.session.commit()
+        rebuild_pomodoro_daily()
+
+        counts = {
+            model.__tablename__: db.session.query(model).count()
+            for model in (Folder, Note, Todo, PomodoroSession, Project, ProjectTask, ProjectNote)
+        }
+        db.engine.dispose()
+    return counts, time.perf_counter() - start
+
+
+def seed_main(args):
+    """子进程：初始化数据库并生成数据，把行数和耗时以 JSON 输出到标准输出"""
+    sys.path.insert(0, ROOT)
+    from app import app, db
+
+    counts, elapsed = seed_database(app, db, dataset_sizes(args), args.seed)
+    print(json.dumps({'rows': counts, 'seconds': round(elapsed, 2)}))
+
+
+def dataset_sizes(args):
+    return {
+        'folders': args.folders,
+        'notes': args.notes,
+        'todos': args.todos,
+        'projects': args.projects,
+        'tasks_per_project': args.tasks_per_project,
+        'links_per_project': args.links_per_project,
+    }
+
+
+# ---------------------------------------------------------------- 场景
+
+class Context:
+    """场景共享的状态：已有数据的行数，以及本次运行创建的记录（供后面的更新和删除场景使用）"""
+
+    def __init__(self, rows, seed):
+        self.rows = rows
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.created = {'note': [], 'todo': [], 'project': [], 'task': [], 'link': [], 'pomodoro': [], 'job': []}
+        self.etags = {}
+
+    def pick(self, table):
+        return self.rng.randint(1, max(1, self.rows[table]))
+
+    def add(self, kind, value):
+        with self.lock:
+            self.created[kind].append(value)
+
+    def take(self, kind):
+        """取出一个本次创建的记录，已经用完时返回 0（请求会得到 404）"""
+        with self.lock:
+            return self.created[kind].pop() if self.created[kind] else 0
+
+    def peek(self, kind):
+        with self.lock:
+            return self.rng.choice(self.created[kind]) if self.created[kind] else 0
+
+    def text(self, words=40):
+        return paragraph(self.rng, words)
+
+
+def spec(method, path, json_body=None, data=None, headers=None, expect=(200,), first_chunk=False, after=None):
+    """一个请求；first_chunk 为 True 时只读取第一段响应（用于不会结束的 SSE 连接）
+
+    after(ctx, status, headers, body) 在请求完成后调用，用于记录新建的 id 等。
+    """
+    return {'method': method, 'path': path, 'json': json_body, 'data': data, 'headers': headers or {},
+            'expect': expect, 'first_chunk': first_chunk, 'after': after}
+
+
+def record_created(kind, key=None, created_status=201):
+    def after(ctx, status, headers, body):
+        if status == created_status and isinstance(body, dict):
+            ctx.add(kind, key(body) if key else body['id'])
+    return after
+
+
+def record_etag(name):
+    def after(ctx, status, headers, body):
+        if headers.get('ETag'):
+            ctx.etags[name] = headers['ETag']
+    return after
+
+
+def note_body(ctx):
+    return {'title': ctx.text(4)[:30], 'content': ctx.text(400), 'tag': ctx.rng.choice(TAGS),
+            'folderId': ctx.pick('folder') if ctx.rows['folder'] else None}
+
+
+def pomodoro_body(ctx):
+    started = datetime.now(timezone.utc) - timedelta(minutes=ctx.rng.randint(25, 60 * 24 * 30))
+    return {'todoId': ctx.pick('todo') if ctx.rows['todo'] else None, 'startedAt': started.isoformat(),
+            'endedAt': (started + timedelta(minutes=25)).isoformat(), 'timezoneOffset': -480}
+
+
+def conditional_notes(ctx):
+    etag = ctx.etags.get('notes')
+    return spec('GET', '/api/notes?limit=50', headers={'If-None-Match': etag} if etag else None,
+                expect=(200, 304), after=record_etag('notes'))
+
+
+def patch_note(ctx):
+    # 不跟踪版本号：其他场景修改过的笔记返回 409，属于预期结果
+    return spec('PATCH', f'/api/notes/{ctx.peek("note")}',
+                {'baseVersion': 1, 'ops': [{'start': 0, 'end': 0, 'text': '补'}]}, expect=(200, 409))
+
+
+def link_note(ctx):
+    return spec('POST', f'/api/projects/{ctx.peek("project")}/notes', {'noteId': ctx.pick('note')},
+                expect=(201, 400), after=record_created('link', lambda body: (body['projectId'], body['noteId'])))
+
+
+def unlink_note(ctx):
+    project_id, note_id = ctx.take('link') or (0, 0)
+    return spec('DELETE', f'/api/projects/{project_id}/notes/{note_id}', expect=(204,))
+
+
+def ndjson(ctx, rows=100):
+    lines = [json.dumps({'kind': 'note', 'title': ctx.text(4)[:30], 'content': ctx.text(200), 'tag': '导入'},
+                        ensure_ascii=False) for _ in range(rows)]
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def search_term(ctx):
+    return (ctx.rng.choice(VOCABULARY) + ctx.rng.choice(VOCABULARY))[:3]
+
+
+# (名称, 生成请求的函数)。按顺序执行：创建场景在对应的更新、删除场景之前
+SCENARIOS = [
+    ('GET /api/folders', lambda ctx: spec('GET', '/api/folders')),
+    ('GET /api/notes?limit=50', lambda ctx: spec('GET', '/api/notes?limit=50&fields=id,title,tag,updatedAt')),
+    ('GET /api/notes (all)', lambda ctx: spec('GET', '/api/notes?fields=id,title,tag,folderId,updatedAt')),
+    ('GET /api/notes (304)', conditional_notes),
+    ('GET /api/notes?folderId', lambda ctx: spec('GET', f'/api/notes?limit=50&folderId={ctx.pick("folder")}')),
+    ('GET /api/notes?search', lambda ctx: spec('GET', f'/api/notes?limit=20&search={search_term(ctx)}')),
+    ('GET /api/notes/<id>', lambda ctx: spec('GET', f'/api/notes/{ctx.pick("note")}')),
+    ('POST /api/notes', lambda ctx: spec('POST', '/api/notes', note_body(ctx), expect=(201,),
+                                         after=record_created('note'))),
+    ('PUT /api/notes/<id>', lambda ctx: spec('PUT', f'/api/notes/{ctx.peek("note")}', note_body(ctx))),
+    ('PATCH /api/notes/<id>', patch_note),
+    ('GET /api/tags', lambda ctx: spec('GET', '/api/tags')),
+    ('GET /api/todos', lambda ctx: spec('GET', '/api/todos?limit=100')),
+    ('POST /api/todos', lambda ctx: spec('POST', '/api/todos', {
+        'title': ctx.text(3)[:20], 'priority': ctx.rng.choice(['low', 'medium', 'high'])
+    }, expect=(201,), after=record_created('todo'))),
+    ('PUT /api/todos/<id>', lambda ctx: spec('PUT', f'/api/todos/{ctx.peek("todo")}',
+                                             {'completed': ctx.rng.random() < 0.5})),
+    ('GET /api/todos/counts', lambda ctx: spec('GET', '/api/todos/counts')),
+    ('POST /api/pomodoro/sessions', lambda ctx: spec('POST', '/api/pomodoro/sessions', pomodoro_body(ctx),
+                                                     expect=(201,), after=record_created('pomodoro'))),
+    ('GET /api/pomodoro/sessions', lambda ctx: spec('GET', '/api/pomodoro/sessions?limit=50')),
+    ('GET /api/pomodoro/stats', lambda ctx: spec('GET', '/api/pomodoro/stats')),
+    ('GET /api/pomodoro/stats?groupBy=todo', lambda ctx: spec('GET', '/api/pomodoro/stats?groupBy=todo')),
+    ('GET /api/pomodoro/streak', lambda ctx: spec('GET', '/api/pomodoro/streak')),
+    ('GET /api/projects', lambda ctx: spec('GET', '/api/projects?limit=50')),
+    ('GET /api/projects/stats', lambda ctx: spec('GET', '/api/projects/stats')),
+    ('POST /api/projects', lambda ctx: spec('POST', '/api/projects', {'name': ctx.text(3)[:20], 'status': 'active'},
+                                            expect=(201,), after=record_created('project'))),
+    ('PUT /api/projects/<id>', lambda ctx: spec('PUT', f'/api/projects/{ctx.peek("project")}',
+                                                {'priority': ctx.rng.choice(['low', 'medium', 'high'])})),
+    ('GET /api/projects/<id>', lambda ctx: spec('GET', f'/api/projects/{ctx.pick("project")}')),
+    ('GET /api/projects/<id>/tasks', lambda ctx: spec('GET', f'/api/projects/{ctx.pick("project")}/tasks')),
+    ('POST /api/projects/<id>/tasks', lambda ctx: spec('POST', f'/api/projects/{ctx.pick("project")}/tasks', {
+        'title': ctx.text(3)[:20], 'status': ctx.rng.choice(['todo', 'inprogress', 'done'])
+    }, expect=(201,), after=record_created('task'))),
+    ('PUT /api/project-tasks/<id>', lambda ctx: spec('PUT', f'/api/project-tasks/{ctx.peek("task")}',
+                                                     {'status': ctx.rng.choice(['todo', 'done'])})),
+    ('POST /api/batch', lambda ctx: spec('POST', '/api/batch', {'operations': [
+        {'op': 'update', 'type': 'task', 'id': ctx.rng.randint(1, max(1, ctx.rows['project_task'])),
+         'data': {'status': ctx.rng.choice(['todo', 'inprogress', 'done'])}} for _ in range(50)
+    ]})),
+    ('GET /api/projects/<id>/notes', lambda ctx: spec('GET', f'/api/projects/{ctx.pick("project")}/notes')),
+    ('POST /api/projects/<id>/notes', link_note),
+    ('GET /api/sync', lambda ctx: spec('GET', '/api/sync?since=0', expect=(200, 501))),
+    ('GET /api/export', lambda ctx: spec('GET', '/api/export?types=folder,project')),
+    ('POST /api/import', lambda ctx: spec('POST', '/api/import', data=ndjson(ctx),
+                                          headers={'Content-Type': 'application/x-ndjson'})),
+    ('GET /api/events', lambda ctx: spec('GET', '/api/events', first_chunk=True, expect=(200, 503))),
+    ('GET /api/events/stats', lambda ctx: spec('GET', '/api/events/stats')),
+    ('GET /api/cache/stats', lambda ctx: spec('GET', '/api/cache/stats')),
+    ('GET /api/http-cache/stats', lambda ctx: spec('GET', '/api/http-cache/stats')),
+    ('POST /api/ai/generate-title', lambda ctx: spec('POST', '/api/ai/generate-title', {'content': ctx.text(200)})),
+    ('POST /api/ai/generate-tags', lambda ctx: spec('POST', '/api/ai/generate-tags', {'content': ctx.text(200)})),
+    ('POST /api/ai/polish-content', lambda ctx: spec('POST', '/api/ai/polish-content', {'content': ctx.text(200)})),
+    ('POST /api/ai/polish-content/stream', lambda ctx: spec('POST', '/api/ai/polish-content/stream',
+                                                            {'content': ctx.text(50)})),
+    ('POST /api/ai/generate-title?async=1', lambda ctx: spec(
+        'POST', '/api/ai/generate-title?async=1', {'content': ctx.text(200)}, expect=(202,),
+        after=record_created('job', created_status=202))),
+    ('GET /api/jobs/<id>', lambda ctx: spec('GET', f'/api/jobs/{ctx.peek("job")}')),
+    ('GET /api/jobs/stats', lambda ctx: spec('GET', '/api/jobs/stats')),
+    ('GET /api/ai/stats', lambda ctx: spec('GET', '/api/ai/stats')),
+    ('GET /api/ai/batch-tags', lambda ctx: spec('GET', '/api/ai/batch-tags')),
+    ('POST /api/ai/batch-tags', lambda ctx: spec('POST', '/api/ai/batch-tags', {'batchSize': 10}, expect=(202, 409))),
+    ('DELETE /api/ai/batch-tags', lambda ctx: spec('DELETE', '/api/ai/batch-tags', expect=(202,))),
+    ('GET /api/config', lambda ctx: spec('GET', '/api/config')),
+    # 模拟服务对 "invalid" 返回 401，接口返回 400，不会改写 .env
+    ('POST /api/config/api-key', lambda ctx: spec('POST', '/api/config/api-key', {'api_key': 'invalid'},
+                                                  expect=(400,))),
+    ('GET /api/debug/profiler', lambda ctx: spec('GET', '/api/debug/profiler')),
+    ('GET /metrics', lambda ctx: spec('GET', '/metrics')),
+    ('DELETE /api/projects/<id>/notes/<id>', unlink_note),
+    ('DELETE /api/project-tasks/<id>', lambda ctx: spec('DELETE', f'/api/project-tasks/{ctx.take("task")}',
+                                                        expect=(204,))),
+    ('DELETE /api/pomodoro/sessions/<id>', lambda ctx: spec(
+        'DELETE', f'/api/pomodoro/sessions/{ctx.take("pomodoro")}', expect=(204,))),
+    ('DELETE /api/todos/<id>', lambda ctx: spec('DELETE', f'/api/todos/{ctx.take("todo")}', expect=(204,))),
+    ('DELETE /api/notes/<id>', lambda ctx: spec('DELETE', f'/api/notes/{ctx.take("note")}', expect=(204,))),
+    ('DELETE /api/projects/<id>', lambda ctx: spec('DELETE', f'/api/projects/{ctx.take("project")}', expect=(204,))),
+]
+
+
+# ---------------------------------------------------------------- 发送请求
+
+class ClientTransport:
+    """Flask 测试客户端"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, request):
+        start = time.perf_counter()
+        response = self.client.open(
+            request['path'], method=request['method'], json=request['json'], data=request['data'],
+            headers=request['headers'], buffered=not request['first_chunk']
+        )
+        if request['first_chunk']:
+            next(iter(response.response), None)
+            body = None
+        else:
+            body = response.get_data()
+        elapsed = (time.perf_counter() - start) * 1000
+        response.close()
+        return response.status_code, response.headers, body, elapsed
+
+
+class HTTPTransport:
+    """真实 HTTP 请求，每个线程一个连接池"""
+
+    def __init__(self, base):
+        self.base = base
+        self.local = threading.local()
+
+    def send(self, request):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        start = time.perf_counter()
+        response = session.request(
+            request['method'], self.base + request['path'], json=request['json'], data=request['data'],
+            headers=request['headers'], stream=request['first_chunk']
+        )
+        if request['first_chunk']:
+            next(response.iter_content(None), None)
+            body = None
+        else:
+            body = response.content
+        elapsed = (time.perf_counter() - start) * 1000
+        response.close()
+        return response.status_code, response.headers, body, elapsed
+
+
+def percentile(samples, q):
+    """samples 已排序；最近秩法"""
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, max(0, int(len(samples) * q + 0.5) - 1))]
+
+
+def run_scenario(transport, ctx, build, count, concurrency):
+    """执行 count 个请求，返回统计结果"""
+    latencies = []
+    statuses = {}
+    errors = []
+    lock = threading.Lock()
+    remaining = [count]
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            request = build(ctx)
+            try:
+                status, headers, body, elapsed = transport.send(request)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            if request['after'] and body is not None:
+                try:
+                    parsed = json.loads(body) if body else None
+                except ValueError:
+                    parsed = None
+                request['after'](ctx, status, headers, parsed)
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status not in request['expect']:
+                    errors.append(f'{status}: {(body or b"")[:200].decode(errors="replace")}')
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def ms(value):
+        return round(value, 3) if value is not None else None
+
+    return {
+        'requests': count,
+        'errors': len(errors),
+        'statuses': statuses,
+        'p50': ms(percentile(latencies, 0.50)),
+        'p95': ms(percentile(latencies, 0.95)),
+        'p99': ms(percentile(latencies, 0.99)),
+        'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'max': ms(latencies[-1]) if latencies else None,
+        'throughput': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'sampleErrors': errors[:3],
+    }
+
+
+def run_all(transport, rows, args, concurrency, rss=None):
+    ctx = Context(rows, args.seed)
+    results = {}
+    for name, build in SCENARIOS:
+        if args.only and not any(pattern in name for pattern in args.only):
+            continue
+        results[name] = result = run_scenario(transport, ctx, build, args.requests, concurrency)
+        if rss:
+            result['rssMb'] = round(rss(), 1)
+        print(f'  {name:<40} p50 {result["p50"] or 0:>8.2f}  p95 {result["p95"] or 0:>8.2f}  '
+              f'p99 {result["p99"] or 0:>8.2f} ms  {result["throughput"] or 0:>8.1f} req/s'
+              + (f'  错误 {result["errors"]}' if result['errors'] else ''), file=sys.stderr)
+    return results
+
+
+# ---------------------------------------------------------------- 两种模式
+
+def client_mode(args, rows):
+    sys.path.insert(0, ROOT)
+    from app import app
+
+    print('== client ==', file=sys.stderr)
+    start = time.perf_counter()
+    routes = run_all(ClientTransport(app), rows, args, 1)
+    return {
+        'routes': routes,
+        'seconds': round(time.perf_counter() - start, 2),
+        # ru_maxrss 在 Linux 上以 KB 为单位；包含模拟服务和测试客户端本身
+        'peakRssMb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def has_gunicorn():
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def serve_main(args):
+    """子进程：启动服务"""
+    sys.path.insert(0, ROOT)
+    if has_gunicorn():
+        os.execvp(sys.executable, [
+            sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-k', 'gthread',
+            '--threads', str(args.concurrency + 4), '-b', f'127.0.0.1:{args.serve}',
+            '--chdir', ROOT, '--log-level', 'warning', 'app:app'
+        ])
+    from werkzeug.serving import run_simple
+    from app import app
+    run_simple('127.0.0.1', args.serve, app, threaded=True)
+
+
+def server_mode(args, rows, env):
+    from events_bench import resource_usage, wait_until_ready
+
+    backend = f'gunicorn x{args.workers}' if has_gunicorn() else 'werkzeug'
+    print(f'== server ({backend}，并发 {args.concurrency}) ==', file=sys.stderr)
+    if has_gunicorn() and args.workers > 1:
+        # 多进程时进程内的事件发布只能到达本进程的连接
+        env = dict(env, EVENT_BACKEND='changelog')
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', str(args.port), '--workers', str(args.workers),
+         '--concurrency', str(args.concurrency)],
+        env=env, stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL
+    )
+    peak = [0.0]
+    stop = threading.Event()
+
+    def sample_rss():
+        while not stop.wait(0.1):
+            peak[0] = max(peak[0], resource_usage(server.pid)[0])
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    base = f'http://127.0.0.1:{args.port}'
+    try:
+        wait_until_ready(base)
+        sampler.start()
+        start = time.perf_counter()
+        routes = run_all(HTTPTransport(base), rows, args, args.concurrency,
+                         rss=lambda: resource_usage(server.pid)[0])
+        seconds = time.perf_counter() - start
+    finally:
+        stop.set()
+        server.terminate()
+        server.wait()
+    return {
+        'routes': routes,
+        'seconds': round(seconds, 2),
+        'server': backend,
+        'concurrency': args.concurrency,
+        'peakRssMb': round(peak[0], 1),
+    }
+
+
+# ---------------------------------------------------------------- 结果对比
+
+def compare(previous, current, threshold, min_delta):
+    """逐个路由对比 p50/p95，返回变慢超过 threshold 且超过 min_delta 毫秒的 (模式, 路由, 指标, 旧值, 新值) 列表"""
+    regressions = []
+    print(f'\n== 与 {previous["meta"].get("commit") or "之前的结果"} 对比 ==', file=sys.stderr)
+    for mode, result in current['modes'].items():
+        old_routes = previous.get('modes', {}).get(mode, {}).get('routes', {})
+        for name, new in result['routes'].items():
+            old = old_routes.get(name)
+            if not old:
+                continue
+            changes = []
+            for metric in ('p50', 'p95'):
+                if old.get(metric) and new.get(metric):
+                    ratio = new[metric] / old[metric]
+                    changes.append(f'{metric} {old[metric]:.2f} → {new[metric]:.2f} ({ratio:.2f}x)')
+                    if ratio > 1 + threshold and new[metric] - old[metric] > min_delta:
+                        regressions.append((mode, name, metric, old[metric], new[metric]))
+            marker = '!' if any(r[:2] == (mode, name) for r in regressions) else ' '
+            print(f'{marker} [{mode}] {name:<40} ' + '  '.join(changes), file=sys.stderr)
+    return regressions
+
+
+# ---------------------------------------------------------------- 入口
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--folders', type=int, default=50)
+    parser.add_argument('--notes', type=int, default=10000)
+    parser.add_argument('--todos', type=int, default=5000)
+    parser.add_argument('--projects', type=int, default=200)
+    parser.add_argument('--tasks-per-project', type=int, default=100)
+    parser.add_argument('--links-per-project', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42, help='随机数种子，相同参数生成相同的数据和请求')
+    parser.add_argument('--requests', type=int, default=100, help='每个路由的请求数')
+    parser.add_argument('--modes', nargs='+', default=['client', 'server'], choices=['client', 'server'])
+    parser.add_argument('--concurrency', type=int, default=8, help='server 模式的并发线程数')
+    parser.add_argument('--workers', type=int, default=4, help='server 模式的 gunicorn worker 进程数')
+    parser.add_argument('--port', type=int, default=5097)
+    parser.add_argument('--ai-delay', type=float, default=0.0, help='模拟 AI 服务的响应延迟（秒）')
+    parser.add_argument('--only', nargs='+', help='只运行名称包含这些字符串的路由')
+    parser.add_argument('--output', help='结果 JSON 文件，默认输出到标准输出')
+    parser.add_argument('--compare', help='之前保存的结果 JSON，逐项对比')
+    parser.add_argument('--threshold', type=float, default=0.2, help='对比时 p50/p95 变慢超过该比例视为退化')
+    parser.add_argument('--min-delta', type=float, default=1.0, help='对比时忽略小于该毫秒数的差异')
+    parser.add_argument('--verbose', action='store_true', help='显示服务进程的日志')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--seed-only', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_main(args)
+        return
+    if args.seed_only:
+        seed_main(args)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='notes-api-')
+    stub = serve_stub(port=0, delay=args.ai_delay)
+    env = dict(
+        os.environ,
+        DATABASE_URL=f'sqlite:///{os.path.join(workdir, "notes.db")}',
+        OPENROUTER_BASE_URL=f'http://127.0.0.1:{stub.server_port}/api/v1',
+        OPENROUTER_API_KEY='test',
+        PROFILER_ENABLED='1',
+        # 断开的 SSE 连接在下一次心跳时才会被发现，缩短心跳间隔让服务端尽快释放
+        EVENT_KEEPALIVE='1',
+        EVENT_MAX_SUBSCRIBERS=str(max(1000, args.requests * 2)),
+    )
+    try:
+        # 在子进程中生成数据，避免内存峰值计入 client 模式
+        seeded = subprocess.run([sys.executable, os.path.abspath(__file__), '--seed-only', *sys.argv[1:]],
+                                env=env, capture_output=True, text=True)
+        if seeded.returncode:
+            sys.exit(seeded.stderr)
+        dataset = json.loads(seeded.stdout.strip().splitlines()[-1])
+        print(f'数据：{dataset["rows"]}，生成耗时 {dataset["seconds"]} s', file=sys.stderr)
+
+        rows = dataset['rows']
+        snapshot = os.path.join(workdir, 'seeded.db')
+        shutil.copy(os.path.join(workdir, 'notes.db'), snapshot)
+        modes = {}
+        for mode in args.modes:
+            # 每种模式都从同一份初始数据开始
+            shutil.copy(snapshot, os.path.join(workdir, 'notes.db'))
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(os.path.join(workdir, 'notes.db' + suffix)):
+                    os.remove(os.path.join(workdir, 'notes.db' + suffix))
+            if mode == 'client':
+                os.environ.update(env)
+                modes[mode] = client_mode(args, rows)
+            else:
+                modes[mode] = server_mode(args, rows, env)
+    finally:
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'requestsPerRoute': args.requests,
+            'seed': args.seed,
+        },
+        'dataset': {'sizes': dataset_sizes(args), **dataset},
+        'modes': modes,
+    }
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), result, args.threshold, args.min_delta)
+        if regressions:
+            print(f'\n{len(regressions)} 项指标变慢超过 {args.threshold:.0%}', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""自动保存基准测试：对比全量 PUT 与增量 PATCH
+
+模拟在一篇约 1 MB 的笔记中间连续输入，每次输入后触发一次自动保存，统计每次保存的
+请求/响应字节数和服务端耗时；最后再测一次内容未变化的保存。
+
+用法：
+    python bench/autosave_bench.py --size-kb 1024 --saves 50
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def text_patch(old, new):
+    """与前端 computeTextPatch 相同的前后缀差异（这里只有 BMP 字符，下标与 UTF-16 一致）"""
+    start = 0
+    while start < min(len(old), len(new)) and old[start] == new[start]:
+        start += 1
+    old_end, new_end = len(old), len(new)
+    while old_end > start and new_end > start and old[old_end - 1] == new[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+    return [{'start': start, 'end': old_end, 'text': new[start:new_end]}]
+
+
+def run(client, note, saves, mode):
+    content = note['content']
+    version = note['version']
+    sent, received, latencies = [], [], []
+    cursor = len(content) // 2
+    for i in range(saves):
+        new_content = content[:cursor] + f'新增文字{i}' + content[cursor:]
+        if mode == 'put':
+            body = {'title': note['title'], 'content': new_content, 'tag': note['tag']}
+            method = client.put
+        else:
+            body = {'baseVersion': version, 'ops': text_patch(content, new_content),
+                    'title': note['title'], 'tag': note['tag']}
+            method = client.patch
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        start = time.perf_counter()
+        response = method(f"/api/notes/{note['id']}", data=payload, content_type='application/json')
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        sent.append(len(payload))
+        received.append(len(response.get_data()))
+        version = response.get_json()['version']
+        content = new_content
+    note.update(content=content, version=version)
+    return sent, received, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-kb', type=int, default=1024)
+    parser.add_argument('--saves', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='notes-autosave-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "notes.db")}'
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from app import app
+
+    client = app.test_client()
+    paragraph = '这是一段用于测试自动保存的笔记内容，包含中文和 English words。\n'
+    content = paragraph * (args.size_kb * 1024 // len(paragraph.encode()) + 1)
+    note = client.post('/api/notes', json={'title': '大笔记', 'content': content, 'tag': '测试'}).get_json()
+    note['version'] = client.get(f"/api/notes/{note['id']}").get_json()['version']
+    print(f"笔记大小 {len(note['content'].encode()) / 1024:.0f} KB，连续保存 {args.saves} 次")
+    print(f'{"方式":<8}{"上行/次":>12}{"下行/次":>12}{"p50(ms)":>10}{"p95(ms)":>10}')
+    for mode in ('put', 'patch'):
+        sent, received, latencies = run(client, note, args.saves, mode)
+        print(f'{mode.upper():<8}{statistics.mean(sent):>11.0f}B{statistics.mean(received):>11.0f}B'
+              f'{percentile(latencies, 0.5):>10.2f}{percentile(latencies, 0.95):>10.2f}')
+
+    # 内容没有变化的保存不产生数据库写入
+    for mode, method in (('put', client.put), ('patch', client.patch)):
+        body = {'title': note['title'], 'tag': note['tag']}
+        if mode == 'put':
+            body['content'] = note['content']
+        else:
+            body.update(baseVersion=note['version'], ops=[])
+        start = time.perf_counter()
+        method(f"/api/notes/{note['id']}", json=body)
+        print(f'未变化的 {mode.upper()}：{(time.perf_counter() - start) * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
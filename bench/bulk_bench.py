@@ -0,0 +1,112 @@
+"""批量导入导出基准测试：对比逐条 POST 与 NDJSON 批量导入的吞吐量
+
+生成指定数量的笔记、待办、项目和任务，先用原有接口逐条创建一部分（逐条太慢，按比例外推），
+再用 /api/import 整体导入，最后用 /api/export 流式导出，输出每秒行数和导出时的内存峰值。
+
+用法：
+    python bench/bulk_bench.py --rows 100000 --single 500
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def generate(rows):
+    """按 笔记:待办:项目:任务 = 5:2:1:2 的比例生成记录，任务引用本批的项目"""
+    projects = max(1, rows // 10)
+    records = []
+    for i in range(rows // 2):
+        records.append({'kind': 'note', 'title': f'笔记 {i}', 'content': f'内容 {i} ' * 20, 'tag': f'标签{i % 50}'})
+    for i in range(rows // 5):
+        records.append({'kind': 'todo', 'title': f'待办 {i}', 'priority': random.choice(['high', 'medium', 'low'])})
+    for i in range(projects):
+        records.append({'kind': 'project', 'id': i + 1, 'name': f'项目 {i}'})
+    for i in range(rows - len(records)):
+        records.append({'kind': 'task', 'projectId': i % projects + 1, 'title': f'任务 {i}',
+                        'status': random.choice(['todo', 'in_progress', 'done'])})
+    return records
+
+
+SINGLE_ROUTES = {
+    'note': lambda r: '/api/notes',
+    'todo': lambda r: '/api/todos',
+    'project': lambda r: '/api/projects',
+    'task': lambda r: f"/api/projects/{r['projectId']}/tasks",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--single', type=int, default=500, help='逐条创建的记录数（用于外推）')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='notes-bulk-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "notes.db")}'
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from app import app
+
+    client = app.test_client()
+    random.seed(1)
+
+    # 逐条创建：项目在前，保证任务引用的项目存在
+    sample = generate(args.single)
+    sample.sort(key=lambda r: r['kind'] != 'project')
+    start = time.perf_counter()
+    for record in sample:
+        body = {k: v for k, v in record.items() if k not in ('kind', 'id')}
+        response = client.post(SINGLE_ROUTES[record['kind']](record), json=body)
+        assert response.status_code in (200, 201), response.get_data(as_text=True)
+    single_rate = len(sample) / (time.perf_counter() - start)
+
+    # 换一个新库做批量导入，项目 id 从 1 开始
+    os.remove(os.path.join(workdir, 'notes.db'))
+    with app.app_context():
+        from app import db
+        db.engine.dispose()
+        db.create_all()
+
+    records = generate(args.rows)
+    body = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records).encode()
+    start = time.perf_counter()
+    response = client.post(f'/api/import?chunkSize={args.chunk_size}', data=body,
+                           content_type='application/x-ndjson')
+    import_elapsed = time.perf_counter() - start
+    result = response.get_json()
+    assert result['errorCount'] == 0, result['errors'][:5]
+    imported = sum(result['imported'].values())
+
+    def export():
+        response = client.get('/api/export', buffered=False)
+        lines = size = 0
+        for chunk in response.response:
+            lines += chunk.count(b'\n')
+            size += len(chunk)
+        response.close()
+        return lines, size
+
+    start = time.perf_counter()
+    exported, exported_bytes = export()
+    export_elapsed = time.perf_counter() - start
+    # tracemalloc 会明显拖慢执行，内存峰值单独测一次
+    tracemalloc.start()
+    export()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{"方式":<16}{"行数":>10}{"耗时(s)":>10}{"行/秒":>12}')
+    print(f'{"逐条 POST":<16}{len(sample):>10}{len(sample) / single_rate:>10.2f}{single_rate:>12.0f}')
+    print(f'{"NDJSON 导入":<16}{imported:>10}{import_elapsed:>10.2f}{imported / import_elapsed:>12.0f}')
+    print(f'{"NDJSON 导出":<16}{exported:>10}{export_elapsed:>10.2f}{exported / export_elapsed:>12.0f}')
+    print(f'逐条 POST 导入 {args.rows} 行预计耗时 {args.rows / single_rate:.1f} s')
+    print(f'导出 {exported_bytes / 1024 / 1024:.1f} MB，Python 内存峰值 {peak / 1024 / 1024:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
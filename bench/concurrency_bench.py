@@ -0,0 +1,157 @@
+"""并发基准：N 个读线程 + M 个写线程同时访问笔记和待办接口
+
+分别以“调优前”（rollback journal、synchronous=FULL、DEFERRED 事务）和“调优后”（storage.py 的默认配置）
+启动服务，统计吞吐、延迟和错误数（例如 "database is locked" 导致的 500）。
+
+安装了 gunicorn 时以多进程方式启动（--workers），否则使用 werkzeug 的多线程服务器。
+
+用法：
+    python bench/concurrency_bench.py --readers 8 --writers 4 --duration 10 --workers 4
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+PROFILES = {
+    'baseline': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_CACHE_SIZE': '-2000',
+        'SQLITE_MMAP_SIZE': '0',
+        'SQLITE_WRITE_BEGIN': 'DEFERRED',
+    },
+    'tuned': {},
+}
+
+
+def serve(port, workers):
+    """子进程：初始化数据后启动服务"""
+    sys.path.insert(0, ROOT)
+    from app import app, db, Note, Todo, Project
+
+    with app.app_context():
+        if not Note.query.first():
+            db.session.execute(Note.__table__.insert(), [
+                {'title': f'笔记{i}', 'content': '并发测试内容。' * 100, 'tag': '测试'} for i in range(2000)
+            ])
+            db.session.execute(Todo.__table__.insert(), [{'title': f'待办{i}'} for i in range(500)])
+            db.session.add(Project(name='并发测试项目'))
+            db.session.commit()
+        db.engine.dispose()
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        from werkzeug.serving import run_simple
+        run_simple('127.0.0.1', port, app, threaded=True)
+    else:
+        os.execvp(sys.executable, [
+            sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+            '--chdir', ROOT, '--log-level', 'warning', 'app:app'
+        ])
+
+
+def reader(base, stop, results):
+    session = requests.Session()
+    while not stop.is_set():
+        for path in ('/api/notes?limit=50&fields=id,title,tag,updatedAt', '/api/todos?limit=50'):
+            start = time.perf_counter()
+            status = session.get(base + path).status_code
+            results.append(('read', status, (time.perf_counter() - start) * 1000))
+
+
+def writer(base, stop, results):
+    session = requests.Session()
+    rng = random.Random()
+    while not stop.is_set():
+        operations = (
+            ('post', '/api/notes', {'title': '新笔记', 'content': '写入测试。' * 200}),
+            ('put', f'/api/todos/{rng.randint(1, 500)}', {'completed': rng.random() < 0.5}),
+            ('post', '/api/projects/1/tasks', {'title': '任务', 'status': rng.choice(['todo', 'done'])}),
+        )
+        for method, path, body in operations:
+            start = time.perf_counter()
+            status = getattr(session, method)(base + path, json=body).status_code
+            results.append(('write', status, (time.perf_counter() - start) * 1000))
+
+
+def wait_until_ready(base, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(base + '/api/folders', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('服务启动超时')
+
+
+def run_profile(name, overrides, args, port):
+    workdir = tempfile.mkdtemp(prefix=f'notes-concurrency-{name}-')
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.join(workdir, "notes.db")}', **overrides)
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', str(port), '--workers', str(args.workers)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_ready(base)
+        stop = threading.Event()
+        results = []
+        threads = [threading.Thread(target=reader, args=(base, stop, results)) for _ in range(args.readers)]
+        threads += [threading.Thread(target=writer, args=(base, stop, results)) for _ in range(args.writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'\n== {name} ==')
+    for kind in ('read', 'write'):
+        samples = [r for r in results if r[0] == kind]
+        ok = [latency for _, status, latency in samples if status < 400]
+        errors = len(samples) - len(ok)
+        if not ok:
+            print(f'{kind}: 全部失败（{errors} 个错误）')
+            continue
+        ok.sort()
+        print(f'{kind:<6} {len(ok) / args.duration:>8.1f} req/s  p50 {statistics.median(ok):>7.1f} ms  '
+              f'p95 {ok[int(len(ok) * 0.95)]:>7.1f} ms  错误 {errors}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker 进程数')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.workers)
+        return
+    for name in args.profiles:
+        run_profile(name, PROFILES[name], args, args.port)
+
+
+if __name__ == '__main__':
+    main()
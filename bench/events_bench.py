@@ -0,0 +1,198 @@
+"""实时推送负载测试：保持大量空闲 SSE 连接，测量内存、空闲 CPU 和事件扇出延迟
+
+启动服务后建立 --connections 个 /api/events 连接，然后：
+  1. 记录服务进程（含子进程）的内存和线程数；
+  2. 空闲 --idle 秒，记录这段时间服务端消耗的 CPU 时间；
+  3. 每隔 --interval 秒创建一条待办，统计每条事件从请求发出到各连接收到的延迟和送达率。
+
+默认使用 werkzeug 多线程服务器（单进程，local 后端）；--workers 大于 1 时需要安装 gunicorn，
+以 gthread 方式启动多进程，并使用 changelog 后端。
+
+用法：
+    python bench/events_bench.py --connections 1000 --writes 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def serve(port, workers, threads):
+    sys.path.insert(0, ROOT)
+    if workers > 1:
+        os.execvp(sys.executable, [
+            sys.executable, '-m', 'gunicorn', '-w', str(workers), '-k', 'gthread', '--threads', str(threads),
+            '-b', f'127.0.0.1:{port}', '--chdir', ROOT, '--log-level', 'warning', 'app:app'
+        ])
+    from werkzeug.serving import run_simple
+    from app import app
+    run_simple('127.0.0.1', port, app, threaded=True)
+
+
+def process_tree(pid):
+    """pid 及其所有子进程"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def resource_usage(pid):
+    """返回 (RSS MB, 线程数, CPU 秒)"""
+    rss = threads = cpu = 0
+    ticks = os.sysconf('SC_CLK_TCK')
+    for current in process_tree(pid):
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss += int(line.split()[1]) / 1024
+                    elif line.startswith('Threads:'):
+                        threads += int(line.split()[1])
+            with open(f'/proc/{current}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+                cpu += (int(fields[11]) + int(fields[12])) / ticks
+        except OSError:
+            continue
+    return rss, threads, cpu
+
+
+class Listener:
+    def __init__(self):
+        self.received = {}  # {待办 id: 收到时间}
+        self.connected = False
+
+    async def run(self, port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET /api/events HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+                     'Accept: text/event-stream\r\n\r\n'.encode())
+        await writer.drain()
+        status = await reader.readline()
+        if b' 200 ' not in status:
+            raise RuntimeError(status.decode().strip())
+        self.connected = True
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.startswith(b'data: '):
+                event = json.loads(line[6:])
+                if event.get('table') == 'todo' and event.get('op') == 'upsert':
+                    self.received.setdefault(event['id'], time.perf_counter())
+
+
+def wait_until_ready(base, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(base + '/api/folders', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('服务启动超时')
+
+
+async def load_test(args, server_pid):
+    base = f'http://127.0.0.1:{args.port}'
+    listeners = [Listener() for _ in range(args.connections)]
+    start = time.perf_counter()
+    tasks = []
+    # 分批建立连接，避免瞬间占满监听队列
+    for i in range(0, len(listeners), 100):
+        tasks += [asyncio.create_task(listener.run(args.port)) for listener in listeners[i:i + 100]]
+        await asyncio.sleep(0.1)
+    while sum(listener.connected for listener in listeners) < len(listeners):
+        failed = [task for task in tasks if task.done() and task.exception()]
+        if failed:
+            raise RuntimeError(f'{len(failed)} 个连接失败：{failed[0].exception()}')
+        await asyncio.sleep(0.1)
+    connect_seconds = time.perf_counter() - start
+
+    rss, threads, cpu_before = resource_usage(server_pid)
+    await asyncio.sleep(args.idle)
+    _, _, cpu_after = resource_usage(server_pid)
+    print(f'{args.connections} 个连接建立耗时 {connect_seconds:.1f} s，服务端内存 {rss:.0f} MB，线程 {threads}，'
+          f'空闲 {args.idle:.0f} s 消耗 CPU {cpu_after - cpu_before:.2f} s')
+
+    loop = asyncio.get_running_loop()
+    session = requests.Session()
+    sent = {}
+    for _ in range(args.writes):
+        sent_at = time.perf_counter()
+        todo = (await loop.run_in_executor(None, lambda: session.post(base + '/api/todos', json={'title': '推送测试'}))).json()
+        sent[todo['id']] = sent_at
+        await asyncio.sleep(args.interval)
+    await asyncio.sleep(2)
+
+    latencies = [
+        (listener.received[todo_id] - sent_at) * 1000
+        for listener in listeners for todo_id, sent_at in sent.items() if todo_id in listener.received
+    ]
+    expected = len(sent) * len(listeners)
+    latencies.sort()
+    print(f'{len(sent)} 条事件 × {len(listeners)} 个连接：送达 {len(latencies)}/{expected}，'
+          f'延迟 p50 {statistics.median(latencies):.1f} ms，p99 {latencies[int(len(latencies) * 0.99)]:.1f} ms，'
+          f'最大 {latencies[-1]:.1f} ms')
+    stats = session.get(base + '/api/events/stats').json()
+    print(f'服务端统计：{stats}')
+    for task in tasks:
+        task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--writes', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.2, help='两次写入的间隔秒数')
+    parser.add_argument('--idle', type=float, default=5, help='测量空闲 CPU 的秒数')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.workers, args.connections // args.workers + 10)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='notes-events-')
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.join(workdir, "notes.db")}',
+               EVENT_MAX_SUBSCRIBERS=str(args.connections + 10))
+    if args.workers > 1:
+        env['EVENT_BACKEND'] = 'changelog'
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', str(args.port), '--workers', str(args.workers),
+         '--connections', str(args.connections)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_ready(f'http://127.0.0.1:{args.port}')
+        asyncio.run(load_test(args, server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
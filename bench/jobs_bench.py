@@ -0,0 +1,170 @@
+"""后台任务基准：AI 请求很慢时，同步调用和 ?async=1 对其他接口（保存笔记）延迟的影响
+
+服务只有 --threads 个请求线程（安装了 gunicorn 时为 gthread worker，否则为固定大小线程池的 werkzeug 服务），
+AI 接口指向延迟 --ai-delay 秒的模拟服务。--ai-clients 个线程不断请求生成标题，同时 --writers 个线程不断保存笔记：
+  sync   生成标题在请求线程中等待上游返回（原有方式）
+  async  带 ?async=1 写入任务队列后轮询 /api/jobs/<id>，任务由单独的 flask run-worker 进程执行
+输出保存笔记的吞吐、延迟和错误数，以及完成的 AI 请求数。
+
+用法：
+    python bench/jobs_bench.py --threads 8 --ai-clients 16 --ai-delay 2 --duration 20
+"""
+import argparse
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from concurrency_bench import wait_until_ready  # noqa: E402
+from openrouter_stub import serve as serve_stub  # noqa: E402
+
+
+def serve(port, threads):
+    """子进程：以固定数量的请求线程启动服务"""
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        sys.path.insert(0, ROOT)
+        from werkzeug.serving import BaseWSGIServer
+        from app import app
+
+        class PooledWSGIServer(BaseWSGIServer):
+            # 与 gunicorn gthread 相同：请求交给固定大小的线程池，线程都被占用时新请求排队
+            pool = ThreadPoolExecutor(threads)
+
+            def process_request(self, request, client_address):
+                self.pool.submit(self._handle, request, client_address)
+
+            def _handle(self, request, client_address):
+                try:
+                    self.finish_request(request, client_address)
+                finally:
+                    self.shutdown_request(request)
+
+        PooledWSGIServer('127.0.0.1', port, app).serve_forever()
+    else:
+        os.execvp(sys.executable, [
+            sys.executable, '-m', 'gunicorn', '-k', 'gthread', '-w', '1', '--threads', str(threads),
+            '-b', f'127.0.0.1:{port}', '--chdir', ROOT, '--log-level', 'warning', 'app:app'
+        ])
+
+
+def ai_client(base, mode, stop, completed):
+    session = requests.Session()
+    count = 0
+    while not stop.is_set():
+        # 每次内容不同，避免命中 AI 结果缓存
+        body = {'content': f'基准测试内容 {threading.get_ident()} {count}'}
+        count += 1
+        if mode == 'sync':
+            response = session.post(base + '/api/ai/generate-title', json=body, timeout=120)
+            if response.ok:
+                completed.append(1)
+            continue
+        job = session.post(base + '/api/ai/generate-title?async=1', json=body, timeout=120).json()
+        while job['status'] in ('queued', 'running') and not stop.is_set():
+            time.sleep(0.2)
+            job = session.get(f"{base}/api/jobs/{job['id']}", timeout=120).json()
+        if job['status'] == 'succeeded':
+            completed.append(1)
+
+
+def writer(base, stop, results):
+    session = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            status = session.post(base + '/api/notes', json={'title': '新笔记', 'content': '写入测试。' * 50},
+                                  timeout=60).status_code
+        except requests.RequestException:
+            status = 599
+        results.append((status, (time.perf_counter() - start) * 1000))
+
+
+def run_mode(mode, args, port, stub_url):
+    workdir = tempfile.mkdtemp(prefix=f'notes-jobs-{mode}-')
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.join(workdir, "notes.db")}',
+               OPENROUTER_BASE_URL=stub_url, OPENROUTER_API_KEY='bench', JOB_WORKERS='0',
+               AI_MAX_CONCURRENCY=str(args.ai_clients), FLASK_APP='app')
+    processes = [subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', str(port), '--threads', str(args.threads)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )]
+    base = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_ready(base)
+        if mode == 'async':
+            # 数据库由服务进程初始化之后再启动 worker，等它输出启动信息后开始计时
+            worker = subprocess.Popen(
+                [sys.executable, '-m', 'flask', 'run-worker', '--concurrency', str(args.job_workers)],
+                cwd=ROOT, env=dict(env, PYTHONUNBUFFERED='1'), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+            processes.append(worker)
+            worker.stdout.readline()
+        stop = threading.Event()
+        completed, results = [], []
+        threads = [threading.Thread(target=ai_client, args=(base, mode, stop, completed))
+                   for _ in range(args.ai_clients)]
+        threads += [threading.Thread(target=writer, args=(base, stop, results)) for _ in range(args.writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        for process in processes:
+            # worker 收到 SIGINT 后等正在执行的任务完成再退出
+            process.send_signal(signal.SIGINT)
+            process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ok = sorted(latency for status, latency in results if status < 400)
+    errors = len(results) - len(ok)
+    print(f'\n== {mode} ==')
+    if ok:
+        print(f'保存笔记 {len(ok) / args.duration:>8.1f} req/s  p50 {statistics.median(ok):>8.1f} ms  '
+              f'p95 {ok[int(len(ok) * 0.95)]:>8.1f} ms  最大 {ok[-1]:>8.1f} ms  错误 {errors}')
+    else:
+        print(f'保存笔记 全部失败（{errors} 个错误）')
+    print(f'完成 AI 请求 {len(completed)} 个（{len(completed) / args.duration:.1f} 个/秒）')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8, help='服务的请求线程数')
+    parser.add_argument('--ai-clients', type=int, default=16, help='并发请求 AI 接口的客户端数')
+    parser.add_argument('--ai-delay', type=float, default=2.0, help='模拟 AI 服务的响应延迟（秒）')
+    parser.add_argument('--writers', type=int, default=2, help='并发保存笔记的客户端数')
+    parser.add_argument('--job-workers', type=int, default=8, help='async 模式下 worker 进程的并发数')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--modes', nargs='+', default=['sync', 'async'], choices=['sync', 'async'])
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.threads)
+        return
+
+    stub = serve_stub(port=0, delay=args.ai_delay)
+    try:
+        for mode in args.modes:
+            run_mode(mode, args, args.port, f'http://127.0.0.1:{stub.server_port}/api/v1')
+    finally:
+        stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""本地 OpenRouter 模拟服务，用于测试和基准测试 AI 接口
+
+用法：
+    python bench/openrouter_stub.py --port 8765 --delay 0.2 --fail-rate 0.1
+    OPENROUTER_BASE_URL=http://127.0.0.1:8765/api/v1 OPENROUTER_API_KEY=test python app.py
+
+请求体带 "stream": true 时按 SSE 格式逐字返回（--token-delay 控制间隔）。
+GET /stats 返回收到的请求数和被客户端中途断开的流数量，便于验证缓存、重试和取消是否生效。
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，不关闭 Nagle 算法时每个请求会额外等待约 40 ms 的延迟确认
+    disable_nagle_algorithm = True
+    delay = 0.0
+    fail_rate = 0.0
+    token_delay = 0.0
+    requests_seen = 0
+    streams_cancelled = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            # 客户端关闭了空闲的保持连接
+            pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.send_json(200, {
+                'requests': StubHandler.requests_seen,
+                'streamsCancelled': StubHandler.streams_cancelled,
+            })
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with StubHandler.lock:
+            StubHandler.requests_seen += 1
+        if not self.path.endswith('/chat/completions'):
+            self.send_json(404, {'error': 'not found'})
+            return
+        if self.headers.get('Authorization') == 'Bearer invalid':
+            self.send_json(401, {'error': {'message': 'invalid api key'}})
+            return
+        if random.random() < self.fail_rate:
+            self.send_json(503, {'error': {'message': 'stub overloaded'}})
+            return
+        time.sleep(self.delay)
+        if payload.get('stream'):
+            self.send_stream(self.completion(payload)['choices'][0]['message']['content'])
+        else:
+            self.send_json(200, self.completion(payload))
+
+    def send_stream(self, reply):
+        # 与 OpenRouter 一致使用 chunked 编码，每个 SSE 事件一个 chunk
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            self.write_chunk(b': OPENROUTER PROCESSING\n\n')
+            for char in reply:
+                time.sleep(self.token_delay)
+                chunk = {'choices': [{'index': 0, 'delta': {'content': char}}]}
+                self.write_chunk(f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'.encode())
+            self.write_chunk(b'data: [DONE]\n\n')
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            with StubHandler.lock:
+                StubHandler.streams_cancelled += 1
+
+    def write_chunk(self, data):
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def completion(self, payload):
+        prompt = payload.get('messages', [{}])[-1].get('content', '')
+        system = payload.get('messages', [{}])[0].get('content', '')
+        if 'JSON' in system:
+            # 批量打标签：为每个 [编号] 返回一个标签
+            numbers = re.findall(r'^\[(\d+)\]', prompt, re.MULTILINE)
+            reply = json.dumps({n: random.choice(['学习', '工作', '生活', '技术']) for n in numbers}, ensure_ascii=False)
+        elif '标签' in system:
+            reply = '学习,笔记,模拟'
+        elif '标题' in system:
+            reply = f'"{prompt.strip()[:12] or "无标题"}"'
+        else:
+            reply = f'（润色）{prompt.split(chr(10))[-1]}'
+        return {
+            'id': 'stub-completion',
+            'model': payload.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': len(prompt), 'completion_tokens': len(reply)},
+        }
+
+
+def serve(port=8765, delay=0.0, fail_rate=0.0, token_delay=0.0):
+    """启动模拟服务并返回 server 对象（serve_forever 在后台线程中运行）"""
+    StubHandler.delay = delay
+    StubHandler.fail_rate = fail_rate
+    StubHandler.token_delay = token_delay
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help='每个请求的响应延迟（秒）')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='返回 503 的概率，用于验证重试')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='流式响应中每个字符的间隔（秒）')
+    args = parser.parse_args()
+    server = serve(args.port, args.delay, args.fail_rate, args.token_delay)
+    print(f'OpenRouter stub listening on http://127.0.0.1:{server.server_port}/api/v1')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
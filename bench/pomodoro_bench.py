@@ -0,0 +1,109 @@
+"""番茄钟统计基准：按日汇总表 vs 直接对记录表 GROUP BY
+
+生成 --days 天、共 --sessions 条番茄钟记录（分布在 --todos 个待办上），然后比较：
+  rollup  /api/pomodoro/stats 读取 pomodoro_daily 汇总表（接口的实际实现）
+  raw     对 pomodoro_session 做同样的按日/按待办聚合（没有汇总表时的做法）
+并测量写入一条记录（含汇总表增量更新）的耗时。
+
+用法：
+    python bench/pomodoro_bench.py --sessions 200000 --days 365
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return result, statistics.median(samples), samples[int(len(samples) * 0.95)]
+
+
+def seed(db, PomodoroSession, Todo, args, today):
+    rng = random.Random(args.seed)
+    todos = [Todo(title=f'专注任务 {i}', type='pomodoro') for i in range(args.todos)]
+    db.session.add_all(todos)
+    db.session.flush()
+    todo_ids = [todo.id for todo in todos] + [None]
+    rows = []
+    for _ in range(args.sessions):
+        day = today - timedelta(days=rng.randrange(args.days))
+        started_at = datetime(day.year, day.month, day.day, rng.randrange(24), rng.randrange(60))
+        duration = rng.choice((1500, 1500, 1500, 1200, 3000))
+        rows.append({
+            'todoId': rng.choice(todo_ids),
+            'startedAt': started_at,
+            'endedAt': started_at + timedelta(seconds=duration),
+            'duration': duration,
+            'day': day,
+        })
+    db.session.execute(PomodoroSession.__table__.insert(), rows)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=200000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--todos', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='notes-pomodoro-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "notes.db")}'
+    sys.path.insert(0, ROOT)
+    try:
+        from app import PomodoroSession, Todo, app, db, rebuild_pomodoro_daily
+
+        today = datetime.utcnow().date()
+        with app.app_context():
+            start = time.perf_counter()
+            seed(db, PomodoroSession, Todo, args, today)
+            rows = rebuild_pomodoro_daily()
+            print(f'{args.sessions} 条记录，{args.days} 天，{args.todos} 个待办 -> 汇总表 {rows} 行'
+                  f'（生成耗时 {time.perf_counter() - start:.1f} s）')
+
+        client = app.test_client()
+        since = today - timedelta(days=args.days - 1)
+        for group_by in ('day', 'week', 'todo'):
+            url = f'/api/pomodoro/stats?groupBy={group_by}&today={today}'
+            response, p50, p95 = timed(lambda: client.get(url), args.repeat)
+            assert response.status_code == 200, response.get_data(as_text=True)
+            print(f'rollup {group_by:<5} {p50:8.2f} ms (p95 {p95:.2f})  {len(response.json["items"])} 项')
+
+        with app.app_context():
+            raw_queries = {
+                'day': db.session.query(
+                    PomodoroSession.day, db.func.count(PomodoroSession.id), db.func.sum(PomodoroSession.duration)
+                ).filter(PomodoroSession.day >= since).group_by(PomodoroSession.day),
+                'todo': db.session.query(
+                    PomodoroSession.todoId, db.func.count(PomodoroSession.id), db.func.sum(PomodoroSession.duration)
+                ).filter(PomodoroSession.day >= since).group_by(PomodoroSession.todoId),
+            }
+            for group_by, query in raw_queries.items():
+                result, p50, p95 = timed(query.all, args.repeat)
+                print(f'raw    {group_by:<5} {p50:8.2f} ms (p95 {p95:.2f})  {len(result)} 项')
+
+        started_at = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=25)
+        body = {'startedAt': started_at.isoformat(), 'endedAt': (started_at + timedelta(minutes=25)).isoformat()}
+        _, p50, p95 = timed(lambda: client.post('/api/pomodoro/sessions', json=body), args.repeat)
+        print(f'写入一条记录（含汇总更新） {p50:.2f} ms (p95 {p95:.2f})')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""笔记历史版本基准：模拟长期的自动保存，测量存储增长、保存开销、还原耗时和整理效果
+
+一篇 --lines 行的笔记，连续 --days 天每天编辑 --sessions 次，每次编辑每两秒自动保存一次、
+共 --saves 次，每次保存修改一行（时间按模拟时钟推进，不需要真的等待）。输出：
+  - 自动保存次数、版本数、存储字节数，与每次保存存一份全文相比；
+  - 记录版本（不含提交）的平均和 p99 耗时；
+  - 随机还原版本的耗时；
+  - compact-revisions 整理后的版本数和字节数，并校验整理后每个版本仍能正确还原。
+
+用法：
+    python bench/revision_bench.py --days 200 --sessions 2 --saves 75
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--sessions', type=int, default=2, help='每天编辑几次')
+    parser.add_argument('--saves', type=int, default=75, help='每次编辑自动保存几次（每两秒一次）')
+    parser.add_argument('--lines', type=int, default=200, help='笔记行数')
+    parser.add_argument('--samples', type=int, default=200, help='测量还原耗时的版本数')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='notes-revisions-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "notes.db")}'
+    sys.path.insert(0, ROOT)
+    try:
+        from app import Note, NoteRevision, app, db, load_revision_content, record_note_revision
+
+        rng = random.Random(args.seed)
+        lines = [f'第 {i} 段 ' + '内容' * rng.randint(5, 40) + '\n' for i in range(args.lines)]
+        start = datetime.utcnow() - timedelta(days=args.days)
+        expected = {}
+        record_ms = []
+        with app.app_context():
+            note = Note(title='基准', content=''.join(lines), createdAt=start, updatedAt=start)
+            db.session.add(note)
+            db.session.commit()
+            for day in range(args.days):
+                for session in range(args.sessions):
+                    session_start = start + timedelta(days=day, hours=session * 3)
+                    for save in range(args.saves):
+                        now = session_start + timedelta(seconds=save * 2)
+                        old_title, old_content = note.title, note.content
+                        index = rng.randrange(len(lines))
+                        lines[index] = f'第 {index} 段 修改于 {day}-{session}-{save} ' + '内容' * rng.randint(5, 40) + '\n'
+                        note.content = ''.join(lines)
+                        note.version += 1
+                        note.updatedAt = now
+                        began = time.perf_counter()
+                        revision = record_note_revision(note, old_title, old_content, now)
+                        db.session.flush()
+                        record_ms.append((time.perf_counter() - began) * 1000)
+                        db.session.commit()
+                        expected[revision.seq] = note.content
+
+            saves = len(record_ms)
+            document = len(note.content.encode())
+            rows = db.session.query(NoteRevision.seq, NoteRevision.keyframeSeq, db.func.length(NoteRevision.data)).filter(
+                NoteRevision.noteId == note.id
+            ).all()
+            stored = sum(size for _, _, size in rows)
+            print(f'{saves} 次自动保存 -> {len(rows)} 个版本，存储 {stored / 1024:.0f} KiB，'
+                  f'每次保存存全文需要 {saves * document / 1024 / 1024:.0f} MiB（笔记 {document / 1024:.0f} KiB）')
+            print(f'记录版本 平均 {statistics.mean(record_ms):.2f} ms，p99 {percentile(record_ms, 0.99):.2f} ms')
+
+            def measure(rows):
+                samples = []
+                for seq, keyframe_seq, _ in rng.sample(rows, min(args.samples, len(rows))):
+                    began = time.perf_counter()
+                    content = load_revision_content(note.id, seq, keyframe_seq)
+                    samples.append((time.perf_counter() - began) * 1000)
+                    assert seq not in expected or content == expected[seq], f'版本 {seq} 还原错误'
+                return samples
+
+            samples = measure(rows)
+            print(f'还原版本 p50 {statistics.median(samples):.2f} ms，p99 {percentile(samples, 0.99):.2f} ms，'
+                  f'最大 {max(samples):.2f} ms')
+
+        result = app.test_cli_runner().invoke(args=['compact-revisions'])
+        print(result.output.strip())
+        with app.app_context():
+            rows = db.session.query(NoteRevision.seq, NoteRevision.keyframeSeq, db.func.length(NoteRevision.data)).filter(
+                NoteRevision.noteId == note.id
+            ).all()
+            samples = measure(rows)
+            print(f'整理后 {len(rows)} 个版本，存储 {sum(size for _, _, size in rows) / 1024:.0f} KiB，'
+                  f'还原 p50 {statistics.median(samples):.2f} ms，最大 {max(samples):.2f} ms')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
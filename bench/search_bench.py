@@ -0,0 +1,104 @@
+"""笔记搜索基准测试：对比 LIKE 全表扫描与 FTS5 全文索引
+
+3 个字以上的检索词走 trigram 索引（note_fts），1~2 个字的检索词走短词索引（note_fts_short）。
+
+用法：
+    python bench/search_bench.py                 # 默认 10k/100k/1M 条笔记
+    python bench/search_bench.py --sizes 10000 50000 --runs 20
+
+每个规模使用独立的临时 SQLite 数据库，不会影响 instance/notes.db。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# 用常用汉字随机组合出约 5000 个词，使检索词的命中率接近真实笔记（大多数词只出现在少量笔记中）
+CHARS = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处理府研'
+VOCABULARY = random.Random(0).sample(sorted({a + b for a in CHARS for b in CHARS}), 5000)
+TAGS = ['默认', '工作', '学习', '生活', '技术', '读书']
+
+
+def pick_queries(rng):
+    # 1~2 字的检索词（中文最常见的情况）和 3~4 字的检索词（两个词拼接后截取）
+    return [(rng.choice(VOCABULARY) + rng.choice(VOCABULARY))[:n] for n in (1, 2, 2, 2, 3, 4, 3, 4)]
+
+
+def make_rows(count, seed=42):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield {
+            'title': ''.join(rng.choices(VOCABULARY, k=4)),
+            'content': '，'.join(''.join(rng.choices(VOCABULARY, k=8)) for _ in range(rng.randint(5, 40))),
+            'tag': rng.choice(TAGS),
+        }
+
+
+def timed(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench_size(size, runs):
+    workdir = tempfile.mkdtemp(prefix='notes-search-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "notes.db")}'
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+    # 每个规模需要新的数据库连接，重新导入应用模块
+    sys.modules.pop('app', None)
+    from sqlalchemy import text
+    from app import app, db, Note, build_fts_query
+
+    with app.app_context():
+        insert = Note.__table__.insert()
+        batch = []
+        for row in make_rows(size):
+            batch.append(row)
+            if len(batch) == 10000:
+                db.session.execute(insert, batch)
+                batch = []
+        if batch:
+            db.session.execute(insert, batch)
+        db.session.commit()
+
+        like_sql = text(
+            'SELECT id FROM note WHERE title LIKE :p OR content LIKE :p OR tag LIKE :p '
+            'ORDER BY updatedAt DESC'
+        )
+        fts_sql = text('SELECT rowid FROM note_fts WHERE note_fts MATCH :q ORDER BY rank')
+        short_sql = text(
+            'SELECT note.id FROM note_fts_short JOIN note ON note.id = note_fts_short.rowid '
+            'WHERE note_fts_short MATCH :q ORDER BY note.updatedAt DESC'
+        )
+
+        print(f'\n== {size} 条笔记 ==')
+        print(f'{"查询":<8}{"命中":>8}{"LIKE(ms)":>12}{"FTS5(ms)":>12}{"加速":>10}')
+        for q in pick_queries(random.Random(size)):
+            long_query, short_query = build_fts_query(q)
+            sql, params = (fts_sql, {'q': long_query}) if long_query else (short_sql, {'q': short_query})
+            hits = len(db.session.execute(sql, params).all())
+            like_ms = timed(lambda: db.session.execute(like_sql, {'p': f'%{q}%'}).all(), runs)
+            fts_ms = timed(lambda: db.session.execute(sql, params).all(), runs)
+            print(f'{q:<8}{hits:>8}{like_ms:>12.2f}{fts_ms:>12.2f}{like_ms / fts_ms:>9.1f}x')
+        db.session.remove()
+        db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+    for size in args.sizes:
+        bench_size(size, args.runs)
+
+
+if __name__ == '__main__':
+    main()
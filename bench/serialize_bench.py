@@ -0,0 +1,88 @@
+"""序列化基准测试：对比旧的逐字段字典拼装与 serializers 模块
+
+向临时数据库写入指定数量的笔记，分别测量：
+  旧方式：查询 ORM 对象，逐行拼字典并调用 isoformat()，再用标准库 json 编码（Flask 默认）
+  新方式：只查询需要的列（元组），用 serializers.dumps 编码（安装了 orjson 时使用 orjson）
+以及 GET /api/notes 整个请求的耗时。
+
+用法：
+    python bench/serialize_bench.py --notes 50000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+def best_of(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return min(samples), statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='notes-serialize-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "notes.db")}'
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from app import app, db, Note, NOTE_FIELDS, note_serializer
+    import serializers
+
+    with app.app_context():
+        now = datetime.utcnow()
+        db.session.execute(Note.__table__.insert(), [
+            {'title': f'笔记 {i}', 'content': f'这是第 {i} 篇笔记的内容。' * 10, 'tag': f'标签{i % 20}',
+             'createdAt': now, 'updatedAt': now}
+            for i in range(args.notes)
+        ])
+        db.session.commit()
+
+        def old():
+            notes = Note.query.order_by(Note.updatedAt.desc()).all()
+            return json.dumps([{
+                'id': note.id,
+                'title': note.title,
+                'content': note.content,
+                'tag': note.tag,
+                'createdAt': note.createdAt.isoformat() if note.createdAt else None,
+                'updatedAt': note.updatedAt.isoformat() if note.updatedAt else None,
+                'folderId': note.folderId,
+                'version': note.version
+            } for note in notes], ensure_ascii=False, sort_keys=True).encode()
+
+        def new():
+            rows = note_serializer.query().order_by(Note.updatedAt.desc()).all()
+            return serializers.dumps(note_serializer.rows(rows))
+
+        def new_stream():
+            with app.test_request_context():
+                rows = note_serializer.query().order_by(Note.updatedAt.desc()).yield_per(1000)
+                return b''.join(serializers.stream_array(note_serializer.rows(rows)).response)
+
+        encoder = 'orjson' if serializers.orjson else 'json'
+        print(f'{args.notes} 篇笔记，字段 {", ".join(NOTE_FIELDS)}，编码器 {encoder}')
+        print(f'{"方式":<20}{"最快(ms)":>10}{"中位数(ms)":>12}{"大小":>12}')
+        for name, fn in (('旧：ORM + 字典', old), ('新：列元组', new), ('新：列元组 + 流式', new_stream)):
+            db.session.remove()
+            fastest, median, body = best_of(fn, args.repeat)
+            print(f'{name:<20}{fastest:>10.1f}{median:>12.1f}{len(body) / 1024 / 1024:>10.1f}MB')
+
+    client = app.test_client()
+    # 流式响应需要在计时内读完
+    fastest, median, body = best_of(lambda: client.get('/api/notes').get_data(), args.repeat)
+    print(f'{"GET /api/notes":<20}{fastest:>10.1f}{median:>12.1f}{len(body) / 1024 / 1024:>10.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""NDJSON 批量导入导出
+
+每行一个 JSON 对象，"kind" 字段指明记录类型（folder/note/todo/project/task/project_note），
+其余字段与数据表的列同名。导出格式与导入格式一致，可以直接导入到另一个数据库。
+
+导入按 chunk_size 行分块，每块每种类型用一条 executemany INSERT 在一个事务中写入；
+某一块写入失败时改为逐行写入（每行一个 SAVEPOINT），只跳过出错的行。
+导出使用 yield_per 分批读取，内存占用与数据库大小无关。
+"""
+import json
+from datetime import date, datetime
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+# 错误明细最多返回的条数，超出部分只计数
+MAX_REPORTED_ERRORS = 1000
+
+
+def parse_value(column, value):
+    """把 JSON 值转换为列对应的 Python 类型"""
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type in (datetime, date) and not isinstance(value, str):
+        raise ValueError(f'{column.name} 必须是 ISO 8601 格式的日期字符串')
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value[:10])
+    if python_type is bool:
+        if not isinstance(value, bool):
+            raise ValueError(f'{column.name} 必须是布尔值')
+        return value
+    if python_type is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f'{column.name} 必须是整数')
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f'{column.name} 必须是字符串')
+    if getattr(column.type, 'length', None) and len(value) > column.type.length:
+        raise ValueError(f'{column.name} 超过 {column.type.length} 个字符')
+    return value
+
+
+def prepare_row(table, record, skip_columns=()):
+    """校验一条记录并转换为 INSERT 参数，未知字段忽略，必填字段缺失时抛出 ValueError"""
+    row = {}
+    for column in table.columns:
+        if column.name in skip_columns or column.name not in record:
+            continue
+        row[column.name] = parse_value(column, record[column.name])
+    for column in table.columns:
+        required = not column.nullable and not column.primary_key and column.default is None \
+            and column.server_default is None
+        if required and row.get(column.name) is None:
+            raise ValueError(f'缺少必填字段 {column.name}')
+    return row
+
+
+class Importer:
+    """逐行接收 NDJSON，按块批量写入"""
+
+    def __init__(self, db, types, chunk_size=1000, skip_columns=None):
+        self.db = db
+        self.types = types  # {类型名: 模型}，顺序即写入顺序（被引用的类型在前）
+        self.chunk_size = chunk_size
+        self.skip_columns = skip_columns or {}
+        self.buffers = {name: [] for name in types}
+        self.buffered = 0
+        self.imported = {name: 0 for name in types}
+        # 新写入记录的外键值 {(类型名, 列名): 值集合}，用于导入后重新计算计数
+        self.references = {}
+        self.errors = []
+        self.error_count = 0
+
+    def error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_no, 'error': message})
+
+    def feed(self, line_no, line):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('每行必须是一个 JSON 对象')
+            type_name = record.get('kind')
+            if not isinstance(type_name, str) or type_name not in self.types:
+                raise ValueError(f'未知类型 {type_name!r}')
+            table = self.types[type_name].__table__
+            row = prepare_row(table, record, self.skip_columns.get(type_name, ()))
+        except ValueError as e:
+            self.error(line_no, str(e))
+            return
+        self.buffers[type_name].append((line_no, row))
+        self.buffered += 1
+        if self.buffered >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        for type_name, rows in self.buffers.items():
+            if rows:
+                self._write(type_name, self._check_references(type_name, rows))
+        self.buffers = {name: [] for name in self.types}
+        self.buffered = 0
+
+    def finish(self):
+        self.flush()
+        return {
+            'imported': self.imported,
+            'errorCount': self.error_count,
+            'errors': self.errors,
+        }
+
+    def _check_references(self, type_name, rows):
+        """外键引用的记录必须存在（SQLite 默认不检查外键），每个外键列只查询一次"""
+        table = self.types[type_name].__table__
+        for column in table.columns:
+            for foreign_key in column.foreign_keys:
+                wanted = {row[column.name] for _, row in rows if row.get(column.name) is not None}
+                if not wanted:
+                    continue
+                target = foreign_key.column
+                existing = set(self.db.session.execute(
+                    select(target).where(target.in_(wanted))
+                ).scalars())
+                valid = []
+                for line_no, row in rows:
+                    value = row.get(column.name)
+                    if value is not None and value not in existing:
+                        self.error(line_no, f'{column.name}={value} 引用的记录不存在')
+                    else:
+                        valid.append((line_no, row))
+                rows = valid
+        return rows
+
+    def _track(self, table, type_name, row):
+        for column in table.columns:
+            if column.foreign_keys and row.get(column.name) is not None:
+                self.references.setdefault((type_name, column.name), set()).add(row[column.name])
+
+    def _write(self, type_name, rows):
+        if not rows:
+            return
+        table = self.types[type_name].__table__
+        session = self.db.session
+        try:
+            # executemany 要求参数的键一致，按字段集合分组
+            groups = {}
+            for _, row in rows:
+                groups.setdefault(tuple(sorted(row)), []).append(row)
+            for group in groups.values():
+                session.execute(table.insert(), group)
+            session.commit()
+            self.imported[type_name] += len(rows)
+            for _, row in rows:
+                self._track(table, type_name, row)
+            return
+        except SQLAlchemyError:
+            session.rollback()
+
+        # 整块失败（例如有重复 id）时逐行写入，定位出错的行
+        for line_no, row in rows:
+            try:
+                with session.begin_nested():
+                    session.execute(table.insert(), row)
+                self.imported[type_name] += 1
+                self._track(table, type_name, row)
+            except SQLAlchemyError as e:
+                self.error(line_no, str(e.orig) if getattr(e, 'orig', None) else str(e))
+        session.commit()
+
+
+def export_lines(db, types, type_names, dumps, batch_size=1000):
+    """按类型依次导出，每行一条 NDJSON 记录；dumps 把字典编码为 JSON 字节串"""
+    for type_name in type_names:
+        table = types[type_name].__table__
+        result = db.session.execute(
+            select(table).order_by(table.c.id).execution_options(yield_per=batch_size)
+        )
+        for row in result.mappings():
+            record = {'kind': type_name}
+            record.update(row)
+            yield dumps(record) + b'\n'
@@ -0,0 +1,238 @@
+"""进程内缓存
+
+带 TTL 和容量上限的简单缓存，记录命中/未命中/失效次数，供接口和监控查看。
+写入后的失效由 app.py 中的会话事件根据被修改的模型（以及字段）触发。
+
+数据存放在后端中：
+  MemoryBackend  进程内（默认），每个 worker 进程各有一份，其他进程的写入只能等 TTL 过期
+  SQLiteBackend  本机上的一个 SQLite 文件，多个 worker 进程共享同一份数据，任何进程的失效对所有进程立即生效
+
+读穿（get_or_load）时先记下缓存的代数（每次失效加一），加载完成后代数没有变化才写入，
+避免加载期间发生的写入被一份旧数据覆盖。
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 所有已创建的缓存，按名称登记，便于统一查看统计
+registry = {}
+
+_missing = object()
+
+
+class MemoryBackend:
+    name = 'memory'
+
+    def __init__(self):
+        self._data = {}  # {缓存名: OrderedDict(key -> (过期时间, 值))}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, cache, key):
+        with self._lock:
+            entries = self._data.get(cache)
+            entry = entries.get(key) if entries else None
+            if entry is None:
+                return _missing
+            if entry[0] <= time.monotonic():
+                del entries[key]
+                return _missing
+            entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, cache, key, value, ttl, maxsize, generation=None):
+        with self._lock:
+            if generation is not None and self._generations.get(cache, 0) != generation:
+                return False
+            entries = self._data.setdefault(cache, OrderedDict())
+            entries[key] = (time.monotonic() + ttl, value)
+            entries.move_to_end(key)
+            while len(entries) > maxsize:
+                entries.popitem(last=False)
+            return True
+
+    def delete(self, cache, key=None):
+        with self._lock:
+            self._generations[cache] = self._generations.get(cache, 0) + 1
+            entries = self._data.get(cache)
+            if entries is None:
+                return
+            if key is None:
+                entries.clear()
+            else:
+                entries.pop(key, None)
+
+    def generation(self, cache):
+        with self._lock:
+            return self._generations.get(cache, 0)
+
+    def size(self, cache):
+        with self._lock:
+            return len(self._data.get(cache, ()))
+
+
+class SQLiteBackend:
+    """多个进程共享的缓存存储，值用 pickle 序列化（文件只在本机使用）
+
+    缓存数据可以随时丢弃，因此关闭同步写盘；读写出错时按未命中处理，不影响请求。
+    """
+    name = 'sqlite'
+
+    def __init__(self, path, busy_timeout=1.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entry (cache TEXT NOT NULL, key TEXT NOT NULL, '
+                         'expires REAL NOT NULL, value BLOB NOT NULL, PRIMARY KEY (cache, key))')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_generation '
+                         '(cache TEXT PRIMARY KEY, generation INTEGER NOT NULL)')
+
+    def _connection(self):
+        # 每个线程一个连接；过期时间用墙上时间，各进程之间可以比较
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            self._local.conn = conn
+        return conn
+
+    def get(self, cache, key):
+        try:
+            row = self._connection().execute(
+                'SELECT value FROM cache_entry WHERE cache = ? AND key = ? AND expires > ?',
+                (cache, repr(key), time.time())
+            ).fetchone()
+        except sqlite3.Error:
+            logger.warning('读取共享缓存失败', exc_info=True)
+            return _missing
+        return _missing if row is None else pickle.loads(row[0])
+
+    def set(self, cache, key, value, ttl, maxsize, generation=None):
+        conn = self._connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if generation is not None and self._generation(conn, cache) != generation:
+                    return False
+                conn.execute('INSERT OR REPLACE INTO cache_entry (cache, key, expires, value) VALUES (?, ?, ?, ?)',
+                             (cache, repr(key), time.time() + ttl, pickle.dumps(value)))
+                # 超出容量时删除最早过期的条目
+                conn.execute('DELETE FROM cache_entry WHERE cache = ? AND key NOT IN '
+                             '(SELECT key FROM cache_entry WHERE cache = ? ORDER BY expires DESC LIMIT ?)',
+                             (cache, cache, maxsize))
+            finally:
+                conn.execute('COMMIT')
+            return True
+        except sqlite3.Error:
+            logger.warning('写入共享缓存失败', exc_info=True)
+            return False
+
+    def delete(self, cache, key=None):
+        conn = self._connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('INSERT INTO cache_generation (cache, generation) VALUES (?, 1) '
+                             'ON CONFLICT (cache) DO UPDATE SET generation = generation + 1', (cache,))
+                if key is None:
+                    conn.execute('DELETE FROM cache_entry WHERE cache = ?', (cache,))
+                else:
+                    conn.execute('DELETE FROM cache_entry WHERE cache = ? AND key = ?', (cache, repr(key)))
+            finally:
+                conn.execute('COMMIT')
+        except sqlite3.Error:
+            # 失效失败时其他进程最多读到 TTL 内的旧数据
+            logger.error('失效共享缓存失败', exc_info=True)
+
+    def _generation(self, conn, cache):
+        row = conn.execute('SELECT generation FROM cache_generation WHERE cache = ?', (cache,)).fetchone()
+        return row[0] if row else 0
+
+    def generation(self, cache):
+        try:
+            return self._generation(self._connection(), cache)
+        except sqlite3.Error:
+            return None
+
+    def size(self, cache):
+        try:
+            return self._connection().execute(
+                'SELECT COUNT(*) FROM cache_entry WHERE cache = ? AND expires > ?', (cache, time.time())
+            ).fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+
+# 未指定后端的缓存共用的进程内后端
+default_backend = MemoryBackend()
+
+
+class TTLCache:
+    def __init__(self, name, ttl, maxsize=128, backend=None):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.backend = backend or default_backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.discarded = 0  # 加载期间被失效、没有写入的次数
+        registry[name] = self
+
+    def get(self, key, default=None):
+        value = self.backend.get(self.name, key)
+        with self._lock:
+            if value is _missing:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        self.backend.set(self.name, key, value, self.ttl, self.maxsize)
+
+    def get_or_load(self, key, loader):
+        """缓存未命中时调用 loader() 计算并写入缓存
+
+        loader 应读取最新提交的数据（例如使用新的数据库连接），而不是请求中较早开始的事务的快照。
+        """
+        value = self.get(key, _missing)
+        if value is _missing:
+            generation = self.backend.generation(self.name)
+            value = loader()
+            if generation is not None and not self.backend.set(
+                    self.name, key, value, self.ttl, self.maxsize, generation):
+                with self._lock:
+                    self.discarded += 1
+        return value
+
+    def invalidate(self, key=None):
+        """失效指定 key，key 为 None 时清空整个缓存"""
+        self.backend.delete(self.name, key)
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        size = self.backend.size(self.name)
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.backend.name,
+                'size': size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'discarded': self.discarded,
+            }
@@ -0,0 +1,77 @@
+"""变更日志读取
+
+change_log 表由触发器写入（见 migrations.CHANGE_LOG_TABLES），每次插入、更新、删除记录一行，
+seq 单调递增。同步令牌就是客户端已经处理到的 seq：
+  - 不带令牌请求时只返回当前令牌，客户端随后全量加载一次列表，之后用令牌增量同步；
+  - 令牌早于已清理的日志（或大于当前最大 seq，例如数据库被重建）时返回 410，客户端需要全量重新加载。
+"""
+import time
+
+from sqlalchemy import text
+
+
+class TokenExpired(Exception):
+    """同步令牌对应的日志已被清理，或令牌不属于当前数据库"""
+
+
+def current_seq(session):
+    """已分配的最大 seq（来自 sqlite_sequence，日志被清空后仍然保留）"""
+    return session.execute(text(
+        "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'change_log'"
+    )).scalar()
+
+
+def pruned_seq(session):
+    return session.execute(text("SELECT value FROM sync_state WHERE name = 'pruned_seq'")).scalar() or 0
+
+
+def parse_token(token):
+    try:
+        seq = int(token)
+    except (TypeError, ValueError):
+        raise ValueError('无效的同步令牌')
+    if seq < 0:
+        raise ValueError('无效的同步令牌')
+    return seq
+
+
+def read_changes(session, since, limit):
+    """读取 seq > since 的最多 limit 条日志
+
+    同一行在这段日志中的多次变更只保留最后一次。
+    返回 ({表名: {'upsert': [id, ...], 'delete': [id, ...]}}, 下一个令牌, 是否还有更多)
+    """
+    if since < pruned_seq(session) or since > current_seq(session):
+        raise TokenExpired()
+
+    rows = session.execute(text(
+        'SELECT seq, "table", "rowId", op FROM change_log WHERE seq > :since ORDER BY seq LIMIT :limit'
+    ), {'since': since, 'limit': limit + 1}).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for _, table, row_id, op in rows:
+        latest.pop((table, row_id), None)
+        latest[(table, row_id)] = op
+    changes = {}
+    for (table, row_id), op in latest.items():
+        changes.setdefault(table, {'upsert': [], 'delete': []})[op].append(row_id)
+    next_seq = rows[-1][0] if rows else since
+    return changes, next_seq, has_more
+
+
+def prune(session, max_age_days):
+    """删除早于 max_age_days 天的日志，返回删除的条数"""
+    cutoff = time.time() - max_age_days * 86400
+    last = session.execute(
+        text('SELECT MAX(seq) FROM change_log WHERE "changedAt" < :cutoff'), {'cutoff': cutoff}
+    ).scalar()
+    if last is None:
+        return 0
+    deleted = session.execute(text('DELETE FROM change_log WHERE seq <= :seq'), {'seq': last}).rowcount
+    session.execute(text(
+        "UPDATE sync_state SET value = MAX(value, :seq) WHERE name = 'pruned_seq'"
+    ), {'seq': last})
+    session.commit()
+    return deleted
@@ -0,0 +1,158 @@
+"""实时变更推送（SSE）
+
+写入接口提交后发布变更事件 {"table": ..., "id": ..., "op": "upsert" | "delete"}，
+/api/events 的每个连接是一个订阅者，持有一个有界队列：
+  - 发布者从不阻塞，某个连接的队列满了（客户端读得太慢）就丢弃它的后续事件，
+    并在它下次读取时发送一条 resync 事件，客户端收到后重新加载全部数据；
+  - 连接数超过上限时拒绝新连接。
+
+两种后端（EVENT_BACKEND）：
+  local     进程内发布，由会话提交事件直接触发，只适用于单进程部署
+  changelog 后台线程轮询 change_log 表（见 migrations.CHANGE_LOG_TABLES）再在进程内分发，
+            多个 worker 进程共享同一个 SQLite 数据库时，任何进程的写入（包括批量 SQL）都能推送到所有连接
+EVENT_BACKEND=off 时不提供 /api/events，页面不建立连接。每个 SSE 连接在整个会话期间占用一个请求线程，
+使用同步 worker（例如 gunicorn 默认的 sync worker）部署时每个打开的标签页都会占住一个 worker，应关闭推送
+或改用 gthread/gevent 等能同时保持多个连接的 worker。
+
+local 后端的事件带有写入请求的 X-Client-Id（client 字段），订阅时带上 clientId 的连接收不到自己写入的事件；
+changelog 后端的事件由触发器记录，不知道来源，客户端会收到自己写入的事件（重新加载时列表通常得到 304）。
+"""
+import logging
+import queue
+import threading
+
+from sqlalchemy import text
+
+
+logger = logging.getLogger(__name__)
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    def get(self, timeout):
+        """取下一条事件，超时返回 None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def reset(self):
+        """丢弃积压的事件（客户端会整体重新加载）"""
+        self.overflowed = False
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+class LocalBroker:
+    def __init__(self, queue_size=100, max_subscribers=1000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.overflows = 0
+
+    def subscribe(self):
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers()
+            subscription = Subscription(self.queue_size)
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for subscription in subscribers:
+            if subscription.overflowed:
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                subscription.overflowed = True
+                with self._lock:
+                    self.overflows += 1
+
+    def notify(self, events):
+        """写入接口提交后调用"""
+        for event in events:
+            self.publish(event)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'local',
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'overflows': self.overflows,
+            }
+
+
+class ChangeLogBroker(LocalBroker):
+    """从 change_log 表读取变更再在进程内分发，轮询线程在第一个订阅者连接时启动"""
+
+    def __init__(self, engine, interval=0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.engine = engine
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_seq = None
+
+    def notify(self, events):
+        # 变更由轮询线程从 change_log 读取，这里不重复发布
+        pass
+
+    def subscribe(self):
+        subscription = super().subscribe()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll, name='change-log-poller', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def _poll(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception:
+                # 数据库暂时不可用（例如被锁）时下一轮重试
+                logger.warning('读取变更日志失败', exc_info=True)
+            self._stop.wait(self.interval)
+
+    def poll_once(self):
+        with self.engine.connect() as conn:
+            if self.last_seq is None:
+                self.last_seq = conn.execute(text(
+                    "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'change_log'"
+                )).scalar()
+                return
+            rows = conn.execute(text(
+                'SELECT seq, "table", "rowId", op FROM change_log WHERE seq > :seq ORDER BY seq LIMIT 1000'
+            ), {'seq': self.last_seq}).all()
+        for seq, table, row_id, op in rows:
+            self.publish({'table': table, 'id': row_id, 'op': op, 'seq': seq})
+            self.last_seq = seq
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(backend='changelog', lastSeq=self.last_seq)
+        return stats
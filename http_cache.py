@@ -0,0 +1,130 @@
+"""HTTP 条件请求和静态文件缓存
+
+接口的 ETag 由它依赖的数据表的版本号生成（版本号由触发器维护，见 migrations.VERSIONED_TABLES），
+客户端带着 If-None-Match 重新请求时，只需查询一次很小的 table_version 表：
+版本号没有变化就直接返回 304，不执行主查询，也不做序列化。
+
+静态文件 URL 附带内容哈希（?v=...），文件内容变化时 URL 随之变化，因此带哈希的请求可以永久缓存。
+"""
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, request
+
+# 带内容哈希的静态文件缓存一年
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+
+class ConditionalGet:
+    """路由装饰器：@conditional('note', 'folder')
+
+    load_versions 返回 {表名: (version, changedAt)}；返回 None 时不做条件请求处理。
+    salt 用于区分不同版本的代码，避免升级后客户端用旧 ETag 拿到旧格式的缓存。
+
+    响应还取决于表以外的输入时（例如默认日期范围相对于今天），用 vary 传入一个函数，
+    它的返回值计入 ETag。这类接口不发送 Last-Modified，也不处理 If-Modified-Since：
+    表的修改时间不能反映这些输入的变化。
+    """
+
+    def __init__(self, load_versions, salt=''):
+        self.load_versions = load_versions
+        self.salt = salt
+        self._lock = threading.Lock()
+        self._counters = {}  # {endpoint: [请求数, 304 数]}
+
+    def __call__(self, *tables, vary=None):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                versions = self.load_versions()
+                if versions is None:
+                    return view(*args, **kwargs)
+
+                etag, last_modified = self.validators(versions, tables, vary() if vary else None)
+                if request.if_none_match:
+                    # 同时带有 If-None-Match 时忽略 If-Modified-Since（RFC 9110）
+                    not_modified = request.if_none_match.contains_weak(etag)
+                elif vary:
+                    not_modified = False
+                else:
+                    since = request.if_modified_since
+                    not_modified = since is not None and last_modified <= since
+                self._count(request.endpoint, not_modified)
+
+                if not_modified:
+                    response = current_app.response_class(status=304)
+                else:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                response.set_etag(etag, weak=True)
+                if not vary:
+                    response.last_modified = last_modified
+                # 允许浏览器缓存，但每次使用前都要带 ETag 验证
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+                return response
+            return wrapper
+        return decorator
+
+    def validators(self, versions, tables, extra=None):
+        """返回 (ETag, Last-Modified)，ETag 同时包含请求路径和参数"""
+        parts = [self.salt, request.full_path]
+        parts += [f'{table}:{versions.get(table, (0, 0))[0]}' for table in tables]
+        if extra is not None:
+            parts.append(repr(extra))
+        etag = hashlib.sha1('|'.join(parts).encode()).hexdigest()[:20]
+        changed_at = max(versions.get(table, (0, 0))[1] for table in tables)
+        # HTTP 日期只精确到秒
+        last_modified = datetime.fromtimestamp(int(changed_at), timezone.utc)
+        return etag, last_modified
+
+    def _count(self, endpoint, not_modified):
+        with self._lock:
+            counter = self._counters.setdefault(endpoint, [0, 0])
+            counter[0] += 1
+            counter[1] += not_modified
+
+    def stats(self):
+        with self._lock:
+            counters = {endpoint: list(counter) for endpoint, counter in self._counters.items()}
+        total = sum(counter[0] for counter in counters.values())
+        not_modified = sum(counter[1] for counter in counters.values())
+
+        def rate(requests, hits):
+            return round(hits / requests, 4) if requests else 0.0
+
+        return {
+            'requests': total,
+            'notModified': not_modified,
+            'notModifiedRate': rate(total, not_modified),
+            'endpoints': {
+                endpoint: {'requests': requests, 'notModified': hits, 'notModifiedRate': rate(requests, hits)}
+                for endpoint, (requests, hits) in sorted(counters.items())
+            },
+        }
+
+
+class StaticHasher:
+    """计算静态文件的内容哈希，按修改时间缓存结果"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._cache = {}
+
+    def __call__(self, filename):
+        path = os.path.join(self.folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._cache.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.md5(f.read()).hexdigest()[:12]
+        self._cache[filename] = (mtime, digest)
+        return digest
@@ -0,0 +1,308 @@
+"""后台任务队列
+
+AI 调用、API 密钥校验等耗时操作可以写入 job 表后立即返回任务 id，由 worker 领取执行，
+客户端通过 /api/jobs/<id> 查询状态和结果。队列就是应用数据库中的一张表，不依赖外部消息服务：
+
+  - worker 可以是 web 进程内的线程（JOB_WORKERS），也可以是单独的进程（flask run-worker），
+    多个进程同时领取也不会重复执行；
+  - 领取：一条 UPDATE ... RETURNING 语句按 priority 从高到低、runAt 从早到晚选出一个任务并标记为
+    running，SQLite 在语句开始时取得写锁，同一个任务不会被两个 worker 领取；
+  - 并发限制：每种任务可以限制同时运行的个数（所有 worker 合计），达到上限的种类在领取时跳过；
+  - 重试：暂时性错误（上游超时、限流、5xx 等）按指数退避重新排队，达到 maxAttempts 次后标记为 failed；
+  - 租约：领取时设置 lockedUntil，worker 进程退出后任务在租约到期后重新排队（计入尝试次数）。
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, Integer, bindparam, case, func, select, text
+from sqlalchemy.exc import OperationalError
+
+import metrics
+from ai_client import AIError
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+# 这些错误视为暂时性的，可以重试（无效密钥、请求格式错误等重试也不会成功）：
+# 收到上游响应时按上游状态码判断，否则按本地的状态码判断（连接失败 502、等待并发槽位超时 503、上游超时 504）
+RETRYABLE_UPSTREAM_STATUSES = (408, 429, 500, 502, 503, 504)
+RETRYABLE_AI_STATUSES = (502, 503, 504)
+
+JOB_DURATION = metrics.Histogram('job_duration_seconds', '后台任务每次执行的耗时', ['kind', 'outcome'])
+JOB_WAIT = metrics.Histogram('job_queue_wait_seconds', '任务从可以执行到被领取的等待时间', ['kind'])
+
+
+class JobError(Exception):
+    """任务执行失败，retryable 为 True 时按退避重新排队"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def is_retryable(error):
+    if isinstance(error, JobError):
+        return error.retryable
+    if isinstance(error, AIError):
+        if error.upstream_status is not None:
+            return error.upstream_status in RETRYABLE_UPSTREAM_STATUSES
+        return error.status in RETRYABLE_AI_STATUSES
+    # 未预期的异常（例如数据库繁忙）按暂时性错误处理，总次数由 maxAttempts 限制
+    return True
+
+
+class JobKind:
+    def __init__(self, handler, priority, max_attempts, concurrency, sensitive):
+        self.handler = handler
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+        self.sensitive = sensitive
+
+
+class JobQueue:
+    def __init__(self, app, db, job_model, poll_interval=0.5, lease=300.0, backoff=2.0, max_backoff=300.0):
+        self.app = app
+        self.db = db
+        self.Job = job_model
+        self.table = job_model.__table__
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.kinds = {}
+        # 同一进程内写入任务后唤醒本进程的 worker 线程，其他进程的 worker 靠轮询发现
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._recovered_at = 0.0
+
+    def register(self, kind, priority=0, max_attempts=3, concurrency=None, sensitive=False):
+        """登记任务种类的处理函数：handler(payload) 返回可 JSON 序列化的结果
+
+        priority 越大越先执行；concurrency 为所有 worker 合计同时运行的上限（None 表示不限）；
+        sensitive 为 True 时任务结束后清空 payload（例如包含 API 密钥）。
+        """
+        def decorator(handler):
+            self.kinds[kind] = JobKind(handler, priority, max_attempts, concurrency, sensitive)
+            return handler
+        return decorator
+
+    def run_inline(self, kind, payload):
+        """在当前线程中直接执行（不经过队列，不重试）"""
+        return self.kinds[kind].handler(payload)
+
+    def enqueue(self, kind, payload, priority=None):
+        """写入一个任务并提交，返回任务对象"""
+        spec = self.kinds[kind]
+        job = self.Job(
+            kind=kind,
+            payload=json.dumps(payload, ensure_ascii=False),
+            priority=spec.priority if priority is None else priority,
+            maxAttempts=spec.max_attempts,
+            runAt=datetime.utcnow(),
+        )
+        self.db.session.add(job)
+        self.db.session.commit()
+        self._wakeup.set()
+        return job
+
+    def cancel(self, job):
+        """取消尚未开始执行的任务，返回是否取消成功（已被领取的任务不能取消）"""
+        values = {'status': CANCELLED, 'finishedAt': datetime.utcnow()}
+        if job.kind in self.kinds and self.kinds[job.kind].sensitive:
+            values['payload'] = '{}'
+        result = self.db.session.execute(self.table.update().where(
+            self.table.c.id == job.id, self.table.c.status == QUEUED
+        ).values(**values))
+        self.db.session.commit()
+        return result.rowcount == 1
+
+    def counts(self):
+        """未结束任务的数量：{状态: {种类: 数量}}"""
+        rows = self.db.session.execute(
+            select(self.table.c.status, self.table.c.kind, func.count())
+            .where(self.table.c.status.in_((QUEUED, RUNNING)))
+            .group_by(self.table.c.status, self.table.c.kind)
+        ).all()
+        counts = {QUEUED: {}, RUNNING: {}}
+        for status, kind, count in rows:
+            counts[status][kind] = count
+        return counts
+
+    def prune(self, days):
+        """删除 days 天之前结束的任务，返回删除条数"""
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        result = self.db.session.execute(self.table.delete().where(
+            self.table.c.status.in_(FINISHED_STATUSES), self.table.c.finishedAt < cutoff
+        ))
+        self.db.session.commit()
+        return result.rowcount
+
+    # 领取与执行
+
+    def _claim_statement(self):
+        # 已达到并发上限的种类在子查询中算出一次，再按索引顺序取第一个可执行的任务
+        limits = {kind: spec.concurrency for kind, spec in self.kinds.items() if spec.concurrency}
+        params = {}
+        saturated = ''
+        if limits:
+            cases = []
+            for index, (kind, limit) in enumerate(limits.items()):
+                params[f'limit_kind_{index}'], params[f'limit_{index}'] = kind, limit
+                cases.append(f'WHEN :limit_kind_{index} THEN :limit_{index}')
+            saturated = f'''
+                AND kind NOT IN (
+                    SELECT kind FROM {self.table.name} WHERE status = '{RUNNING}'
+                    GROUP BY kind HAVING COUNT(*) >= CASE kind {' '.join(cases)} ELSE -1 END
+                )'''
+        statement = text(f'''
+            UPDATE {self.table.name} SET status = '{RUNNING}', attempts = attempts + 1,
+                "startedAt" = :now, "lockedUntil" = :locked_until, "workerId" = :worker
+            WHERE id = (
+                SELECT id FROM {self.table.name}
+                WHERE status = '{QUEUED}' AND "runAt" <= :now AND kind IN :kinds {saturated}
+                ORDER BY priority DESC, "runAt", id
+                LIMIT 1
+            )
+            RETURNING id, kind, payload, attempts, "maxAttempts", "runAt"
+        ''').bindparams(
+            bindparam('kinds', expanding=True),
+            bindparam('now', type_=DateTime()),
+            bindparam('locked_until', type_=DateTime()),
+        ).columns(id=Integer(), attempts=Integer(), maxAttempts=Integer(), runAt=DateTime())
+        return statement, params
+
+    def _recover_expired(self, now):
+        """租约已到期仍处于 running 的任务（worker 进程退出或执行超时）重新排队或标记失败"""
+        exhausted = self.table.c.attempts >= self.table.c.maxAttempts
+        with self.db.engine.begin() as conn:
+            result = conn.execute(self.table.update().where(
+                self.table.c.status == RUNNING, self.table.c.lockedUntil < now
+            ).values(
+                status=case((exhausted, FAILED), else_=QUEUED),
+                finishedAt=case((exhausted, now), else_=None),
+                error='执行超时或 worker 已退出',
+                runAt=now, lockedUntil=None, workerId=None,
+            ))
+        if result.rowcount:
+            logger.warning('%d 个任务的租约已到期，已重新排队或标记失败', result.rowcount)
+
+    def claim(self, worker_id):
+        """领取一个可执行的任务，没有时返回 None"""
+        now = datetime.utcnow()
+        if time.monotonic() - self._recovered_at > self.lease / 10:
+            self._recovered_at = time.monotonic()
+            self._recover_expired(now)
+        kinds = list(self.kinds)
+        # 先用只读查询判断是否有任务，队列空闲时轮询不需要申请写锁
+        with self.db.engine.connect() as conn:
+            ready = conn.execute(select(self.table.c.id).where(
+                self.table.c.status == QUEUED, self.table.c.runAt <= now, self.table.c.kind.in_(kinds)
+            ).limit(1)).first()
+        if ready is None:
+            return None
+        statement, params = self._claim_statement()
+        with self.db.engine.begin() as conn:
+            return conn.execute(statement, dict(
+                params, now=now, locked_until=now + timedelta(seconds=self.lease), worker=worker_id, kinds=kinds
+            )).first()
+
+    def _finish(self, job, worker_id, **values):
+        # 只更新仍由本 worker 持有的任务：租约到期后任务可能已被重新领取
+        if self.kinds[job.kind].sensitive and values.get('status') in FINISHED_STATUSES:
+            values['payload'] = '{}'
+        with self.db.engine.begin() as conn:
+            conn.execute(self.table.update().where(
+                self.table.c.id == job.id, self.table.c.status == RUNNING, self.table.c.workerId == worker_id
+            ).values(lockedUntil=None, **values))
+
+    def execute(self, job, worker_id):
+        JOB_WAIT.observe(max(0.0, (datetime.utcnow() - job.runAt).total_seconds()), kind=job.kind)
+        started = time.perf_counter()
+        try:
+            result = self.kinds[job.kind].handler(json.loads(job.payload))
+        except Exception as e:
+            if not isinstance(e, (JobError, AIError)):
+                logger.exception('任务 %s (%s) 执行失败', job.id, job.kind)
+            retry = is_retryable(e) and job.attempts < job.maxAttempts
+            JOB_DURATION.observe(time.perf_counter() - started, kind=job.kind, outcome='retry' if retry else 'failed')
+            now = datetime.utcnow()
+            if retry:
+                # 指数退避并加入随机抖动，避免上游恢复时所有任务同时重试
+                delay = min(self.max_backoff, self.backoff * 2 ** (job.attempts - 1)) * random.uniform(0.8, 1.2)
+                self._finish(job, worker_id, status=QUEUED, error=str(e), runAt=now + timedelta(seconds=delay),
+                             workerId=None)
+            else:
+                self._finish(job, worker_id, status=FAILED, error=str(e), finishedAt=now)
+            return
+        JOB_DURATION.observe(time.perf_counter() - started, kind=job.kind, outcome='succeeded')
+        self._finish(job, worker_id, status=SUCCEEDED, result=json.dumps(result, ensure_ascii=False), error=None,
+                     finishedAt=datetime.utcnow())
+
+    # worker
+
+    def _loop(self, worker_id, stop, burst):
+        with self.app.app_context():
+            while not stop.is_set():
+                try:
+                    job = self.claim(worker_id)
+                except OperationalError:
+                    # 写锁等待超过 busy_timeout，下一轮再试
+                    logger.warning('领取任务失败', exc_info=True)
+                    job = None
+                if job is None:
+                    if burst:
+                        return
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                self.execute(job, worker_id)
+
+    def _spawn(self, concurrency, stop, burst):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        threads = [threading.Thread(
+            target=self._loop, args=(f'{worker_id}:{index}', stop, burst), name=f'job-worker-{index}', daemon=True
+        ) for index in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def start(self, concurrency):
+        """在当前进程中启动 concurrency 个后台 worker 线程（只启动一次）"""
+        with self._lock:
+            if self._threads or concurrency <= 0:
+                return
+            self._threads = self._spawn(concurrency, threading.Event(), burst=False)
+
+    def work(self, concurrency=1, burst=False):
+        """在前台运行 worker，阻塞直到 Ctrl-C（burst 为 True 时没有可执行的任务就退出）
+
+        收到 Ctrl-C 后不再领取新任务，正在执行的任务完成后退出。
+        """
+        stop = threading.Event()
+        threads = self._spawn(concurrency, stop, burst)
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            self._wakeup.set()
+            for thread in threads:
+                thread.join()
+
+    def stats(self):
+        return {'workers': len(self._threads), 'kinds': list(self.kinds), **self.counts()}
@@ -0,0 +1,222 @@
+"""性能指标
+
+进程内的计数器和直方图，按 Prometheus 文本格式在 /metrics 输出。指标对象在模块里全局登记
+（与 cache.registry 相同的方式），各模块直接创建自己的指标；其他模块已有的统计（缓存命中率等）
+通过 collector 在抓取时读取。
+
+instrument_engine() 通过 SQLAlchemy 游标事件统计每条 SQL 的耗时，并把超过阈值的慢查询写入日志；
+请求内的查询次数和耗时累加在 flask.g 上，由 app.py 的请求钩子读取。
+
+SamplingProfiler 在后台线程中定期采样所有线程的调用栈，输出折叠栈格式（可直接用 flamegraph.pl 绘图）。
+"""
+import logging
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+
+from flask import g, has_app_context
+from sqlalchemy import event
+
+slow_query_logger = logging.getLogger('notes.slow_query')
+
+# 名称 -> 指标对象
+registry = {}
+# 抓取时调用的函数，返回 [(名称, 类型, 说明, [(标签字典, 值), ...]), ...]
+collectors = []
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry[name] = self
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f'{self.name}{_format_labels(dict(zip(self.label_names, key)))} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # {标签值: [各桶计数, 总和, 次数]}
+        self._lock = threading.Lock()
+        registry[name] = self
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in values:
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_format_labels(dict(labels, le=_format_value(bound)))} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(dict(labels, le="+Inf"))} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return lines
+
+
+def render():
+    """按 Prometheus 文本格式输出全部指标"""
+    lines = []
+    for metric in list(registry.values()):
+        lines.extend(metric.render())
+    for collect in collectors:
+        for name, kind, description, samples in collect():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# SQL 查询
+db_query_duration = Histogram(
+    'db_query_duration_seconds', 'SQL 语句耗时', ['statement'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+db_slow_queries = Counter('db_slow_queries_total', '超过慢查询阈值的 SQL 语句数', ['statement'])
+
+
+def instrument_engine(engine, slow_query_ms):
+    """统计每条 SQL 的耗时；超过 slow_query_ms 毫秒的语句写入 notes.slow_query 日志（0 表示不记录）"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+        db_query_duration.observe(elapsed, statement=kind)
+        if has_app_context():
+            g.db_queries = g.get('db_queries', 0) + 1
+            g.db_time = g.get('db_time', 0.0) + elapsed
+        if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+            db_slow_queries.inc(statement=kind)
+            slow_query_logger.warning(
+                '慢查询 %.1f ms: %s 参数: %s', elapsed * 1000, ' '.join(statement.split()),
+                str(parameters)[:500] if not executemany else f'executemany x{len(parameters)}'
+            )
+
+    @event.listens_for(engine, 'handle_error')
+    def discard_query_timer(context):
+        # 执行失败时不会触发 after_cursor_execute，丢弃对应的开始时间
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+class SamplingProfiler:
+    """采样分析器：每隔 interval 秒记录一次所有线程的调用栈"""
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = StackCounter()
+        self.samples = 0
+        self.started_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return False
+            self.stacks = StackCounter()
+            self.samples = 0
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f'{code.co_filename.rsplit("/", 1)[-1]}:{code.co_name}')
+                    frame = frame.f_back
+                # 只统计正在执行业务代码的线程，跳过空闲等待的线程
+                if stack and stack[0].split(':', 1)[1] not in ('wait', 'select', 'accept', 'poll', '_wait_for_tstate_lock'):
+                    self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self, limit=None):
+        """折叠栈格式：每行 "帧1;帧2;... 次数"，按次数降序"""
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common(limit)) + '\n'
+
+    def status(self):
+        return {
+            'running': self.running,
+            'intervalMs': self.interval * 1000,
+            'samples': self.samples,
+            'stacks': len(self.stacks),
+            'startedAt': self.started_at,
+        }
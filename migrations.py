@@ -0,0 +1,239 @@
+"""数据库结构迁移
+
+db.create_all() 只会创建不存在的表，不会修改已有的表。已有数据库需要的结构变化（新增列、索引、
+数据回填）在这里按版本号顺序登记，启动时执行尚未执行过的迁移，已执行的版本记录在 schema_version 表中。
+
+每个迁移都必须可以在新建的数据库上重复执行（新数据库的表由 create_all 按最新模型创建），
+因此新增列要先检查列是否存在，索引使用 IF NOT EXISTS。
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+
+def add_column(conn, table, column, ddl):
+    """列不存在时执行 ALTER TABLE ... ADD COLUMN，返回是否新增"""
+    columns = {info['name'] for info in inspect(conn).get_columns(table)}
+    if column in columns:
+        return False
+    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN "{column}" {ddl}'))
+    return True
+
+
+@migration(1, '项目任务计数列')
+def add_project_task_counters(conn):
+    add_column(conn, 'project', 'taskCount', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(conn, 'project', 'completedTasks', 'INTEGER NOT NULL DEFAULT 0')
+    conn.execute(text('''
+        UPDATE project SET
+            "taskCount" = (SELECT COUNT(*) FROM project_task WHERE "projectId" = project.id),
+            "completedTasks" = (SELECT COUNT(*) FROM project_task WHERE "projectId" = project.id AND status = 'done')
+    '''))
+    conn.execute(text('''
+        UPDATE project SET progress = "completedTasks" * 100 / "taskCount" WHERE "taskCount" > 0
+    '''))
+
+
+@migration(2, '笔记自动打标签时间')
+def add_note_tagged_at(conn):
+    add_column(conn, 'note', 'taggedAt', 'DATETIME')
+
+
+@migration(3, '笔记版本号')
+def add_note_version(conn):
+    add_column(conn, 'note', 'version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+# 与模型 __table_args__ 中声明的索引保持一致
+LIST_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_note_updated ON note ("updatedAt", id)',
+    'CREATE INDEX IF NOT EXISTS ix_note_folder_updated ON note ("folderId", "updatedAt", id)',
+    'CREATE INDEX IF NOT EXISTS ix_note_tag ON note (tag)',
+    'CREATE INDEX IF NOT EXISTS ix_todo_created ON todo ("createdAt", id)',
+    'CREATE INDEX IF NOT EXISTS ix_project_updated ON project ("updatedAt", id)',
+    'CREATE INDEX IF NOT EXISTS ix_project_status_updated ON project (status, "updatedAt", id)',
+    'CREATE INDEX IF NOT EXISTS ix_project_priority_updated ON project (priority, "updatedAt", id)',
+    'CREATE INDEX IF NOT EXISTS ix_project_task_project_created ON project_task ("projectId", "createdAt", id)',
+    'CREATE INDEX IF NOT EXISTS ix_project_task_project_status_created '
+    'ON project_task ("projectId", status, "createdAt", id)',
+    'CREATE INDEX IF NOT EXISTS ix_project_note_project_note ON project_note ("projectId", "noteId")',
+    'CREATE INDEX IF NOT EXISTS ix_project_note_note ON project_note ("noteId")',
+]
+
+
+@migration(4, '列表查询的组合索引')
+def add_list_indexes(conn):
+    for ddl in LIST_INDEXES:
+        conn.execute(text(ddl))
+
+
+# 每张表一个版本号，任何写入（包括批量 SQL）都由触发器递增，用于生成 HTTP ETag
+VERSIONED_TABLES = ['folder', 'note', 'todo', 'project', 'project_task', 'project_note']
+
+# SQLite 3.42 之前没有 unixepoch('subsec')，用 julianday 换算为 Unix 时间戳
+NOW_EPOCH = "(julianday('now') - 2440587.5) * 86400.0"
+
+
+@migration(5, '数据表版本号')
+def add_table_versions(conn):
+    # 触发器语法只适用于 SQLite，其他数据库不启用条件请求
+    if conn.dialect.name != 'sqlite':
+        return
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS table_version '
+        '(name VARCHAR(50) PRIMARY KEY, version INTEGER NOT NULL, "changedAt" REAL NOT NULL)'
+    ))
+    for table in VERSIONED_TABLES:
+        add_version_triggers(conn, table)
+
+
+def add_version_triggers(conn, table):
+    """登记 table 的版本号，并创建在增删改后递增版本号的触发器"""
+    conn.execute(text(
+        f'INSERT OR IGNORE INTO table_version (name, version, "changedAt") VALUES (:name, 1, {NOW_EPOCH})'
+    ), {'name': table})
+    for suffix, operation in (('ai', 'INSERT'), ('au', 'UPDATE'), ('ad', 'DELETE')):
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_{suffix} AFTER {operation} ON {table} BEGIN
+                UPDATE table_version SET version = version + 1, "changedAt" = {NOW_EPOCH}
+                WHERE name = '{table}';
+            END
+        """))
+
+
+# 变更日志：同步接口按 seq 增量读取，删除操作同样记录一条（墓碑）
+CHANGE_LOG_TABLES = ['note', 'todo', 'project', 'project_task']
+
+
+@migration(6, '变更日志')
+def add_change_log(conn):
+    if conn.dialect.name != 'sqlite':
+        return
+    # AUTOINCREMENT 保证 seq 单调递增且不复用，删除旧记录后同步令牌仍然有效
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS change_log ('
+        'seq INTEGER PRIMARY KEY AUTOINCREMENT, "table" VARCHAR(50) NOT NULL, '
+        '"rowId" INTEGER NOT NULL, op VARCHAR(10) NOT NULL, "changedAt" REAL NOT NULL)'
+    ))
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS sync_state (name VARCHAR(50) PRIMARY KEY, value INTEGER NOT NULL)'
+    ))
+    conn.execute(text("INSERT OR IGNORE INTO sync_state (name, value) VALUES ('pruned_seq', 0)"))
+    for table in CHANGE_LOG_TABLES:
+        for suffix, operation, op, row in (('ai', 'INSERT', 'upsert', 'NEW'),
+                                           ('au', 'UPDATE', 'upsert', 'NEW'),
+                                           ('ad', 'DELETE', 'delete', 'OLD')):
+            conn.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_change_{suffix} AFTER {operation} ON {table} BEGIN
+                    INSERT INTO change_log ("table", "rowId", op, "changedAt")
+                    VALUES ('{table}', {row}.id, '{op}', {NOW_EPOCH});
+                END
+            """))
+
+
+TODO_FILTER_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_todo_type_created ON todo (type, "createdAt", id)',
+    'CREATE INDEX IF NOT EXISTS ix_todo_type_completed_created ON todo (type, completed, "createdAt", id)',
+    'CREATE INDEX IF NOT EXISTS ix_todo_priority_created ON todo (priority, "createdAt", id)',
+]
+
+
+@migration(7, '待办筛选索引')
+def add_todo_filter_indexes(conn):
+    # 早期数据的类型和完成状态可能为空（前端按 todo、未完成处理），补齐后筛选条件才能直接使用索引
+    conn.execute(text("UPDATE todo SET type = 'todo' WHERE type IS NULL OR type = ''"))
+    conn.execute(text('UPDATE todo SET completed = 0 WHERE completed IS NULL'))
+    for ddl in TODO_FILTER_INDEXES:
+        conn.execute(text(ddl))
+
+
+@migration(8, '番茄钟记录版本号')
+def add_pomodoro_versions(conn):
+    # 表由 create_all 创建，这里只补上条件请求需要的版本号触发器
+    if conn.dialect.name != 'sqlite':
+        return
+    for table in ('pomodoro_session', 'pomodoro_daily'):
+        add_version_triggers(conn, table)
+
+
+@migration(9, '笔记历史版本号')
+def add_note_revision_versions(conn):
+    if conn.dialect.name != 'sqlite':
+        return
+    add_version_triggers(conn, 'note_revision')
+
+
+@migration(10, '后台任务版本号')
+def add_job_versions(conn):
+    if conn.dialect.name != 'sqlite':
+        return
+    add_version_triggers(conn, 'job')
+
+
+# 与 Todo.__table_args__ 保持一致。按优先级排序时的排序值（high > medium > low，未知值排在最后）：
+# 排序表达式与索引表达式的写法必须一致，SQLite 才会使用表达式索引，因此 app.py 的排序也使用这段 SQL
+TODO_PRIORITY_RANK_SQL = "CASE priority WHEN 'high' THEN 3 WHEN 'medium' THEN 2 WHEN 'low' THEN 1 ELSE 0 END"
+TODO_SORT_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_todo_completed_created ON todo (completed, "createdAt", id)',
+    'CREATE INDEX IF NOT EXISTS ix_todo_updated ON todo ("updatedAt", id)',
+    'CREATE INDEX IF NOT EXISTS ix_todo_type_updated ON todo (type, "updatedAt", id)',
+    f'CREATE INDEX IF NOT EXISTS ix_todo_priority_rank ON todo ({TODO_PRIORITY_RANK_SQL}, id)',
+    f'CREATE INDEX IF NOT EXISTS ix_todo_type_priority_rank ON todo (type, {TODO_PRIORITY_RANK_SQL}, id)',
+]
+
+
+@migration(11, '待办排序索引')
+def add_todo_sort_indexes(conn):
+    for ddl in TODO_SORT_INDEXES:
+        conn.execute(text(ddl))
+
+
+@migration(12, '笔记标签版本号')
+def add_note_tag_version(conn):
+    # 标签列表只随笔记的增删和标签修改变化，单独一个版本号，编辑正文（最频繁的写入）不会让标签的 ETag 和缓存失效
+    if conn.dialect.name != 'sqlite':
+        return
+    conn.execute(text(
+        f"INSERT OR IGNORE INTO table_version (name, version, \"changedAt\") VALUES ('note_tag', 1, {NOW_EPOCH})"
+    ))
+    for suffix, operation in (('ai', 'INSERT'), ('au', 'UPDATE OF tag'), ('ad', 'DELETE')):
+        condition = 'WHEN old.tag IS NOT new.tag' if suffix == 'au' else ''
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS note_tag_version_{suffix} AFTER {operation} ON note {condition} BEGIN
+                UPDATE table_version SET version = version + 1, "changedAt" = {NOW_EPOCH}
+                WHERE name = 'note_tag';
+            END
+        """))
+
+
+def run_migrations(engine):
+    """执行尚未执行的迁移，返回本次执行的版本号列表"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_version '
+            '(version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at DATETIME)'
+        ))
+        applied = {row[0] for row in conn.execute(text('SELECT version FROM schema_version'))}
+
+    executed = []
+    for version, description, func in sorted(MIGRATIONS, key=lambda item: item[0]):
+        if version in applied:
+            continue
+        # 每个迁移单独一个事务，失败时不会留下只执行了一半的版本
+        with engine.begin() as conn:
+            func(conn)
+            conn.execute(
+                text('INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)'),
+                {'v': version, 'd': description, 't': datetime.utcnow()}
+            )
+        executed.append(version)
+    return executed
@@ -0,0 +1,50 @@
+"""番茄钟统计
+
+番茄钟记录（pomodoro_session）只追加，每条记录保存用户本地日期 day 和专注秒数 duration；
+写入和删除记录时在同一事务中增量更新按 (day, todoId) 汇总的 pomodoro_daily 表。
+统计接口只读取汇总表：一年的历史图表最多几百行，不需要扫描全部记录。
+
+这里是与数据库无关的日期计算，汇总表的读写在 app.py 中。
+"""
+from datetime import timedelta
+
+
+def local_day(moment, offset_minutes):
+    """把 UTC 时间换算为用户本地日期
+
+    offset_minutes 与 JavaScript 的 Date.getTimezoneOffset() 一致：UTC 减本地时间的分钟数（东八区为 -480）。
+    """
+    return (moment - timedelta(minutes=offset_minutes or 0)).date()
+
+
+def week_start(day):
+    """day 所在周的周一"""
+    return day - timedelta(days=day.weekday())
+
+
+def group_by_week(daily):
+    """[(day, sessions, seconds), ...] 按周合并，返回 [(周一, sessions, seconds), ...]，按日期升序"""
+    weeks = {}
+    for day, sessions, seconds in daily:
+        entry = weeks.setdefault(week_start(day), [0, 0])
+        entry[0] += sessions
+        entry[1] += seconds
+    return [(week, sessions, seconds) for week, (sessions, seconds) in sorted(weeks.items())]
+
+
+def streaks(days, today):
+    """根据有专注记录的日期计算 (当前连续天数, 最长连续天数)
+
+    days 为升序且不重复的日期列表，晚于 today 的日期（客户端时钟偏差）忽略。
+    今天还没有记录时，截至昨天的连续天数仍然算作当前连续。
+    """
+    longest = run = 0
+    previous = None
+    for day in days:
+        if day > today:
+            break
+        run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    current = run if previous is not None and previous >= today - timedelta(days=1) else 0
+    return current, longest
@@ -0,0 +1,151 @@
+"""笔记历史版本的存储格式
+
+自动保存每两秒一次，不能每次保存都存一份全文：
+  - 合并：同一个时间窗口内（默认 5 分钟）、正文长度变化不大的连续保存合并为一个版本，
+    只更新最新版本，版本数量取决于编辑的时长而不是保存次数；
+  - 增量：版本按 seq 组成链，每隔 KEYFRAME_INTERVAL 个版本存一个完整的关键帧，
+    其余版本只存相对上一个版本的行级差异，均用 zlib 压缩；
+  - 还原：从所属关键帧开始依次应用差异，最多 KEYFRAME_INTERVAL - 1 次；
+  - 整理：较早的版本按时间分层抽稀（见 retained_seqs），再重新编码整条链。
+
+这里是与数据库无关的编码和选择逻辑，版本表的读写在 app.py 中。
+"""
+import json
+import zlib
+from datetime import timedelta
+
+KEYFRAME = 'key'
+DELTA = 'delta'
+
+# 每隔多少个版本存一个关键帧，决定还原一个版本最多需要应用的差异数
+KEYFRAME_INTERVAL = 20
+# 差异压缩后超过关键帧大小的这个比例时直接存关键帧（大段改写时差异没有意义）
+KEYFRAME_RATIO = 0.5
+
+
+def _compress(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode(), 6)
+
+
+def _decompress(data):
+    return json.loads(zlib.decompress(data))
+
+
+def encode_keyframe(content):
+    return zlib.compress((content or '').encode(), 6)
+
+
+def decode_keyframe(data):
+    return zlib.decompress(data).decode()
+
+
+def encode_delta(base, target):
+    """base -> target 的行级差异：[[起始行, 行数] 表示复制 base 中的行, "文本" 表示插入的内容, ...]
+
+    只去掉两端相同的行，中间部分整体作为插入内容。记录版本时持有写锁，不能用最坏情况为平方复杂度的
+    通用 diff（大段重复的行会让 SequenceMatcher 耗时数秒）；两次保存之间通常只有一处连续的修改，
+    修改分散、差异较大时由 encode 改存关键帧。
+    """
+    base_lines = (base or '').splitlines(keepends=True)
+    target_lines = (target or '').splitlines(keepends=True)
+    limit = min(len(base_lines), len(target_lines))
+    prefix = 0
+    while prefix < limit and base_lines[prefix] == target_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and base_lines[-1 - suffix] == target_lines[-1 - suffix]:
+        suffix += 1
+    ops = []
+    if prefix:
+        ops.append([0, prefix])
+    if len(target_lines) - suffix > prefix:
+        ops.append(''.join(target_lines[prefix:len(target_lines) - suffix]))
+    if suffix:
+        ops.append([len(base_lines) - suffix, suffix])
+    return _compress(ops)
+
+
+def apply_delta(base, data):
+    base_lines = (base or '').splitlines(keepends=True)
+    parts = []
+    for op in _decompress(data):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            start, count = op
+            parts.extend(base_lines[start:start + count])
+    return ''.join(parts)
+
+
+def encode(base, target, seq, keyframe_seq):
+    """编码版本 seq（上一个版本内容为 base，所属关键帧为 keyframe_seq），返回 (kind, data)
+
+    base 为 None（没有上一个版本）或距离关键帧已满 KEYFRAME_INTERVAL 时存关键帧。
+    """
+    if base is None or keyframe_seq is None or seq - keyframe_seq >= KEYFRAME_INTERVAL:
+        return KEYFRAME, encode_keyframe(target)
+    delta = encode_delta(base, target)
+    # 差异较小时不需要再压缩一次全文来比较
+    if len(delta) > 256:
+        keyframe = encode_keyframe(target)
+        if len(delta) > len(keyframe) * KEYFRAME_RATIO:
+            return KEYFRAME, keyframe
+    return DELTA, delta
+
+
+def reconstruct(chain):
+    """chain 为从关键帧开始、按 seq 升序的 [(kind, data), ...]，返回最后一个版本的内容"""
+    content = None
+    for kind, data in chain:
+        content = decode_keyframe(data) if kind == KEYFRAME else apply_delta(content, data)
+    return content
+
+
+def reconstruct_all(chain):
+    """依次还原整条链（可以包含多个关键帧），返回每个版本的内容"""
+    contents = []
+    content = None
+    for kind, data in chain:
+        content = decode_keyframe(data) if kind == KEYFRAME else apply_delta(content, data)
+        contents.append(content)
+    return contents
+
+
+def reencode(contents, seqs):
+    """把保留下来的版本重新编码为链，返回 [(kind, data, keyframe_seq), ...]"""
+    encoded = []
+    base = keyframe_index = keyframe_seq = None
+    for index, (seq, content) in enumerate(zip(seqs, contents)):
+        # 抽稀后 seq 不连续，关键帧间隔按保留下来的版本个数计算
+        kind, data = encode(base, content, index, keyframe_index)
+        if kind == KEYFRAME:
+            keyframe_index, keyframe_seq = index, seq
+        encoded.append((kind, data, keyframe_seq))
+        base = content
+    return encoded
+
+
+def retained_seqs(revisions, now, keep_all_days=7, daily_days=90):
+    """按时间分层选择要保留的版本：
+
+    - 最近 keep_all_days 天：全部保留；
+    - keep_all_days 到 daily_days 天：每天保留最后一个版本；
+    - 更早：每周保留最后一个版本。
+
+    revisions 为按 seq 升序的 [(seq, 时间), ...]，最新的版本总是保留。返回 seq 集合。
+    """
+    buckets = {}
+    for seq, moment in revisions:
+        age = now - moment
+        if age < timedelta(days=keep_all_days):
+            key = ('all', seq)
+        elif age < timedelta(days=daily_days):
+            key = ('day', moment.date())
+        else:
+            key = ('week', moment.isocalendar()[:2])
+        # 同一个桶里 seq 较大（较新）的覆盖较早的
+        buckets[key] = seq
+    kept = set(buckets.values())
+    if revisions:
+        kept.add(revisions[-1][0])
+    return kept
@@ -0,0 +1,88 @@
+"""JSON 序列化
+
+每个模型一个 ModelSerializer，各接口通过它输出同样的字段：
+列表接口直接查询需要的列（结果是元组，不构造 ORM 对象），单条记录从 ORM 对象读取字段。
+日期时间的格式化交给 JSON 编码器完成。安装了 orjson 时使用 orjson（原生支持 datetime/date），
+否则回退到标准库 json。
+"""
+import json
+from datetime import date, datetime
+
+from flask import Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+# 流式输出 JSON 数组时每次编码的行数
+STREAM_BATCH_SIZE = 500
+
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(obj):
+    """编码为紧凑的 UTF-8 JSON 字节串"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode()
+
+
+class JSONProvider(DefaultJSONProvider):
+    """让 jsonify 也使用 dumps 编码"""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode()
+
+    def response(self, *args, **kwargs):
+        if args and kwargs:
+            raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+        obj = args[0] if len(args) == 1 else (args or kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+
+def stream_array(items):
+    """把可迭代对象流式编码为 JSON 数组，每批 STREAM_BATCH_SIZE 项，不在内存中拼出完整响应"""
+    def generate():
+        yield b'['
+        separator = b''
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= STREAM_BATCH_SIZE:
+                yield separator + dumps(batch)[1:-1]
+                separator = b','
+                batch = []
+        if batch:
+            yield separator + dumps(batch)[1:-1]
+        yield b']'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+class ModelSerializer:
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = list(fields)
+
+    def query(self, fields=None, *extra):
+        """只查询 fields 对应的列；extra 为分页等需要但不输出的列，排在后面"""
+        fields = fields or self.fields
+        columns = [getattr(self.model, field) for field in fields]
+        columns += [column for column in extra if column.key not in fields]
+        return self.model.query.with_entities(*columns)
+
+    def rows(self, rows, fields=None):
+        """把 query() 的结果行转换为字典；传入列表时返回列表，否则返回惰性生成器"""
+        fields = fields or self.fields
+        items = (dict(zip(fields, row)) for row in rows)
+        return list(items) if isinstance(rows, list) else items
+
+    def dump(self, obj, fields=None):
+        return {field: getattr(obj, field) for field in fields or self.fields}
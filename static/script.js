@@ -4,6 +4,10 @@ let currentFolderId = null;
 let saveTimeout = null;
 let currentSearchQuery = null;
 let currentTagFilter = null;
+// 最近一次保存到服务器的笔记内容和版本号，用于增量保存
+let savedNote = null;
+// 当前标签页的标识：写入请求带上它，实时推送时服务器跳过本页自己的写入
+const CLIENT_ID = window.crypto && crypto.randomUUID ? crypto.randomUUID() : Math.random().toString(36).slice(2);
 
 
 // 初始化应用
@@ -16,6 +20,7 @@ document.addEventListener('DOMContentLoaded', async function() {
     initCalendar();
     initTodoCalendar();
     initResizeHandles();
+    connectLiveUpdates();
 });
 
 // 加载文件夹列表
@@ -70,7 +75,8 @@ async function loadTags() {
 async function loadNotes(folderId = null, searchQuery = null, tagFilter = null) {
     try {
         let url = '/api/notes';
-        const params = new URLSearchParams();
+        // 侧边栏只需要摘要字段，正文在打开笔记时再单独加载
+        const params = new URLSearchParams({ fields: 'id,title,tag,createdAt,updatedAt,folderId' });
         
         if (folderId) {
             params.append('folderId', folderId);
@@ -84,9 +90,7 @@ async function loadNotes(folderId = null, searchQuery = null, tagFilter = null)
             params.append('search', tagFilter);
         }
         
-        if (params.toString()) {
-            url += '?' + params.toString();
-        }
+        url += '?' + params.toString();
         
         const response = await fetch(url);
         const notes = await response.json();
@@ -153,6 +157,13 @@ async function loadNotes(folderId = null, searchQuery = null, tagFilter = null)
             
             // 组装结构
              noteDiv.appendChild(titleDiv);
+             // 搜索结果的摘要由后端转义过，只包含标记命中位置的 <mark>
+             if (note.snippet) {
+                 const snippetDiv = document.createElement('div');
+                 snippetDiv.className = 'note-snippet';
+                 snippetDiv.innerHTML = note.snippet;
+                 noteDiv.appendChild(snippetDiv);
+             }
              if (updatedTime) {
                  timeInfoDiv.appendChild(timeInfoDiv.querySelector('.note-updated'));
                  noteDiv.appendChild(timeInfoDiv);
@@ -200,12 +211,12 @@ function selectFolder(folderId) {
 // 选择笔记
 async function selectNote(noteId) {
     try {
-        const response = await fetch(`/api/notes?folderId=${currentFolderId || ''}`);
-        const notes = await response.json();
-        const note = notes.find(n => n.id === noteId);
+        const response = await fetch(`/api/notes/${noteId}`);
+        const note = response.ok ? await response.json() : null;
         
         if (note) {
             currentNoteId = noteId;
+            savedNote = { id: note.id, version: note.version, content: note.content || '' };
             
             // 更新UI
             document.querySelectorAll('.note-item').forEach(item => {
@@ -230,6 +241,7 @@ async function createNewNote() {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID,
             },
             body: JSON.stringify({
                 title: '新笔记',
@@ -255,7 +267,8 @@ async function deleteCurrentNote() {
     if (confirm('确定要删除这个笔记吗？')) {
         try {
             await fetch(`/api/notes/${currentNoteId}`, {
-                method: 'DELETE'
+                method: 'DELETE',
+                headers: { 'X-Client-Id': CLIENT_ID }
             });
             
             currentNoteId = null;
@@ -269,27 +282,100 @@ async function deleteCurrentNote() {
     }
 }
 
+// 计算新旧文本之间的差异：去掉公共前缀和后缀后剩下的一段替换，偏移量为 UTF-16 下标
+function computeTextPatch(oldText, newText) {
+    if (oldText === newText) return [];
+    
+    const isLowSurrogate = code => code >= 0xDC00 && code <= 0xDFFF;
+    const minLength = Math.min(oldText.length, newText.length);
+    let start = 0;
+    while (start < minLength && oldText.charCodeAt(start) === newText.charCodeAt(start)) {
+        start++;
+    }
+    let oldEnd = oldText.length;
+    let newEnd = newText.length;
+    while (oldEnd > start && newEnd > start && oldText.charCodeAt(oldEnd - 1) === newText.charCodeAt(newEnd - 1)) {
+        oldEnd--;
+        newEnd--;
+    }
+    // 不能把代理对（如 emoji）从中间拆开
+    if (start > 0 && isLowSurrogate(oldText.charCodeAt(start))) {
+        start--;
+    }
+    if (oldEnd < oldText.length && isLowSurrogate(oldText.charCodeAt(oldEnd))) {
+        oldEnd++;
+        newEnd++;
+    }
+    return [{ start, end: oldEnd, text: newText.slice(start, newEnd) }];
+}
+
 // 保存笔记
 async function saveNote() {
     if (!currentNoteId) return;
     
+    const noteId = currentNoteId;
     const title = document.getElementById('note-title').value;
     const tag = document.getElementById('note-tag').value || '默认';
     const content = document.getElementById('note-content').value;
     
     try {
-        await fetch(`/api/notes/${currentNoteId}`, {
-            method: 'PUT',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                title: title,
-                content: content,
-                tag: tag,
-                folderId: currentFolderId
-            })
-        });
+        let response = null;
+        
+        // 已知服务器上的版本时只上传差异
+        if (savedNote && savedNote.id === noteId) {
+            response = await fetch(`/api/notes/${noteId}`, {
+                method: 'PATCH',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-Client-Id': CLIENT_ID,
+                },
+                body: JSON.stringify({
+                    baseVersion: savedNote.version,
+                    ops: computeTextPatch(savedNote.content, content),
+                    title: title,
+                    tag: tag,
+                    folderId: currentFolderId
+                })
+            });
+        }
+        
+        // 版本冲突：由用户决定保留自己的修改还是加载最新内容，不直接覆盖其他客户端的保存
+        if (response && response.status === 409) {
+            response = await resolveSaveConflict(noteId, { title, tag, content });
+            if (!response) {
+                return;
+            }
+        }
+        
+        // 还没有基准版本时全量保存
+        if (!response) {
+            response = await fetch(`/api/notes/${noteId}`, {
+                method: 'PUT',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-Client-Id': CLIENT_ID,
+                },
+                body: JSON.stringify({
+                    title: title,
+                    content: content,
+                    tag: tag,
+                    folderId: currentFolderId
+                })
+            });
+        }
+        
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        
+        const result = await response.json();
+        savedNote = { id: noteId, version: result.version, content: content };
+        
+        // 内容没有变化时服务器不会写入，也不需要刷新列表
+        if (result.changed === false) {
+            document.getElementById('save-status').textContent = '已保存';
+            return;
+        }
         
         // 更新保存状态
         document.getElementById('save-status').textContent = '已保存';
@@ -315,6 +401,50 @@ async function saveNote() {
     }
 }
 
+// 保存时版本冲突：重新读取服务器上的笔记。与本地内容相同时直接采用服务器的版本号；
+// 否则询问用户，保留自己的修改时以最新版本为基准保存（期间再次被修改仍会冲突），
+// 放弃时把最新内容加载到编辑器。返回保存请求的响应，没有发出保存请求时返回 null
+async function resolveSaveConflict(noteId, local) {
+    const response = await fetch(`/api/notes/${noteId}`);
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+    const server = await response.json();
+    const serverContent = server.content || '';
+    
+    if (server.title === local.title && server.tag === local.tag && serverContent === local.content) {
+        savedNote = { id: noteId, version: server.version, content: serverContent };
+        document.getElementById('save-status').textContent = '已保存';
+        return null;
+    }
+    
+    if (confirm('这篇笔记已在其他地方被修改。\n确定：保留我的修改并覆盖最新内容\n取消：放弃我的修改，加载最新内容')) {
+        return fetch(`/api/notes/${noteId}`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID,
+            },
+            body: JSON.stringify({
+                baseVersion: server.version,
+                title: local.title,
+                content: local.content,
+                tag: local.tag,
+                folderId: currentFolderId
+            })
+        });
+    }
+    
+    savedNote = { id: noteId, version: server.version, content: serverContent };
+    if (currentNoteId === noteId) {
+        document.getElementById('note-title').value = server.title || '';
+        document.getElementById('note-tag').value = server.tag || '默认';
+        document.getElementById('note-content').value = serverContent;
+    }
+    document.getElementById('save-status').textContent = '已加载最新内容';
+    return null;
+}
+
 // 自动保存（防抖）
 function scheduleAutoSave() {
     if (saveTimeout) {
@@ -470,6 +600,38 @@ function setupTagClickListeners() {
     });
 }
 
+// 耗时的 AI 请求作为后台任务执行：?async=1 提交后立即返回任务，再轮询 /api/jobs/<id> 直到结束，
+// 请求不会长时间占用服务器的工作线程。返回 { ok, data }，data 与同步接口的返回相同
+async function runJob(url, body) {
+    const response = await fetch(url + '?async=1', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Client-Id': CLIENT_ID,
+        },
+        body: JSON.stringify(body)
+    });
+    let job = await response.json();
+    if (response.status !== 202) {
+        return { ok: response.ok, data: job };
+    }
+
+    let delay = 200;
+    while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, delay));
+        delay = Math.min(delay * 1.5, 2000);
+        const jobResponse = await fetch(`/api/jobs/${job.id}`);
+        job = await jobResponse.json();
+        if (!jobResponse.ok) {
+            return { ok: false, data: job };
+        }
+    }
+    if (job.status === 'succeeded') {
+        return { ok: true, data: job.result };
+    }
+    return { ok: false, data: { error: job.error || '任务已取消' } };
+}
+
 // AI功能实现
 async function generateAITitle() {
     const content = document.getElementById('note-content').value;
@@ -481,15 +643,7 @@ async function generateAITitle() {
     const originalTitle = document.getElementById('note-title').value || '无标题';
 
     try {
-        const response = await fetch('/api/ai/generate-title', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ content })
-        });
-
-        const data = await response.json();
+        const { data } = await runJob('/api/ai/generate-title', { content });
         if (data.title) {
             showTitleComparisonDialog(originalTitle, data.title);
         } else {
@@ -700,6 +854,9 @@ function closeTitleDialog() {
     }
 }
 
+// 正在进行的流式润色请求，关闭对话框时取消
+let polishAbortController = null;
+
 async function polishContentAI() {
     const content = document.getElementById('note-content').value;
     if (!content) {
@@ -707,23 +864,62 @@ async function polishContentAI() {
         return;
     }
 
+    polishAbortController = new AbortController();
     try {
-        const response = await fetch('/api/ai/polish-content', {
+        const response = await fetch('/api/ai/polish-content/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID,
             },
-            body: JSON.stringify({ content })
+            body: JSON.stringify({ content }),
+            signal: polishAbortController.signal
         });
 
-        const data = await response.json();
-        if (data.polished) {
-            showContentComparisonDialog(content, data.polished);
-        } else {
+        if (!response.ok) {
+            const data = await response.json();
             alert('润色内容失败：' + (data.error || '未知错误'));
+            return;
+        }
+
+        // 先打开对比对话框，润色内容随着服务端事件逐段追加
+        showContentComparisonDialog(content, '');
+        const preview = document.querySelector('#content-comparison-overlay .polished-content');
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let eventData = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) eventName = line.slice(7);
+                    else if (line.startsWith('data: ')) eventData += line.slice(6);
+                });
+
+                const payload = JSON.parse(eventData || '{}');
+                if (eventName === 'delta' && preview) {
+                    preview.textContent += payload.content;
+                } else if (eventName === 'error') {
+                    alert('润色内容失败：' + payload.error);
+                }
+            }
         }
     } catch (error) {
-        alert('AI服务连接失败：' + error.message);
+        if (error.name !== 'AbortError') {
+            alert('AI服务连接失败：' + error.message);
+        }
+    } finally {
+        polishAbortController = null;
     }
 }
 
@@ -769,7 +965,9 @@ function showContentComparisonDialog(originalContent, polishedContent) {
     });
     
     polishedBtn.addEventListener('click', () => {
-        selectContent('polished', originalContent, polishedContent);
+        // 润色内容可能是流式追加的，以点击时显示的内容为准
+        const polishedPreview = dialogContent.querySelector('.polished-content');
+        selectContent('polished', originalContent, polishedPreview.textContent);
     });
     
     cancelBtn.addEventListener('click', closeContentDialog);
@@ -795,6 +993,10 @@ function selectContent(selectedType, originalContent, polishedContent) {
 
 // 关闭内容对话框
 function closeContentDialog() {
+    // 润色尚未完成时中止请求，服务端随之断开上游连接
+    if (polishAbortController) {
+        polishAbortController.abort();
+    }
     const overlay = document.getElementById('content-comparison-overlay');
     if (overlay) {
         overlay.remove();
@@ -809,15 +1011,7 @@ async function generateAITags() {
     }
 
     try {
-        const response = await fetch('/api/ai/generate-tags', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ content })
-        });
-
-        const data = await response.json();
+        const { data } = await runJob('/api/ai/generate-tags', { content });
         if (data.tags && data.tags.length > 0) {
             showAISuggestion('生成的标签：' + data.tags.join(', '));
         } else {
@@ -884,17 +1078,9 @@ async function checkAPIConfig() {
         document.getElementById('api-form').style.display = 'none';
 
         try {
-            const response = await fetch('/api/config/api-key', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ api_key: apiKey })
-            });
-
-            const data = await response.json();
+            const { ok, data } = await runJob('/api/config/api-key', { api_key: apiKey });
             
-            if (response.ok) {
+            if (ok) {
                 alert('API密钥配置成功！AI功能已启用');
                 hideAPIConfigForm();
                 await checkAPIConfig();
@@ -946,17 +1132,9 @@ async function saveAPIKey() {
     document.getElementById('api-form').style.display = 'none';
 
     try {
-        const response = await fetch('/api/config/api-key', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ api_key: apiKey })
-        });
-
-        const data = await response.json();
+        const { ok, data } = await runJob('/api/config/api-key', { api_key: apiKey });
         
-        if (response.ok) {
+        if (ok) {
             alert('API密钥配置成功！AI功能已启用');
             hideAPIConfigForm();
             await checkAPIConfig();
@@ -1031,11 +1209,6 @@ const POMODORO_WORK_TIME = 25 * 60; // 25分钟工作时间
 const POMODORO_SHORT_BREAK_TIME = 5 * 60; // 5分钟短休息
 const POMODORO_LONG_BREAK_TIME = 15 * 60; // 15分钟长休息
 
-// 获取任务类型（直接使用后端返回的type字段）
-function getTaskType(task) {
-    return task.type || 'todo';
-}
-
 // 界面切换功能
 function switchToNotebook() {
     // 隐藏所有界面
@@ -1120,6 +1293,7 @@ function switchToPomodoro() {
     }
     
     initPomodoro();
+    loadPomodoroHistory();
     // 注意：add-task-btn的onclick事件在HTML中已定义，不需要重新绑定
 }
 
@@ -1157,6 +1331,7 @@ function startPomodoro() {
                 showPomodoroNotification('休息结束！开始新的工作周期');
             } else {
                 // 工作周期结束，开始休息
+                recordPomodoroSession(null, 25 * 60);
                 isBreakTime = true;
                 if (pomodoroSession % 4 === 0) {
                     pomodoroTimeLeft = 15 * 60; // 长休息15分钟
@@ -1276,15 +1451,11 @@ function showPomodoroNotification(message) {
 // 加载番茄钟任务列表（独立）
 async function loadPomodoroTasks() {
     try {
-        const response = await fetch('/api/todos');
-        const allTasks = await response.json();
-        
-        console.log('从API加载的所有任务用于番茄钟:', allTasks);
-        
-        // 根据任务类型过滤，只保留类型为'pomodoro'的未完成任务
-        pomodoroTasks = allTasks.filter(task => getTaskType(task) === 'pomodoro' && !task.completed);
+        // 只请求类型为'pomodoro'的未完成任务
+        const response = await fetch('/api/todos?type=pomodoro&completed=false');
+        pomodoroTasks = await response.json();
         
-        console.log('过滤后的番茄钟任务:', pomodoroTasks);
+        console.log('从API加载的番茄钟任务:', pomodoroTasks);
         renderPomodoroTaskList();
     } catch (error) {
         console.error('加载番茄钟任务失败:', error);
@@ -1294,15 +1465,11 @@ async function loadPomodoroTasks() {
 // 加载TODO列表
 async function loadTodos() {
     try {
-        const response = await fetch('/api/todos');
-        const allTasks = await response.json();
-        
-        console.log('从API加载的所有任务用于TODO:', allTasks);
-        
-        // 根据任务类型过滤
-        todos = allTasks.filter(task => getTaskType(task) === 'todo');
+        // 只请求类型为'todo'的任务
+        const response = await fetch('/api/todos?type=todo');
+        todos = await response.json();
         
-        console.log('过滤后的TODO任务:', todos);
+        console.log('从API加载的TODO任务:', todos);
         renderTodoList();
     } catch (error) {
         console.error('加载TODO失败:', error);
@@ -1463,7 +1630,8 @@ async function deletePomodoroTask(taskId) {
     if (confirm('确定要删除这个任务吗？')) {
         try {
             const response = await fetch(`/api/todos/${taskId}`, {
-                method: 'DELETE'
+                method: 'DELETE',
+                headers: { 'X-Client-Id': CLIENT_ID }
             });
             
             if (response.ok) {
@@ -1548,6 +1716,72 @@ function pauseTaskPomodoroTimer(taskId) {
     console.log(`暂停任务 ${taskId} 的番茄钟计时器`);
 }
 
+// 本地日期 YYYY-MM-DD（统计按用户本地日期汇总）
+function localDateString(date) {
+    const month = String(date.getMonth() + 1).padStart(2, '0');
+    const day = String(date.getDate()).padStart(2, '0');
+    return `${date.getFullYear()}-${month}-${day}`;
+}
+
+// 记录一个完成的工作周期，seconds 为专注时长
+async function recordPomodoroSession(todoId, seconds) {
+    const endedAt = new Date();
+    const startedAt = new Date(endedAt.getTime() - seconds * 1000);
+    try {
+        await fetch('/api/pomodoro/sessions', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'X-Client-Id': CLIENT_ID },
+            body: JSON.stringify({
+                todoId: todoId,
+                startedAt: startedAt.toISOString(),
+                endedAt: endedAt.toISOString(),
+                duration: seconds,
+                timezoneOffset: endedAt.getTimezoneOffset()
+            })
+        });
+        loadPomodoroHistory();
+    } catch (error) {
+        console.error('记录番茄钟失败:', error);
+    }
+}
+
+// 加载番茄钟历史：连续天数和最近两周每天的专注时长
+async function loadPomodoroHistory() {
+    const historyList = document.getElementById('history-list');
+    if (!historyList) return;
+    
+    const today = new Date();
+    const from = new Date(today.getFullYear(), today.getMonth(), today.getDate() - 13);
+    try {
+        const [streakResponse, statsResponse] = await Promise.all([
+            fetch(`/api/pomodoro/streak?today=${localDateString(today)}`),
+            fetch(`/api/pomodoro/stats?from=${localDateString(from)}&to=${localDateString(today)}`)
+        ]);
+        const streak = await streakResponse.json();
+        const stats = await statsResponse.json();
+        
+        const items = [{
+            time: `今天 ${streak.today.sessions} 个番茄钟`,
+            description: `连续专注 ${streak.current} 天，最长 ${streak.longest} 天`
+        }];
+        stats.items.slice().reverse().forEach(item => {
+            items.push({
+                time: item.day,
+                description: `${item.sessions} 个番茄钟，共 ${Math.round(item.seconds / 60)} 分钟`
+            });
+        });
+        
+        historyList.innerHTML = items.map(item => `
+            <div class="history-item">
+                <div class="history-time">${escapeHtml(item.time)}</div>
+                <div class="history-description">${escapeHtml(item.description)}</div>
+            </div>
+        `).join('');
+    } catch (error) {
+        console.error('加载番茄钟历史失败:', error);
+    }
+}
+
 // 完成任务的一个番茄钟周期
 function completeTaskPomodoroSession(taskId) {
     const timer = taskPomodoroTimers[taskId];
@@ -1568,6 +1802,7 @@ function completeTaskPomodoroSession(taskId) {
         alert('休息结束！准备开始新的工作周期');
     } else {
         // 工作结束，开始休息
+        recordPomodoroSession(taskId, POMODORO_WORK_TIME);
         timer.sessionCount++;
         timer.isBreakTime = true;
         
@@ -1767,6 +2002,7 @@ function completeMainPomodoroSession(taskId) {
         alert('休息结束！准备开始新的工作周期');
     } else {
         // 工作结束，开始休息
+        recordPomodoroSession(taskId, POMODORO_WORK_TIME);
         timer.sessionCount++;
         timer.isBreakTime = true;
         
@@ -1885,7 +2121,8 @@ async function createNewTodo() {
         const response = await fetch('/api/todos', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID
             },
             body: JSON.stringify({
                 title: '新任务',
@@ -1930,7 +2167,8 @@ async function saveNewTask() {
         const response = await fetch('/api/todos', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID
             },
             body: JSON.stringify({
                 title: taskInput.value.trim(),
@@ -1990,7 +2228,8 @@ async function saveTodo() {
         const response = await fetch(`/api/todos/${currentTodoId}`, {
             method: 'PUT',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID
             },
             body: JSON.stringify({
                 title,
@@ -2020,7 +2259,8 @@ async function deleteCurrentTodo() {
     if (confirm('确定要删除这个任务吗？')) {
         try {
             const response = await fetch(`/api/todos/${currentTodoId}`, {
-                method: 'DELETE'
+                method: 'DELETE',
+                headers: { 'X-Client-Id': CLIENT_ID }
             });
             
             if (response.ok) {
@@ -2046,7 +2286,8 @@ async function toggleTodoComplete(todoId) {
         const response = await fetch(`/api/todos/${todoId}`, {
             method: 'PUT',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID
             },
             body: JSON.stringify({
                 ...todo,
@@ -2521,7 +2762,8 @@ async function confirmDeleteProject(projectId) {
     
     try {
         const response = await fetch(`/api/projects/${projectId}`, {
-            method: 'DELETE'
+            method: 'DELETE',
+            headers: { 'X-Client-Id': CLIENT_ID }
         });
         
         if (response.ok) {
@@ -2571,8 +2813,9 @@ async function loadProjectDetail(projectId) {
         // 保存当前项目ID
         currentProject = project;
         
-        // 加载项目任务到看板
-        loadProjectTasks(projectId);
+        // 详情接口已包含项目任务，直接渲染看板
+        kanbanTasks = project.tasks || [];
+        renderKanban();
         
     } catch (error) {
         console.error('加载项目详情失败:', error);
@@ -2664,7 +2907,8 @@ async function createProject(name) {
         const response = await fetch('/api/projects', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID
             },
             body: JSON.stringify({ name: name })
         });
@@ -2899,7 +3143,8 @@ async function updateTaskStatus(taskId, newStatus) {
         const response = await fetch(`/api/todos/${taskId}`, {
             method: 'PUT',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID
             },
             body: JSON.stringify({ status: newStatus })
         });
@@ -2950,7 +3195,8 @@ async function deleteKanbanTask(taskId) {
     
     try {
         const response = await fetch(`/api/todos/${taskId}`, {
-            method: 'DELETE'
+            method: 'DELETE',
+            headers: { 'X-Client-Id': CLIENT_ID }
         });
         
         const result = await response.json();
@@ -3070,4 +3316,58 @@ function initResizeHandles() {
             document.body.style.userSelect = '';
         }
     });
-}
\ No newline at end of file
+}
+
+// 实时更新：其他标签页或设备修改数据后，服务器通过 SSE 推送变更事件，
+// 这里合并一小段时间内的事件，再重新加载已经打开过的视图（数据未变化的列表会得到 304，开销很小）
+let liveUpdateTables = new Set();
+let liveUpdateTimer = null;
+
+function connectLiveUpdates() {
+    // 服务器关闭了实时推送（EVENT_BACKEND=off）时不建立连接
+    if (!window.EventSource || document.body.dataset.liveUpdates === 'off') {
+        return;
+    }
+    // 断线后 EventSource 会按服务器指定的间隔自动重连
+    const source = new EventSource(`/api/events?clientId=${encodeURIComponent(CLIENT_ID)}`);
+    source.addEventListener('change', event => {
+        scheduleLiveUpdate(JSON.parse(event.data).table);
+    });
+    // 事件积压被丢弃时重新加载全部视图
+    source.addEventListener('resync', () => {
+        ['note', 'todo', 'project', 'project_task'].forEach(scheduleLiveUpdate);
+    });
+}
+
+function scheduleLiveUpdate(table) {
+    liveUpdateTables.add(table);
+    clearTimeout(liveUpdateTimer);
+    liveUpdateTimer = setTimeout(applyLiveUpdates, 300);
+}
+
+async function applyLiveUpdates() {
+    const tables = liveUpdateTables;
+    liveUpdateTables = new Set();
+    
+    if (tables.has('note')) {
+        await loadTags();
+        await loadNotes(currentFolderId, currentSearchQuery, currentTagFilter);
+        // 重新渲染列表后恢复当前笔记的选中状态
+        const activeNote = document.querySelector(`[data-note-id="${currentNoteId}"]`);
+        if (activeNote) {
+            activeNote.classList.add('active');
+        }
+    }
+    if (tables.has('todo')) {
+        if (todos.length > 0) loadTodos();
+        if (pomodoroTasks.length > 0) loadPomodoroTasks();
+        if (kanbanTasks.length > 0) loadKanbanTasks();
+    }
+    if (tables.has('project') || tables.has('project_task')) {
+        if (projects.length > 0) loadProjects();
+        const detailView = document.getElementById('project-detail-view');
+        if (currentProject && detailView && detailView.style.display === 'block') {
+            loadProjectTasks(currentProject.id);
+        }
+    }
+}
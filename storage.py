@@ -0,0 +1,97 @@
+"""数据库连接配置
+
+所有参数都可以通过环境变量调整：
+
+    DATABASE_URL            数据库地址，默认 instance/notes.db；也可以指向其他 SQLAlchemy 支持的数据库
+    DB_POOL_SIZE            连接池大小（默认 5）
+    DB_MAX_OVERFLOW         连接池满时允许额外创建的连接数（默认 10）
+    DB_POOL_TIMEOUT         等待空闲连接的秒数（默认 30）
+    DB_POOL_RECYCLE         连接最长复用秒数，-1 表示不回收（默认 -1，非 SQLite 建议设置）
+
+SQLite 专用（每个新连接建立时通过 PRAGMA 设置）：
+
+    SQLITE_JOURNAL_MODE     默认 WAL：读写互不阻塞，多个 worker 进程可同时读
+    SQLITE_SYNCHRONOUS      默认 NORMAL：WAL 模式下仍保证数据库一致，只在断电时可能丢失最后几个事务
+    SQLITE_CACHE_SIZE       页缓存，负数表示 KiB（默认 -20000，约 20 MB）
+    SQLITE_MMAP_SIZE        内存映射读取的字节数（默认 256 MB）
+    SQLITE_BUSY_TIMEOUT     遇到锁时的等待毫秒数（默认 5000）
+    SQLITE_WRITE_BEGIN      写请求（非 GET/HEAD）开启事务的方式，默认 IMMEDIATE：
+                            事务开始时就取得写锁，避免先读后写的事务在升级锁时直接报 "database is locked"
+"""
+import os
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def settings():
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '-1')),
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-20000')),
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')),
+        'write_begin': os.getenv('SQLITE_WRITE_BEGIN', 'IMMEDIATE').upper(),
+    }
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def is_memory_sqlite(uri):
+    return make_url(uri).database in (None, '', ':memory:')
+
+
+def engine_options(uri):
+    """返回 SQLALCHEMY_ENGINE_OPTIONS"""
+    config = settings()
+    options = {'pool_pre_ping': not is_sqlite(uri)}
+    if is_sqlite(uri):
+        if is_memory_sqlite(uri):
+            return options
+        # 确保数据库文件所在目录存在（默认的 instance 目录不在版本库中）
+        os.makedirs(os.path.dirname(os.path.abspath(make_url(uri).database)), exist_ok=True)
+        # sqlite3 模块自己的 timeout 即 busy handler，与 PRAGMA busy_timeout 保持一致
+        options['connect_args'] = {'timeout': config['busy_timeout'] / 1000}
+    options.update(
+        pool_size=config['pool_size'],
+        max_overflow=config['max_overflow'],
+        pool_timeout=config['pool_timeout'],
+        pool_recycle=config['pool_recycle'],
+    )
+    return options
+
+
+def configure_engine(engine):
+    """为 SQLite 引擎注册连接参数和事务开启方式，其他数据库不做处理"""
+    if engine.dialect.name != 'sqlite':
+        return
+    config = settings()
+    memory = is_memory_sqlite(str(engine.url))
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        # 由下面的 begin 事件自行发出 BEGIN，pysqlite 默认的隐式事务处理会推迟 BEGIN 且无法选择模式
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        if not memory:
+            cursor.execute(f"PRAGMA journal_mode = {config['journal_mode']}")
+            cursor.execute(f"PRAGMA mmap_size = {config['mmap_size']}")
+        cursor.execute(f"PRAGMA synchronous = {config['synchronous']}")
+        cursor.execute(f"PRAGMA cache_size = {config['cache_size']}")
+        cursor.execute(f"PRAGMA busy_timeout = {config['busy_timeout']}")
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def begin_transaction(connection):
+        # 写请求在事务开始时就申请写锁，锁等待由 busy_timeout 处理；读请求和后台任务使用默认的 DEFERRED
+        if has_request_context() and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            connection.exec_driver_sql(f"BEGIN {config['write_begin']}")
+        else:
+            connection.exec_driver_sql('BEGIN')
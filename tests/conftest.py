@@ -0,0 +1,57 @@
+"""测试共用的应用和数据库
+
+app.py 在导入时按环境变量创建数据库连接，因此在导入之前把 DATABASE_URL 指向一个临时文件，
+整个测试会话共用这个数据库。
+"""
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+WORKDIR = tempfile.mkdtemp(prefix='notes-tests-')
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(WORKDIR, "notes.db")}'
+# 测试中不启动后台任务线程
+os.environ['JOB_WORKERS'] = '0'
+sys.path.insert(0, ROOT)
+
+import app as notes_app  # noqa: E402
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture
+def app():
+    with notes_app.app.app_context():
+        yield notes_app.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@contextmanager
+def captured_queries(engine):
+    """记录期间执行的 SQL 语句"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+@pytest.fixture
+def query_log(app):
+    return lambda: captured_queries(notes_app.db.engine)
@@ -0,0 +1,17 @@
+"""批量操作的输入校验：格式错误的操作返回带序号的 400，不抛出 500"""
+import pytest
+
+
+@pytest.mark.parametrize('operation', [
+    {'op': 'create', 'type': 'task', 'data': {'projectId': [1], 'title': '任务'}},
+    {'op': 'create', 'type': 'task', 'data': {'projectId': {'id': 1}, 'title': '任务'}},
+    {'op': 'create', 'type': 'task', 'data': {'projectId': '1', 'title': '任务'}},
+    {'op': 'create', 'type': 'task', 'data': {'title': '任务'}},
+    {'op': 'create', 'type': 'task', 'data': [1]},
+    {'op': 'create', 'type': 'todo', 'data': 'title'},
+])
+def test_invalid_operation_is_rejected_with_index(client, operation):
+    operations = [{'op': 'create', 'type': 'todo', 'data': {'title': '正常'}}, operation]
+    response = client.post('/api/batch', json={'operations': operations})
+    assert response.status_code == 400, response.get_data(as_text=True)
+    assert response.json['index'] == 1
@@ -0,0 +1,16 @@
+"""导入时类型不对的值作为该行的错误报告，不影响其他行"""
+import json
+
+
+def test_invalid_values_are_reported_per_row(client):
+    lines = [
+        {'kind': 'todo', 'title': '正常', 'createdAt': '2024-05-01T08:00:00'},
+        {'kind': 'todo', 'title': '数字时间', 'createdAt': 1714550400},
+        {'kind': 'project', 'name': '对象日期', 'start_date': {'year': 2024}},
+        {'kind': ['todo'], 'title': '列表类型'},
+    ]
+    response = client.post('/api/import', data='\n'.join(json.dumps(line) for line in lines))
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.json['imported']['todo'] == 1
+    assert response.json['errorCount'] == 3
+    assert [error['line'] for error in response.json['errors']] == [2, 3, 4]
@@ -0,0 +1,170 @@
+"""后台任务队列：领取不重复、按退避重试到 maxAttempts、最终失败，以及敏感任务结束后清空 payload"""
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as notes_app
+import jobs
+from ai_client import AIClient, AIError
+from jobs import JobError, JobQueue
+
+BACKOFF = 60.0
+
+
+@pytest.fixture
+def queue(app, monkeypatch):
+    """独立的队列实例，只领取测试中登记的任务种类"""
+    monkeypatch.setattr(jobs.random, 'uniform', lambda low, high: 1.0)
+    queue = JobQueue(app, notes_app.db, notes_app.Job, poll_interval=0.01, backoff=BACKOFF)
+    yield queue
+    notes_app.Job.query.filter(notes_app.Job.kind.in_(list(queue.kinds))).delete(synchronize_session=False)
+    notes_app.db.session.commit()
+
+
+def load(job_id):
+    notes_app.db.session.remove()
+    return notes_app.db.session.get(notes_app.Job, job_id)
+
+
+def run_once(queue):
+    job = queue.claim('test-worker')
+    assert job is not None
+    queue.execute(job, 'test-worker')
+    return load(job.id)
+
+
+def make_due(job_id):
+    """跳过退避等待，让任务立即可以再次领取"""
+    notes_app.Job.query.filter_by(id=job_id).update({'runAt': datetime.utcnow() - timedelta(seconds=1)})
+    notes_app.db.session.commit()
+
+
+def test_concurrent_workers_claim_each_job_once(queue):
+    seen = []
+    lock = threading.Lock()
+
+    @queue.register('test.record')
+    def record(payload):
+        with lock:
+            seen.append(payload['index'])
+        return payload
+
+    job_ids = [queue.enqueue('test.record', {'index': index}).id for index in range(40)]
+    queue.work(concurrency=4, burst=True)
+
+    assert sorted(seen) == list(range(40))
+    jobs_after = [load(job_id) for job_id in job_ids]
+    assert {job.status for job in jobs_after} == {jobs.SUCCEEDED}
+    assert {job.attempts for job in jobs_after} == {1}
+    assert queue.claim('test-worker') is None
+
+
+def test_transient_errors_retry_with_backoff_until_max_attempts(queue):
+    @queue.register('test.flaky', max_attempts=3)
+    def flaky(payload):
+        raise AIError('AI服务返回错误: HTTP 503', upstream_status=503)
+
+    job_id = queue.enqueue('test.flaky', {}).id
+    for attempt in (1, 2):
+        before = datetime.utcnow()
+        job = run_once(queue)
+        assert (job.status, job.attempts, job.workerId) == (jobs.QUEUED, attempt, None)
+        delay = (job.runAt - before).total_seconds()
+        assert BACKOFF * 2 ** (attempt - 1) - 1 <= delay <= BACKOFF * 2 ** (attempt - 1) + 1
+        # 退避期间不会被领取
+        assert queue.claim('test-worker') is None
+        make_due(job_id)
+
+    job = run_once(queue)
+    assert (job.status, job.attempts) == (jobs.FAILED, 3)
+    assert job.error == 'AI服务返回错误: HTTP 503'
+    assert job.finishedAt is not None
+
+
+@pytest.mark.parametrize('error', [
+    AIError('AI服务返回错误: HTTP 401', upstream_status=401),
+    AIError('AI服务返回错误: HTTP 400', upstream_status=400),
+    AIError('AI服务返回格式错误', upstream_status=200),
+    AIError('未配置API密钥', 500),
+    JobError('API密钥无效'),
+])
+def test_permanent_errors_fail_without_retry(queue, error):
+    @queue.register('test.broken', max_attempts=3)
+    def broken(payload):
+        raise error
+
+    queue.enqueue('test.broken', {})
+    job = run_once(queue)
+    assert (job.status, job.attempts, job.error) == (jobs.FAILED, 1, str(error))
+
+
+@pytest.mark.parametrize('error, retryable', [
+    (AIError('上游限流', upstream_status=429), True),
+    (AIError('上游错误', upstream_status=500), True),
+    (AIError('密钥无效', upstream_status=403), False),
+    (AIError('AI服务连接失败'), True),
+    (AIError('AI服务响应超时', 504), True),
+    (AIError('AI服务繁忙，请稍后再试', 503), True),
+    (JobError('可以重试', retryable=True), True),
+    (RuntimeError('数据库繁忙'), True),
+])
+def test_is_retryable(error, retryable):
+    assert jobs.is_retryable(error) is retryable
+
+
+class StubResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def json(self):
+        return {}
+
+
+@pytest.mark.parametrize('status', [401, 429, 503])
+def test_ai_client_reports_upstream_status(monkeypatch, status):
+    client = AIClient()
+    monkeypatch.setattr(client, '_post', lambda payload, api_key: StubResponse(status))
+    with pytest.raises(AIError) as raised:
+        client._complete({}, 'key')
+    assert raised.value.upstream_status == status
+
+
+def test_sensitive_payload_is_cleared_when_job_finishes(queue):
+    attempts = []
+
+    @queue.register('test.secret', max_attempts=2, sensitive=True)
+    def secret(payload):
+        attempts.append(payload['apiKey'])
+        if len(attempts) == 1:
+            raise JobError('暂时失败', retryable=True)
+        return {'ok': True}
+
+    job_id = queue.enqueue('test.secret', {'apiKey': 'sk-secret'}).id
+    # 等待重试期间仍保留 payload，重试时才能拿到密钥
+    job = run_once(queue)
+    assert job.status == jobs.QUEUED
+    assert json.loads(job.payload) == {'apiKey': 'sk-secret'}
+    make_due(job_id)
+
+    job = run_once(queue)
+    assert job.status == jobs.SUCCEEDED
+    assert attempts == ['sk-secret', 'sk-secret']
+    assert json.loads(job.payload) == {}
+    assert json.loads(job.result) == {'ok': True}
+
+
+def test_sensitive_payload_is_cleared_on_failure_and_cancel(queue):
+    @queue.register('test.secret_fail', max_attempts=1, sensitive=True)
+    def secret_fail(payload):
+        raise AIError('AI服务返回错误: HTTP 503', upstream_status=503)
+
+    queue.enqueue('test.secret_fail', {'apiKey': 'sk-secret'})
+    job = run_once(queue)
+    assert (job.status, json.loads(job.payload)) == (jobs.FAILED, {})
+
+    cancelled = queue.enqueue('test.secret_fail', {'apiKey': 'sk-secret'})
+    assert queue.cancel(cancelled)
+    job = load(cancelled.id)
+    assert (job.status, json.loads(job.payload)) == (jobs.CANCELLED, {})
@@ -0,0 +1,46 @@
+"""文件夹和标签缓存不会比 ETag 旧：其他进程的写入不经过本进程的缓存失效，版本号变化后也要重新加载"""
+from sqlalchemy import text
+
+import app as notes_app
+
+
+def write_from_other_process(statement):
+    # 测试共用一个应用上下文，前后都结束会话的读事务，相当于请求结束时的清理
+    notes_app.db.session.remove()
+    # 直接写数据库，不触发本进程的会话事件，相当于另一个 worker 进程的写入
+    with notes_app.db.engine.begin() as conn:
+        conn.execute(text(statement))
+    notes_app.db.session.remove()
+
+
+def test_folders_reload_after_external_write(client):
+    first = client.get('/api/folders')
+    write_from_other_process("INSERT INTO folder (name) VALUES ('其他进程')")
+    second = client.get('/api/folders', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert '其他进程' in [folder['name'] for folder in second.json]
+
+
+def test_tag_counts_reload_after_external_write(client):
+    client.get('/api/tags?counts=true')
+    write_from_other_process("INSERT INTO note (title, content, tag, version) VALUES ('外部', '', '外部标签', 1)")
+    counts = {item['tag']: item['count'] for item in client.get('/api/tags?counts=true').json}
+    assert counts['外部标签'] == 1
+
+
+def test_editing_note_content_keeps_tag_cache_and_etag(client):
+    note = client.post('/api/notes', json={'title': '标签缓存', 'content': '正文', 'tag': '缓存标签'}).json
+    first = client.get('/api/tags')
+    loads = notes_app.tags_cache.stats()['misses']
+
+    client.put(f"/api/notes/{note['id']}", json={'content': '自动保存的新正文'})
+    write_from_other_process(f"UPDATE note SET content = '其他进程的正文' WHERE id = {note['id']}")
+    assert client.get('/api/tags', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert client.get('/api/tags').json == first.json
+    assert notes_app.tags_cache.stats()['misses'] == loads
+
+    write_from_other_process(f"UPDATE note SET tag = '改过的标签' WHERE id = {note['id']}")
+    changed = client.get('/api/tags', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert '改过的标签' in changed.json and '缓存标签' not in changed.json
+    client.delete(f"/api/notes/{note['id']}")
@@ -0,0 +1,80 @@
+"""笔记增量保存（PATCH）：补丁应用、版本检查、冲突返回 409，格式错误返回中文的 400"""
+import pytest
+
+import app as notes_app
+
+
+@pytest.fixture
+def note(client):
+    note = client.post('/api/notes', json={'title': '增量', 'content': '你好，世界 😀 结束'}).json
+    yield note
+    client.delete(f"/api/notes/{note['id']}")
+
+
+def patch(client, note, **body):
+    return client.patch(f"/api/notes/{note['id']}", json=body)
+
+
+def current(client, note):
+    return client.get(f"/api/notes/{note['id']}").json
+
+
+def test_ops_are_applied_with_utf16_offsets(client, note):
+    # 😀 占两个 UTF-16 编码单元，之后的偏移量与 JavaScript 字符串下标一致
+    ops = [{'start': 0, 'end': 2, 'text': '您好'}, {'start': 9, 'end': 11, 'text': '收尾'}]
+    response = patch(client, note, baseVersion=note['version'], ops=ops, title='新标题')
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.json['changed'] is True
+    assert response.json['version'] == note['version'] + 1
+    assert 'content' not in response.json
+    saved = current(client, note)
+    assert (saved['title'], saved['content']) == ('新标题', '您好，世界 😀 收尾')
+
+
+def test_patch_without_changes_keeps_version(client, note):
+    response = patch(client, note, baseVersion=note['version'], ops=[], title=note['title'])
+    assert response.status_code == 200
+    assert (response.json['changed'], response.json['version']) == (False, note['version'])
+
+
+def test_stale_base_version_conflicts(client, note):
+    assert patch(client, note, baseVersion=note['version'], ops=[{'start': 0, 'end': 0, 'text': '甲'}]).status_code == 200
+    response = patch(client, note, baseVersion=note['version'], ops=[{'start': 0, 'end': 0, 'text': '乙'}])
+    assert response.status_code == 409
+    assert response.json['version'] == note['version'] + 1
+    assert current(client, note)['content'] == '甲你好，世界 😀 结束'
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'baseVersion': None, 'ops': []}, '缺少 baseVersion'),
+    ({'baseVersion': '1', 'ops': []}, 'baseVersion 必须是整数'),
+    ({'baseVersion': True, 'ops': []}, 'baseVersion 必须是整数'),
+    ({'ops': 'abc'}, 'ops 必须是数组'),
+    ({'ops': {'start': 0, 'end': 1}}, 'ops 必须是数组'),
+    ({'ops': [1]}, '第 1 个补丁操作必须是对象'),
+    ({'ops': [{'start': 0, 'end': 0}, 'x']}, '第 2 个补丁操作必须是对象'),
+    ({'ops': [{'start': '0', 'end': 1}]}, '第 1 个补丁操作的 start 和 end 必须是整数'),
+    ({'ops': [{'start': 0}]}, '第 1 个补丁操作的 start 和 end 必须是整数'),
+    ({'ops': [{'start': False, 'end': 1}]}, '第 1 个补丁操作的 start 和 end 必须是整数'),
+    ({'ops': [{'start': 0, 'end': 1, 'text': 5}]}, '第 1 个补丁操作的 text 必须是字符串'),
+    ({'ops': [{'start': 0, 'end': 100}]}, '第 1 个补丁操作的位置超出范围或与前一个操作重叠'),
+    ({'ops': [{'start': 2, 'end': 1}]}, '第 1 个补丁操作的位置超出范围或与前一个操作重叠'),
+    ({'ops': [{'start': 2, 'end': 4}, {'start': 3, 'end': 5}]}, '第 2 个补丁操作的位置超出范围或与前一个操作重叠'),
+    ({'ops': [{'start': 7, 'end': 7, 'text': '拆'}]}, '补丁位置落在字符中间（代理对被拆开）'),
+])
+def test_malformed_patch_is_rejected(client, note, body, error):
+    response = patch(client, note, **{'baseVersion': note['version'], **body})
+    assert response.status_code == 400, response.get_data(as_text=True)
+    assert response.json == {'error': error}
+    assert current(client, note)['version'] == note['version']
+
+
+def test_non_object_body_is_rejected(client, note):
+    response = client.patch(f"/api/notes/{note['id']}", json=[{'start': 0, 'end': 0}])
+    assert response.status_code == 400
+    assert response.json == {'error': '请求体必须是对象'}
+
+
+def test_apply_text_patch_keeps_untouched_text():
+    assert notes_app.apply_text_patch('abcdef', [{'start': 1, 'end': 2}, {'start': 4, 'end': 4, 'text': 'X'}]) == 'acdXef'
+    assert notes_app.apply_text_patch(None, [{'start': 0, 'end': 0, 'text': '新'}]) == '新'
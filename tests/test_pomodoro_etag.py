@@ -0,0 +1,33 @@
+"""番茄钟统计的默认范围相对于今天，日期变化后旧的 ETag 不能再得到 304"""
+from datetime import datetime
+
+import pytest
+
+import app as notes_app
+
+
+def freeze_utcnow(monkeypatch, now):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return now
+
+    monkeypatch.setattr(notes_app, 'datetime', FrozenDatetime)
+
+
+@pytest.mark.parametrize('url', ['/api/pomodoro/stats', '/api/pomodoro/streak'])
+def test_default_range_etag_changes_with_date(client, monkeypatch, url):
+    freeze_utcnow(monkeypatch, datetime(2024, 5, 1, 23, 0))
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    freeze_utcnow(monkeypatch, datetime(2024, 5, 2, 1, 0))
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_explicit_today_keeps_etag(client, monkeypatch):
+    url = '/api/pomodoro/streak?today=2024-05-01'
+    freeze_utcnow(monkeypatch, datetime(2024, 5, 1, 23, 0))
+    etag = client.get(url).headers['ETag']
+    freeze_utcnow(monkeypatch, datetime(2024, 5, 2, 1, 0))
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
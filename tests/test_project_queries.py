@@ -0,0 +1,65 @@
+"""项目列表和更新的查询次数不随项目数、任务数增长（防止 N+1 查询回归）"""
+import pytest
+from sqlalchemy import text
+
+import app as notes_app
+
+
+def add_projects(count, tasks_per_project):
+    db = notes_app.db
+    for index in range(count):
+        project = notes_app.Project(name=f'项目 {index}', status='active')
+        db.session.add(project)
+        db.session.flush()
+        for task_index in range(tasks_per_project):
+            db.session.add(notes_app.ProjectTask(
+                projectId=project.id, title=f'任务 {task_index}', status='done' if task_index % 2 else 'todo'
+            ))
+    db.session.commit()
+    notes_app.reconcile_project_progress()
+
+
+def count_selects(client, query_log, method, url, **kwargs):
+    with query_log() as statements:
+        response = getattr(client, method)(url, **kwargs)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return len([statement for statement, _ in statements if statement.lstrip().upper().startswith('SELECT')])
+
+
+@pytest.mark.parametrize('url', ['/api/projects', '/api/projects?limit=50', '/api/projects?status=active'])
+def test_project_list_query_count_is_constant(client, query_log, url):
+    add_projects(3, 2)
+    small = count_selects(client, query_log, 'get', url)
+    add_projects(30, 10)
+    large = count_selects(client, query_log, 'get', url)
+    assert large == small
+
+
+def test_update_project_does_not_load_tasks(client, query_log):
+    add_projects(1, 2)
+    few = notes_app.Project.query.order_by(notes_app.Project.id.desc()).first().id
+    add_projects(1, 50)
+    many = notes_app.Project.query.order_by(notes_app.Project.id.desc()).first().id
+    body = {'priority': 'high'}
+    assert (count_selects(client, query_log, 'put', f'/api/projects/{few}', json=body)
+            == count_selects(client, query_log, 'put', f'/api/projects/{many}', json=body))
+    project = client.get(f'/api/projects/{many}').json
+    assert project['taskCount'] == 50
+    assert project['completedTasks'] == 25
+
+
+def test_project_stats_reload_after_external_write(client):
+    add_projects(1, 2)
+    first = client.get('/api/projects/stats')
+    # 直接写数据库，不经过本进程的缓存失效，相当于另一个 worker 进程的写入
+    notes_app.db.session.remove()
+    with notes_app.db.engine.begin() as conn:
+        conn.execute(text("INSERT INTO project (name, status, \"updatedAt\") "
+                          "VALUES ('其他进程', 'completed', '2999-01-01 00:00:00.000000')"))
+    notes_app.db.session.remove()
+
+    second = client.get('/api/projects/stats', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.json['totalProjects'] == first.json['totalProjects'] + 1
+    assert second.json['completedProjects'] == first.json['completedProjects'] + 1
+    assert second.json['recentProjects'][0]['name'] == '其他进程'
@@ -0,0 +1,96 @@
+"""列表接口的查询计划：这些查询都应该走索引，不应出现全表扫描或临时 B 树排序"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as notes_app
+
+ENDPOINTS = [
+    '/api/notes?limit=50',
+    '/api/notes?folderId={folder_id}&limit=50',
+    '/api/notes?limit=50&cursor={note_cursor}',
+    '/api/tags',
+    '/api/todos?limit=50',
+    '/api/todos?type=todo&limit=50',
+    '/api/todos?type=pomodoro&completed=false&limit=50',
+    '/api/todos?priority=high&limit=50',
+    '/api/todos?priority=high,medium&limit=50',
+    '/api/todos?completed=false&limit=50',
+    '/api/todos?sort=priority&limit=50',
+    '/api/todos?sort=-priority&limit=50&cursor={todo_priority_cursor}',
+    '/api/todos?sort=-updatedAt&limit=50',
+    '/api/todos?type=todo&sort=-priority&limit=50',
+    '/api/todos?type=todo&sort=updatedAt&limit=50',
+    '/api/todos?type=todo,pomodoro&completed=false&limit=50',
+    '/api/projects?limit=50',
+    '/api/projects?status=active&limit=50',
+    '/api/projects?priority=high&limit=50',
+    '/api/projects/{project_id}',
+    '/api/projects/{project_id}?taskStatus=todo,inprogress',
+    '/api/projects/{project_id}/tasks?limit=50',
+    '/api/projects/{project_id}/tasks?status=done&limit=50',
+    '/api/pomodoro/sessions?limit=50',
+    '/api/pomodoro/sessions?todoId={todo_id}&limit=50',
+    '/api/pomodoro/stats?groupBy=week',
+    '/api/notes/{note_id}/revisions?limit=50',
+]
+
+# 只有几行的元数据表，全表扫描是预期的
+SMALL_TABLES = ('table_version',)
+
+
+def is_unindexed_plan(detail):
+    """SCAN 表且未使用索引，或需要临时 B 树排序/去重"""
+    if 'USE TEMP B-TREE' in detail:
+        return True
+    if not detail.startswith('SCAN') or detail.split()[1] in SMALL_TABLES:
+        return False
+    return 'USING' not in detail and 'VIRTUAL TABLE' not in detail
+
+
+@pytest.fixture
+def ids(app):
+    """每种资源准备一条数据，让接口执行完整的查询"""
+    db = notes_app.db
+    folder = notes_app.Folder(name='查询计划')
+    todo = notes_app.Todo(title='查询计划', type='pomodoro')
+    project = notes_app.Project(name='查询计划', status='active')
+    db.session.add_all([folder, todo, project])
+    db.session.flush()
+    note = notes_app.Note(title='查询计划', content='内容', folderId=folder.id)
+    started = datetime.utcnow() - timedelta(hours=1)
+    db.session.add_all([
+        note,
+        notes_app.ProjectTask(projectId=project.id, title='任务', status='done'),
+        notes_app.PomodoroSession(todoId=todo.id, startedAt=started, endedAt=started + timedelta(minutes=25),
+                                  duration=1500, day=started.date()),
+    ])
+    db.session.commit()
+    return {
+        'folder_id': folder.id,
+        'project_id': project.id,
+        'todo_id': todo.id,
+        'note_id': note.id,
+        'note_cursor': notes_app.encode_cursor(note.updatedAt, note.id),
+        'todo_priority_cursor': notes_app.encode_cursor(2, todo.id),
+    }
+
+
+def explain(statement, parameters):
+    with notes_app.db.engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+
+
+@pytest.mark.parametrize('template', ENDPOINTS)
+def test_list_queries_use_indexes(client, query_log, ids, template):
+    url = template.format(**ids)
+    with query_log() as statements:
+        response = client.get(url)
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+    selects = [(statement, parameters) for statement, parameters in statements
+               if statement.lstrip().upper().startswith('SELECT')]
+    assert selects
+    for statement, parameters in selects:
+        plan = explain(statement, parameters)
+        assert not [detail for detail in plan if is_unindexed_plan(detail)], f'{url}\n{statement}\n' + '\n'.join(plan)
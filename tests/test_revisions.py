@@ -0,0 +1,148 @@
+"""笔记历史版本的编码、还原和整理"""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as notes_app
+import revisions
+
+
+@pytest.mark.parametrize('base', [
+    'a\n\n' * 75000,  # 约 220 KB，空行交替
+    '同一行内容\n' * 3000,
+    '这是一段用于测试自动保存的笔记内容。\n' * 20000,
+])
+def test_delta_on_large_repetitive_note_is_fast(base):
+    middle = len(base) // 2
+    target = base[:middle] + '新' + base[middle:]
+    started = time.perf_counter()
+    kind, data = revisions.encode(base, target, 2, 1)
+    assert time.perf_counter() - started < 0.5
+    assert kind == revisions.DELTA
+    assert len(data) < 1024
+    assert revisions.reconstruct([(revisions.KEYFRAME, revisions.encode_keyframe(base)), (kind, data)]) == target
+
+
+def test_encode_uses_keyframes_at_chain_start_interval_and_rewrites():
+    assert revisions.encode(None, '正文', 1, None)[0] == revisions.KEYFRAME
+    assert revisions.encode('正文\n', '正文\n追加\n', 5, 1)[0] == revisions.DELTA
+    assert revisions.encode('正文\n', '正文\n追加\n', 1 + revisions.KEYFRAME_INTERVAL, 1)[0] == revisions.KEYFRAME
+    # 整篇改写时差异不比全文小，存关键帧
+    base = ''.join(f'第 {i} 行\n' for i in range(500))
+    target = ''.join(f'改写后的第 {i} 行\n' for i in range(500))
+    assert revisions.encode(base, target, 2, 1)[0] == revisions.KEYFRAME
+
+
+@pytest.mark.parametrize('base, target', [
+    ('', '新内容'),
+    ('旧内容', ''),
+    ('一\n二\n三', '一\n二\n三\n'),
+    ('一\n二\n三\n', '零\n一\n三\n四'),
+    ('没有换行', '没有换行也能还原'),
+    ('a\r\nb\r\n', 'a\r\nc\r\nb\r\n'),
+])
+def test_delta_round_trip(base, target):
+    assert revisions.apply_delta(base, revisions.encode_delta(base, target)) == target
+
+
+def test_reencode_round_trips_a_long_chain():
+    contents = [''.join(f'第 {line} 行 {version if line == version % 30 else 0}\n' for line in range(30))
+                for version in range(50)]
+    seqs = list(range(1, 51))
+    encoded = revisions.reencode(contents, seqs)
+    assert [kind for kind, _, _ in encoded].count(revisions.KEYFRAME) == 3
+    assert revisions.reconstruct_all([(kind, data) for kind, data, _ in encoded]) == contents
+    # 每个版本都能从它的关键帧开始单独还原
+    for index, (kind, data, keyframe_seq) in enumerate(encoded):
+        start = seqs.index(keyframe_seq)
+        chain = [(k, d) for k, d, _ in encoded[start:index + 1]]
+        assert revisions.reconstruct(chain) == contents[index]
+
+
+def test_retained_seqs_thins_older_revisions_by_tier():
+    now = datetime(2024, 6, 1, 12, 0)
+    history = [
+        (1, now - timedelta(days=200, hours=1)),  # 同一周的两个版本只保留较新的
+        (2, now - timedelta(days=199)),
+        (3, now - timedelta(days=30, hours=5)),  # 同一天的两个版本只保留较新的
+        (4, now - timedelta(days=30, hours=1)),
+        (5, now - timedelta(days=29)),
+        (6, now - timedelta(days=2, hours=3)),  # 最近几天全部保留
+        (7, now - timedelta(days=2, hours=2)),
+        (8, now - timedelta(minutes=5)),
+    ]
+    assert revisions.retained_seqs(history, now, keep_all_days=7, daily_days=90) == {2, 4, 5, 6, 7, 8}
+    assert revisions.retained_seqs([], now) == set()
+
+
+def test_retained_seqs_always_keeps_latest():
+    now = datetime(2024, 6, 1)
+    history = [(1, now - timedelta(days=400)), (2, now - timedelta(days=400))]
+    assert 2 in revisions.retained_seqs(history, now)
+
+
+def revision_list(client, note_id):
+    return client.get(f'/api/notes/{note_id}/revisions').json
+
+
+def test_autosaves_within_window_coalesce(client):
+    note = client.post('/api/notes', json={'title': '合并', 'content': '第一版'}).json
+    for text in ('第二版', '第三版', '第四版'):
+        assert client.put(f"/api/notes/{note['id']}", json={'content': text}).status_code == 200
+    # 修改前的内容作为基准版本，之后的连续保存合并为一个版本
+    items = revision_list(client, note['id'])
+    assert [item['seq'] for item in items] == [2, 1]
+    assert client.get(f"/api/notes/{note['id']}/revisions/2").json['content'] == '第四版'
+    assert client.get(f"/api/notes/{note['id']}/revisions/1").json['content'] == '第一版'
+
+
+def test_saves_outside_window_create_revisions(client, monkeypatch):
+    monkeypatch.setattr(notes_app, 'REVISION_WINDOW', 0)
+    note = client.post('/api/notes', json={'title': '不合并', 'content': '0'}).json
+    for index in range(1, 4):
+        client.put(f"/api/notes/{note['id']}", json={'content': str(index)})
+    items = revision_list(client, note['id'])
+    assert [item['seq'] for item in items] == [4, 3, 2, 1]
+    for item in items:
+        assert client.get(f"/api/notes/{note['id']}/revisions/{item['seq']}").json['content'] == str(item['seq'] - 1)
+
+
+def test_restore_records_a_new_revision(client):
+    note = client.post('/api/notes', json={'title': '恢复', 'content': '原始内容'}).json
+    client.put(f"/api/notes/{note['id']}", json={'title': '改过', 'content': '修改后的内容'})
+    restored = client.post(f"/api/notes/{note['id']}/revisions/1/restore")
+    assert restored.status_code == 200
+    assert (restored.json['title'], restored.json['content']) == ('恢复', '原始内容')
+    assert [item['seq'] for item in revision_list(client, note['id'])] == [3, 2, 1]
+    assert client.post(f"/api/notes/{note['id']}/revisions/1/restore",
+                       json={'baseVersion': 1}).status_code == 409
+
+
+def test_compaction_thins_chain_and_keeps_contents(app):
+    db = notes_app.db
+    now = datetime.utcnow()
+    start = now - timedelta(days=120)
+    note = notes_app.Note(title='整理', content='内容 0\n', createdAt=start, updatedAt=start)
+    db.session.add(note)
+    db.session.commit()
+    expected = {}
+    # 120 天里每天两个版本
+    for day in range(120):
+        for hour in (9, 18):
+            moment = start + timedelta(days=day, hours=hour)
+            old_title, old_content = note.title, note.content
+            note.content = old_content + f'第 {day} 天 {hour} 点\n'
+            note.version += 1
+            note.updatedAt = moment
+            revision = notes_app.record_note_revision(note, old_title, old_content, moment)
+            db.session.commit()
+            expected[revision.seq] = note.content
+
+    result = app.test_cli_runner().invoke(args=['compact-revisions'])
+    assert result.exit_code == 0, result.output
+    rows = notes_app.NoteRevision.query.filter_by(noteId=note.id).order_by(notes_app.NoteRevision.seq).all()
+    assert len(rows) < 120
+    assert rows[-1].seq == max(expected)
+    for row in rows:
+        assert notes_app.load_revision_content(note.id, row.seq, row.keyframeSeq) == expected[row.seq]
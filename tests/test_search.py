@@ -0,0 +1,64 @@
+"""笔记搜索：3 个字以上走 trigram 索引，1~2 个字走短词索引，结果与 LIKE 子串匹配一致"""
+import pytest
+
+import app as notes_app
+
+
+@pytest.fixture
+def notes(client):
+    created = [
+        client.post('/api/notes', json={'title': '周会', 'content': '今天的会议记录', 'tag': '工作'}).json,
+        client.post('/api/notes', json={'title': 'Email', 'content': 'send an EMAIL', 'tag': '默认'}).json,
+        client.post('/api/notes', json={'title': '读书', 'content': '读书笔记：会', 'tag': '学习'}).json,
+    ]
+    yield {note['title']: note['id'] for note in created}
+    for note in created:
+        client.delete(f"/api/notes/{note['id']}")
+
+
+def search(client, query_log, term):
+    with query_log() as statements:
+        response = client.get('/api/notes', query_string={'search': term})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert not [statement for statement, _ in statements if ' LIKE ' in statement.upper()]
+    return sorted(note['title'] for note in response.json)
+
+
+@pytest.mark.parametrize('term, titles', [
+    ('会议', ['周会']),
+    ('会', ['周会', '读书']),
+    ('em', ['Email']),
+    ('工作', ['周会']),
+    ('会议 记录', ['周会']),
+    ('会议记录', ['周会']),
+    ('笔记 会', ['读书']),
+    ('的会议', ['周会']),
+    ('无关', []),
+])
+def test_short_and_long_terms_use_indexes(client, query_log, notes, term, titles):
+    assert search(client, query_log, term) == titles
+
+
+def test_short_index_follows_updates_and_deletes(client, query_log, notes):
+    note_id = notes['Email']
+    client.put(f'/api/notes/{note_id}', json={'content': '会议改期'})
+    assert search(client, query_log, '会议') == ['Email', '周会']
+    assert search(client, query_log, 'em') == ['Email']
+    client.put(f'/api/notes/{note_id}', json={'title': '邮件'})
+    assert search(client, query_log, 'em') == []
+    client.delete(f"/api/notes/{notes['周会']}")
+    assert search(client, query_log, '会议') == ['邮件']
+
+
+def test_note_grams_are_stable():
+    assert notes_app.note_grams('Ab 会议') == '000061 000061000062 000062 004f1a 004f1a008bae 008bae'
+    assert notes_app.gram_token('会议') == '004f1a008bae'
+
+
+def test_snippet_is_escaped_and_marks_matches(client):
+    note = client.post('/api/notes', json={'title': '摘要', 'content': '<b>加粗</b> 的会议纪要'}).json
+    try:
+        response = client.get('/api/notes', query_string={'search': '会议纪要'})
+        assert [item['snippet'] for item in response.json] == ['&lt;b&gt;加粗&lt;/b&gt; 的<mark>会议纪要</mark>']
+    finally:
+        client.delete(f"/api/notes/{note['id']}")
@@ -0,0 +1,101 @@
+"""增量同步：令牌推进、同一行多次变更合并、删除记录（墓碑），以及过期或不属于当前数据库的令牌返回 410"""
+import pytest
+
+import app as notes_app
+
+
+def token(client):
+    response = client.get('/api/sync')
+    assert response.status_code == 200
+    assert set(response.json) == {'next'}
+    return response.json['next']
+
+
+def sync(client, since, **params):
+    response = client.get('/api/sync', query_string={'since': since, **params})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.json
+
+
+def test_changes_since_token(client):
+    since = token(client)
+    note = client.post('/api/notes', json={'title': '同步', 'content': '一'}).json
+    client.put(f"/api/notes/{note['id']}", json={'content': '二'})
+    client.put(f"/api/notes/{note['id']}", json={'content': '三'})
+    todo = client.post('/api/todos', json={'title': '同步待办'}).json
+
+    result = sync(client, since)
+    assert result['hasMore'] is False
+    # 同一行的多次变更只返回一次，内容为最新版本
+    assert [(item['id'], item['content']) for item in result['changes']['notes']['upserted']] == [(note['id'], '三')]
+    assert [item['id'] for item in result['changes']['todos']['upserted']] == [todo['id']]
+    assert result['changes']['projects'] == {'upserted': [], 'deleted': []}
+    assert int(result['next']) > int(since)
+    assert result['next'] == token(client)
+
+    # 用新令牌再次同步没有变更，令牌不变
+    again = sync(client, result['next'])
+    assert all(entry == {'upserted': [], 'deleted': []} for entry in again['changes'].values())
+    assert again['next'] == result['next']
+    client.delete(f"/api/notes/{note['id']}")
+    client.delete(f"/api/todos/{todo['id']}")
+
+
+def test_deletes_are_returned_as_tombstones(client):
+    kept = client.post('/api/notes', json={'title': '保留'}).json
+    since = token(client)
+    removed = client.post('/api/notes', json={'title': '删除'}).json
+    client.delete(f"/api/notes/{removed['id']}")
+    client.delete(f"/api/notes/{kept['id']}")
+
+    notes = sync(client, since)['changes']['notes']
+    # 新建后又删除的行只以删除记录出现
+    assert notes['upserted'] == []
+    assert sorted(notes['deleted']) == sorted([kept['id'], removed['id']])
+
+
+def test_pages_follow_next_token(client):
+    since = token(client)
+    created = [client.post('/api/todos', json={'title': f'分页 {index}'}).json['id'] for index in range(3)]
+    seen = []
+    pages = 0
+    while True:
+        result = sync(client, since, limit=1)
+        pages += 1
+        seen += [item['id'] for item in result['changes']['todos']['upserted']]
+        since = result['next']
+        if not result['hasMore']:
+            break
+    assert seen == created
+    assert pages == 3
+    for todo_id in created:
+        client.delete(f'/api/todos/{todo_id}')
+
+
+@pytest.mark.parametrize('params', [{'since': 'abc'}, {'since': '-1'}, {'since': '0', 'limit': '0'}])
+def test_invalid_parameters_are_rejected(client, params):
+    response = client.get('/api/sync', query_string=params)
+    assert response.status_code == 400
+    assert response.json['error']
+
+
+def test_future_token_is_gone(client):
+    # 令牌大于当前最大 seq，例如数据库被重建后客户端仍持有旧令牌
+    response = client.get('/api/sync', query_string={'since': int(token(client)) + 100})
+    assert response.status_code == 410
+
+
+def test_token_before_pruned_log_is_gone(app, client):
+    old = token(client)
+    note = client.post('/api/notes', json={'title': '清理前'}).json
+    result = app.test_cli_runner().invoke(args=['prune-change-log', '--days', '0'])
+    assert result.exit_code == 0, result.output
+    notes_app.db.session.remove()
+
+    response = client.get('/api/sync', query_string={'since': old})
+    assert response.status_code == 410
+    # 清理之后取得的令牌仍然有效
+    fresh = token(client)
+    assert sync(client, fresh)['hasMore'] is False
+    client.delete(f"/api/notes/{note['id']}")
+    assert sync(client, fresh)['changes']['notes']['deleted'] == [note['id']]